@@ -0,0 +1,93 @@
+# benchmarks/batch_serialization.py
+# What the loaders send per row, before and after property projection:
+# chunk.to_dict("records") over every CSV column (the previous path) vs
+# frame_records over the categorical-typed frame with only the columns the
+# query reads and null cells left out. Reports CPU seconds to build the row
+# dicts and their size as the driver would pack them for Bolt, per node label
+# and relationship.
+#
+#   python -m benchmarks.batch_serialization --data-dir data/synthetic_100k --rows 200000
+
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+from utils.graph_schema import NODES, RELATIONSHIPS, node_columns, relationship_columns
+from utils.ingest import DATA_DIR, CSV_ID_COLUMNS, CHUNK_SIZE, clean_ids, csv_dtypes, frame_records
+
+try:
+    # Bolt's own encoder (driver internals); JSON size is the fallback
+    from neo4j._codec.packstream.v1 import Packer, PackableBuffer
+except ImportError:
+    Packer = None
+
+
+def packed_size(records, batch_size=1000):
+    # Bytes of the $batch parameters, one batch at a time
+    total = 0
+    for pos in range(0, len(records), batch_size):
+        batch = records[pos:pos + batch_size]
+        if Packer is None:
+            total += len(json.dumps(batch, default=str).encode("utf-8"))
+            continue
+        buffer = PackableBuffer()
+        Packer(buffer).pack(batch)
+        total += len(buffer.data)
+    return total
+
+
+def measure(build, frame, size=CHUNK_SIZE):
+    cpu, records = 0.0, []
+    for pos in range(0, len(frame), size):
+        chunk = frame.iloc[pos:pos + size]
+        start = time.process_time()
+        records.extend(build(chunk))
+        cpu += time.process_time() - start
+    size = packed_size(records)
+    return {"cpu_seconds": cpu, "rows_per_cpu_sec": len(frame) / cpu if cpu else None,
+            "bytes": size, "bytes_per_row": size / len(frame) if len(frame) else 0}
+
+
+def compare(plain, typed, columns):
+    before = measure(lambda chunk: chunk.to_dict("records"), plain)
+    after = measure(lambda chunk: frame_records(chunk, columns), typed)
+    return {
+        "rows": len(plain), "columns": len(columns) if columns else len(typed.columns),
+        "to_dict": before, "projected": after,
+        "bytes_reduction": 1 - after["bytes"] / before["bytes"] if before["bytes"] else 0.0,
+        "cpu_reduction": 1 - after["cpu_seconds"] / before["cpu_seconds"] if before["cpu_seconds"] else 0.0,
+    }
+
+
+def run(data_dir, rows):
+    report = {"encoding": "packstream" if Packer is not None else "json", "targets": {}}
+    frames = {}
+    for name, id_cols in CSV_ID_COLUMNS.items():
+        path = os.path.join(data_dir, f"{name}.csv")
+        plain = clean_ids(pd.read_csv(path, nrows=rows), id_cols)
+        typed = clean_ids(pd.read_csv(path, nrows=rows, dtype=csv_dtypes(name)), id_cols)
+        frames[name] = (plain, typed)
+        report[f"{name}_memory_mb"] = {"object": plain.memory_usage(deep=True).sum() / 2**20,
+                                       "categorical": typed.memory_usage(deep=True).sum() / 2**20}
+    for node in NODES:
+        plain, typed = frames[node.source]
+        report["targets"][f"nodes:{node.label}"] = compare(plain, typed, node_columns(node))
+    for rel in RELATIONSHIPS:
+        plain, typed = frames[rel.source]
+        report["targets"][f"rel:{rel.name}"] = compare(plain, typed, relationship_columns(rel))
+    before = sum(t["to_dict"]["bytes"] for t in report["targets"].values())
+    after = sum(t["projected"]["bytes"] for t in report["targets"].values())
+    report["total_bytes"] = {"to_dict": before, "projected": after, "reduction": 1 - after / before if before else 0.0}
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Row dict CPU and packed bytes, full rows vs projected columns.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="directory with the six CSVs")
+    parser.add_argument("--rows", type=int, default=100000, help="rows read from each CSV")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.data_dir, args.rows), indent=2))
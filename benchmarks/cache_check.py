@@ -0,0 +1,54 @@
+# benchmarks/cache_check.py
+# Replays neighbour searches and eligibility lookups for stored patient
+# vectors through the result caches, then checks every cached eligibility
+# entry against a fresh (uncached) query.
+#
+#   python -m benchmarks.cache_check --queries 200 --repeat 3
+
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+import argparse
+import json
+import os
+import time
+
+from utils.retrieval import fetch_eligibility, find_neighbours
+from utils.eligibility import lookup_eligibility
+from utils.result_cache import cache_metrics, verify_eligibility_cache
+
+
+def sample_embeddings(driver, n):
+    with driver.session() as session:
+        result = session.run(
+            "MATCH (p:Patient) WHERE p.embedding IS NOT NULL RETURN p.embedding AS embedding LIMIT $n", n=n
+        )
+        return [r["embedding"] for r in result]
+
+
+def run(driver, queries, top_k, repeat):
+    report = {"queries": len(queries), "top_k": top_k, "repeat": repeat, "passes": []}
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for q in queries:
+            neighbours = find_neighbours(driver, [q], top_k)[0]
+            fetch_eligibility(driver, [pid for pid, _ in neighbours])
+        report["passes"].append({"seconds": time.perf_counter() - t})
+    report["cache"] = cache_metrics()
+    report["stale_eligibility"] = verify_eligibility_cache(lambda ids: lookup_eligibility(driver, ids))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Result cache hit rate and consistency check.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    load_dotenv()
+    driver = GraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASS")))
+    report = run(driver, sample_embeddings(driver, args.queries), args.top_k, args.repeat)
+    driver.close()
+    print(json.dumps(report, indent=2))
+    if report["stale_eligibility"]:
+        exit(1)
@@ -0,0 +1,66 @@
+# benchmarks/encoder_backends.py
+# Throughput of each embedding backend on our patient texts, and how closely
+# the int8 vectors track fp32: per-patient cosine and top-k neighbour overlap
+# within the sample.
+#
+#   python -m benchmarks.encoder_backends --patients 5000 --threads 8
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from utils.embeddings import BACKENDS, BATCH_SIZE, configure_threads, get_model, patient_texts
+from utils.ingest import open_csv
+
+
+def neighbour_overlap(reference, other, top_k):
+    # Mean share of each patient's fp32 top-k (within the sample) that the
+    # other backend also ranks in its top-k
+    def top(vectors):
+        scores = vectors @ vectors.T
+        np.fill_diagonal(scores, -np.inf)
+        return np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    a, b = top(reference), top(other)
+    return float(np.mean([len(set(x) & set(y)) / top_k for x, y in zip(a, b)]))
+
+
+def run(texts, backends, batch_size, top_k):
+    report, vectors = {"patients": len(texts)}, {}
+    for backend in backends:
+        model = get_model(backend=backend)
+        model.encode(texts[:batch_size], batch_size=batch_size, normalize_embeddings=True)  # warm up
+        start = time.perf_counter()
+        vectors[backend] = np.asarray(model.encode(texts, batch_size=batch_size, normalize_embeddings=True))
+        elapsed = time.perf_counter() - start
+        report[backend] = {"seconds": elapsed, "patients_per_sec": len(texts) / elapsed}
+    reference = vectors.get("torch")
+    if reference is not None:
+        for backend, v in vectors.items():
+            if backend == "torch":
+                continue
+            cos = np.sum(reference * v, axis=1)
+            report[backend].update(
+                cosine_mean=float(cos.mean()), cosine_min=float(cos.min()),
+                cosine_p01=float(np.percentile(cos, 1)),
+                topk_overlap=neighbour_overlap(reference, v, min(top_k, len(texts) - 1)),
+                speedup=report["torch"]["seconds"] / report[backend]["seconds"],
+            )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding backend throughput and agreement with fp32.")
+    parser.add_argument("--patients", type=int, default=5000, help="patients from data/patients.csv to encode")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    configure_threads(args.threads)
+    texts = patient_texts(open_csv("patients").head(args.patients))
+    report = run(texts, args.backends, args.batch_size, args.top_k)
+    report["threads"] = args.threads
+    print(json.dumps(report, indent=2))
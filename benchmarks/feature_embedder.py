@@ -0,0 +1,51 @@
+# benchmarks/feature_embedder.py
+# Structured feature vectors (utils/feature_embedder.py) vs the MiniLM text
+# embedding: patients/sec, and how many of each patient's text-space top-k
+# neighbours (within the sample) the feature vectors also rank in their top-k.
+#
+#   python -m benchmarks.feature_embedder --patients 5000
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.encoder_backends import neighbour_overlap
+from utils.embeddings import BATCH_SIZE, get_model, patient_texts
+from utils.feature_embedder import patient_features, FEATURE_DIM
+from utils.ingest import open_csv
+
+
+def run(frame, top_k, batch_size, with_model=True):
+    report = {"patients": len(frame), "feature_dim": FEATURE_DIM}
+    patient_features(frame.head(batch_size))  # warm up
+    start = time.perf_counter()
+    features = patient_features(frame)
+    elapsed = time.perf_counter() - start
+    report["features"] = {"seconds": elapsed, "patients_per_sec": len(frame) / elapsed}
+    if with_model:
+        texts = patient_texts(frame)
+        model = get_model()
+        model.encode(texts[:batch_size], batch_size=batch_size, normalize_embeddings=True)  # warm up
+        start = time.perf_counter()
+        text_vectors = np.asarray(model.encode(texts, batch_size=batch_size, normalize_embeddings=True))
+        elapsed = time.perf_counter() - start
+        report["minilm"] = {"seconds": elapsed, "patients_per_sec": len(frame) / elapsed}
+        report["features"].update(
+            speedup=report["minilm"]["seconds"] / report["features"]["seconds"],
+            topk_overlap_vs_minilm=neighbour_overlap(text_vectors, features, min(top_k, len(frame) - 1)),
+        )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Feature embedder throughput and neighbour overlap with MiniLM.")
+    parser.add_argument("--patients", type=int, default=5000, help="patients from data/patients.csv")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--no-model", action="store_true", help="only time the feature embedder")
+    args = parser.parse_args()
+
+    frame = open_csv("patients").head(args.patients)
+    print(json.dumps(run(frame, args.top_k, args.batch_size, not args.no_model), indent=2))
@@ -0,0 +1,66 @@
+# benchmarks/fresh_load.py
+# MERGE build vs fresh load (uniqueness constraints + CREATE) on the same
+# CSVs. Each run starts from an empty database with no schema, so this
+# DELETES EVERYTHING in the target database; point it at a scratch instance.
+#
+#   python -m benchmarks.fresh_load --wipe
+
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from utils.build_dag import build_graph
+from utils.ingest import open_csv, CSV_ID_COLUMNS, CHUNK_SIZE
+
+
+def reset_database(driver):
+    with driver.session() as session:
+        session.run("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS").consume()
+        for r in list(session.run("SHOW CONSTRAINTS YIELD name")):
+            session.run(f"DROP CONSTRAINT {r['name']}").consume()
+        for r in list(session.run("SHOW INDEXES YIELD name, type WHERE type <> 'LOOKUP'")):
+            session.run(f"DROP INDEX {r['name']}").consume()
+
+
+def counts(driver):
+    with driver.session() as session:
+        nodes = session.run("MATCH (n) RETURN count(n) AS n").single()["n"]
+        rels = session.run("MATCH ()-[r]->() RETURN count(r) AS n").single()["n"]
+    return {"nodes": nodes, "relationships": rels}
+
+
+def run(driver, data, modes):
+    report = {}
+    for mode in modes:
+        reset_database(driver)
+        ledger = os.path.join(tempfile.mkdtemp(), "ledger.json")
+        start = time.perf_counter()
+        stages = build_graph(data, driver, resume=False, ledger_path=ledger, fresh_load=(mode == "create"))
+        report[mode] = dict(total_seconds=time.perf_counter() - start, stages=stages, **counts(driver))
+    if "merge" in report and "create" in report:
+        report["speedup"] = report["merge"]["total_seconds"] / report["create"]["total_seconds"]
+        report["same_counts"] = all(report["merge"][k] == report["create"][k] for k in ("nodes", "relationships"))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MERGE vs fresh-load (CREATE) build times.")
+    parser.add_argument("--wipe", action="store_true", required=True,
+                        help="confirm that the target database may be emptied")
+    parser.add_argument("--modes", nargs="+", default=["merge", "create"], choices=["merge", "create"])
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv()
+    driver = GraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASS")))
+    data = {name: open_csv(name, args.stream, args.chunk_size) for name in CSV_ID_COLUMNS}
+    try:
+        report = run(driver, data, args.modes)
+    finally:
+        driver.close()
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,87 @@
+# benchmarks/graph_parity.py
+# Checks that the local CSR graph (GRAPH_BACKEND=local) gives the same
+# eligibility and demographics as Neo4j for a sample of patients, and times
+# both. Build the snapshot from the CSVs that were loaded into Neo4j.
+#
+#   python -m benchmarks.graph_parity --patients 1000 --batch 50
+
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.vector_parity import percentiles
+from utils.csr_graph import LocalGraph, GRAPH_SNAPSHOT_DIR
+from utils.eligibility import lookup_eligibility
+from utils.graph_schema import DEMOGRAPHIC_LINKS
+
+DEMOGRAPHICS_QUERY = """
+UNWIND $patient_ids AS pid
+MATCH (p:Patient {Id: pid})
+RETURN p.Id AS patient_id, """ + ", ".join(
+    f"COLLECT {{ MATCH (p)-[:{link_type}]->(n:{label}) RETURN n.{key} }} AS {column}"
+    for link_type, label, key, column in DEMOGRAPHIC_LINKS
+)
+
+
+def lookup_demographics(driver, patient_ids):
+    with driver.session() as session:
+        result = session.run(DEMOGRAPHICS_QUERY, patient_ids=list(patient_ids))
+        return {r["patient_id"]: {c: sorted(r[c]) for _, _, _, c in DEMOGRAPHIC_LINKS} for r in result}
+
+
+def _same_eligibility(a, b):
+    return {k: sorted(v) for k, v in a.items()} == {k: sorted(v) for k, v in b.items()}
+
+
+def run(driver, graph, patient_ids, batch):
+    batches = [patient_ids[i:i + batch] for i in range(0, len(patient_ids), batch)]
+    report = {"patients": len(patient_ids), "batch": batch}
+    checks = {
+        "eligibility": (lambda ids: lookup_eligibility(driver, ids), graph.eligibility, _same_eligibility),
+        "demographics": (lambda ids: lookup_demographics(driver, ids), graph.demographics,
+                         lambda a, b: a == b),
+    }
+    for name, (neo4j_fn, local_fn, same) in checks.items():
+        mismatched, times = 0, {"neo4j": [], "local": []}
+        for ids in batches:
+            t = time.perf_counter()
+            expected = neo4j_fn(ids)
+            times["neo4j"].append(time.perf_counter() - t)
+            t = time.perf_counter()
+            got = local_fn(ids)
+            times["local"].append(time.perf_counter() - t)
+            mismatched += sum(1 for pid in ids if not same({pid: expected.get(pid)}, {pid: got.get(pid)}))
+        report[name] = {"mismatched": mismatched, "neo4j": percentiles(times["neo4j"]),
+                        "local": percentiles(times["local"])}
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local CSR graph vs Neo4j: parity and latency.")
+    parser.add_argument("--snapshot", default=GRAPH_SNAPSHOT_DIR)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=50, help="patient ids per lookup (top_k x applicants)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    t = time.perf_counter()
+    graph = LocalGraph.load(args.snapshot)
+    load_seconds = time.perf_counter() - t
+    ids = graph.nodes["Patient"].ids
+    rng = np.random.default_rng(0)
+    sample = [i.decode("utf-8") for i in ids[np.sort(rng.choice(len(ids), size=min(args.patients, len(ids)), replace=False))]]
+
+    driver = GraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASS")))
+    try:
+        report = run(driver, graph, sample, args.batch)
+    finally:
+        driver.close()
+    report["snapshot_load_seconds"] = load_seconds
+    print(json.dumps(report, indent=2))
+    if report["eligibility"]["mismatched"] or report["demographics"]["mismatched"]:
+        exit(1)
@@ -0,0 +1,76 @@
+# benchmarks/service_load.py
+# Closed-loop load test for serve.py: N concurrent keep-alive clients each
+# POST one applicant at a time; reports requests/sec and latency percentiles
+# plus the server's batch counters. Run it against the service started with
+# and without coalescing (--max-batch 1) to compare.
+#
+#   python -m benchmarks.service_load --url http://127.0.0.1:8080 --concurrency 32 --requests 2000
+
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlparse
+
+from benchmarks.vector_parity import percentiles
+from utils.ingest import open_csv
+
+
+async def _request(reader, writer, host, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _client(url, applicants, counter, total, latencies, errors):
+    reader, writer = await asyncio.open_connection(url.hostname, url.port)
+    try:
+        while counter[0] < total:
+            i = counter[0]
+            counter[0] += 1
+            t = time.perf_counter()
+            status, _ = await _request(reader, writer, url.netloc, "POST", "/score", applicants[i % len(applicants)])
+            latencies.append(time.perf_counter() - t)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(url, applicants, concurrency, total):
+    url = urlparse(url)
+    latencies, errors, counter = [], [], [0]
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(url, applicants, counter, total, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    reader, writer = await asyncio.open_connection(url.hostname, url.port)
+    _, server = await _request(reader, writer, url.netloc, "GET", "/metrics")
+    writer.close()
+    return dict(percentiles(latencies), concurrency=concurrency, requests=len(latencies), errors=len(errors),
+                seconds=elapsed, requests_per_sec=len(latencies) / elapsed,
+                server_batches=server["batches"], server_mean_batch=server["mean_batch"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Requests/sec and latency of the scoring service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--applicants", type=int, default=500,
+                        help="distinct patients from data/patients.csv to cycle through")
+    args = parser.parse_args()
+
+    patients = open_csv("patients").head(args.applicants)
+    applicants = json.loads(patients.to_json(orient="records"))
+    print(json.dumps(asyncio.run(run(args.url, applicants, args.concurrency, args.requests)), indent=2))
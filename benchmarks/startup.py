@@ -0,0 +1,74 @@
+# benchmarks/startup.py
+# Process startup cost: import time of the entry points (each in a fresh
+# interpreter, noting whether torch got pulled in), and time from a cold
+# process to the first embedding and, with --neo4j, the first score.
+#
+#   python -m benchmarks.startup --runs 3
+#   python -m benchmarks.startup --neo4j
+
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+MODULES = ["utils.neo4j_helper", "utils.retrieval", "utils.add_patient", "utils.service"]
+
+IMPORT_PROBE = """
+import sys, time, json
+t = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - t, "torch_loaded": "torch" in sys.modules}}))
+"""
+
+FIRST_EMBEDDING_PROBE = """
+import time, json
+t = time.perf_counter()
+from utils.embeddings import get_model
+imported = time.perf_counter() - t
+get_model().encode(["first"], normalize_embeddings=True)
+print(json.dumps({"import_seconds": imported, "seconds": time.perf_counter() - t}))
+"""
+
+FIRST_SCORE_PROBE = """
+import time, json
+t = time.perf_counter()
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+import os
+from utils.embeddings import LazyModel
+from utils.retrieval import score_applicants
+imported = time.perf_counter() - t
+load_dotenv()
+driver = GraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASS")))
+patient = {"Id": "startup-probe", "FIRST": "Lars", "LAST": "Schmidt", "GENDER": "M", "BIRTHDATE": "8/15/1985",
+           "ETHNICITY": "hispanic", "RACE": "white", "INCOME": 250000, "ZIP": 90210}
+score_applicants([patient], LazyModel(), driver, store=False)
+driver.close()
+print(json.dumps({"import_seconds": imported, "seconds": time.perf_counter() - t}))
+"""
+
+
+def probe(code, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    report = {key: float(np.median([s[key] for s in samples])) for key in samples[0] if key != "torch_loaded"}
+    if "torch_loaded" in samples[0]:
+        report["torch_loaded"] = samples[0]["torch_loaded"]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import cost and time to first embedding / score.")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement (median reported)")
+    parser.add_argument("--neo4j", action="store_true", help="also time the first score against Neo4j")
+    args = parser.parse_args()
+
+    report = {"imports": {m: probe(IMPORT_PROBE.format(module=m), args.runs) for m in MODULES}}
+    report["first_embedding"] = probe(FIRST_EMBEDDING_PROBE, args.runs)
+    if args.neo4j:
+        report["first_score"] = probe(FIRST_SCORE_PROBE, args.runs)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,174 @@
+# benchmarks/suite.py
+# End-to-end benchmark: generate synthetic CSVs, load them into a scratch
+# Neo4j (timing every build stage), give patients vectors, then measure
+# find_similar_patients / check_eligibility latency. Writes one JSON report;
+# --baseline compares it with an earlier one and exits non-zero on
+# regressions. The load EMPTIES the target database (--wipe).
+#
+#   python -m benchmarks.suite --patients 10000 --wipe --out bench/10k.json
+#   python -m benchmarks.suite --patients 10000 --wipe --baseline bench/10k.json
+
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fresh_load import reset_database, counts
+from benchmarks.synthetic import generate
+from benchmarks.vector_parity import percentiles
+from utils.build_dag import build_graph
+from utils.embeddings import EMBEDDING_DIM, LazyModel, embed_patients
+from utils.ingest import open_csv, CSV_ID_COLUMNS
+from utils.loader import load_rows
+from utils.metrics import METRICS
+from utils.neo4j_helper import create_vector_indexes
+from utils.retrieval import find_neighbours, fetch_eligibility, find_hybrid
+from utils.graph_schema import DEMOGRAPHIC_LINKS
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def random_vectors(driver, data, dim=EMBEDDING_DIM, seed=0):
+    # Unit vectors stand in for the model so large scales don't spend hours
+    # encoding; latency of the vector index doesn't depend on the content
+    rng = np.random.default_rng(seed)
+    def rows():
+        for chunk in data:
+            vectors = rng.normal(size=(len(chunk), dim)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            for pid, vec in zip(chunk["Id"].tolist(), vectors):
+                yield {"id": pid, "embedding": vec.tolist()}
+    return load_rows(driver, "UNWIND $batch AS row MATCH (p:Patient {Id: row.id}) SET p.embedding = row.embedding",
+                     rows(), name="Patient random vectors", key="id", unit="embeddings")
+
+
+def sample_queries(driver, n, seed=0):
+    # [(embedding, demographics)] of stored patients; demographics as
+    # find_hybrid expects them
+    demographics = ", ".join(
+        f"head(COLLECT {{ MATCH (p)-[:{link_type}]->(d:{label}) RETURN d.{key} }}) AS {column}"
+        for link_type, label, key, column in DEMOGRAPHIC_LINKS
+    )
+    with driver.session() as session:
+        total = session.run("MATCH (p:Patient) WHERE p.embedding IS NOT NULL RETURN count(p) AS n").single()["n"]
+        skip = np.random.default_rng(seed).integers(0, max(total - n, 1))
+        result = session.run("MATCH (p:Patient) WHERE p.embedding IS NOT NULL "
+                             f"RETURN p.embedding AS e, {demographics} SKIP $skip LIMIT $n", skip=int(skip), n=n)
+        return [(r["e"], {c: r[c] for _, _, _, c in DEMOGRAPHIC_LINKS}) for r in result]
+
+
+def retrieval(driver, queries, top_k):
+    # Uncached: every call is a Neo4j round trip, as on a cold process
+    # find_similar_patients + check_eligibility vs the single hybrid query
+    similar_times, eligibility_times, hybrid_times, hits = [], [], [], 0
+    for q, demographics in queries:
+        t = time.perf_counter()
+        similar = find_neighbours(driver, [q], top_k, use_cache=False)[0]
+        similar_times.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        eligible = fetch_eligibility(driver, [pid for pid, _ in similar], use_cache=False)
+        eligibility_times.append(time.perf_counter() - t)
+        hits += bool(eligible)
+        t = time.perf_counter()
+        find_hybrid(driver, [q], [demographics], top_k)
+        hybrid_times.append(time.perf_counter() - t)
+    return {"queries": len(queries), "top_k": top_k,
+            "find_similar_patients": percentiles(similar_times),
+            "check_eligibility": percentiles(eligibility_times),
+            "hybrid": percentiles(hybrid_times),
+            "queries_with_eligible_neighbour": hits}
+
+
+def compare(report, baseline, tolerance):
+    # (metric, baseline, current) for every time that got more than
+    # `tolerance` slower; stage times and latency percentiles
+    regressions = []
+    def check(name, old, new):
+        if old and new > old * (1 + tolerance):
+            regressions.append((name, old, new))
+    for stage, seconds in report["ingest"]["stages"].items():
+        check(f"ingest.{stage}", baseline["ingest"]["stages"].get(stage), seconds)
+    check("ingest.total_seconds", baseline["ingest"]["total_seconds"], report["ingest"]["total_seconds"])
+    for fn in ("find_similar_patients", "check_eligibility", "hybrid"):
+        for p, value in report["retrieval"].get(fn, {}).items():
+            check(f"retrieval.{fn}.{p}", baseline["retrieval"].get(fn, {}).get(p), value)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic ingest + retrieval benchmark suite.")
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--encounters", type=float, default=10.0, help="mean encounters per patient")
+    parser.add_argument("--data-dir", default=None, help="reuse/generate CSVs here (default: a temp dir)")
+    parser.add_argument("--wipe", action="store_true", required=True,
+                        help="confirm that the target database may be emptied")
+    parser.add_argument("--fresh-load", action="store_true", help="load with constraints + CREATE")
+    parser.add_argument("--vectors", choices=["random", "model"], default="random",
+                        help="patient vectors from random unit vectors or the embedding model")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline")
+    args = parser.parse_args()
+
+    load_dotenv()
+    report = {"version": git_version(), "timestamp": time.time(), "python": platform.python_version(),
+              "scale": {"patients": args.patients, "encounters_per_patient": args.encounters}}
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="graphrag_bench_")
+    if not os.path.exists(os.path.join(data_dir, "patients.csv")):
+        t = time.perf_counter()
+        report["rows"] = generate(data_dir, args.patients, args.encounters)
+        report["generate_seconds"] = time.perf_counter() - t
+    data = {name: open_csv(name, stream=True, data_dir=data_dir) for name in CSV_ID_COLUMNS}
+
+    driver = GraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASS")))
+    try:
+        reset_database(driver)
+        t = time.perf_counter()
+        stages = build_graph(data, driver, resume=False, fresh_load=args.fresh_load,
+                             ledger_path=os.path.join(tempfile.mkdtemp(), "ledger.json"))
+        t_vec = time.perf_counter()
+        if args.vectors == "model":
+            embed_patients(data["patients"], LazyModel(), driver)
+        else:
+            random_vectors(driver, data["patients"])
+        stages["vectors"] = time.perf_counter() - t_vec
+        t_idx = time.perf_counter()
+        create_vector_indexes(driver, EMBEDDING_DIM)
+        with driver.session() as session:
+            session.run("CALL db.awaitIndexes(3600)").consume()
+        stages["vector_indexes_online"] = time.perf_counter() - t_idx
+        report["ingest"] = dict(total_seconds=time.perf_counter() - t, stages=stages, **counts(driver))
+        # Per-stage rows, phases, batch latencies and Neo4j counters (utils/metrics.py)
+        report["instrumentation"] = METRICS.to_dict()["stages"]
+        report["retrieval"] = retrieval(driver, sample_queries(driver, args.queries), args.top_k)
+    finally:
+        driver.close()
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old:.4f} -> {new:.4f}")
+        if regressions:
+            exit(1)
@@ -0,0 +1,188 @@
+# benchmarks/synthetic.py
+# Synthetic Synthea-style CSVs (the six files under data/) at any scale.
+# Patients are written in blocks, each block together with its encounters,
+# claims and medications, so memory stays flat from 10k to 10M patients.
+# Fan-out per patient is Poisson around --encounters (claims: one per
+# encounter; medications: --meds-per-encounter). Each patient has one payer,
+# picked from age and income, so Medicare/Medicaid eligibility is realistic.
+#
+#   python -m benchmarks.synthetic --patients 100000 --out data/synthetic_100k
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+BLOCK_PATIENTS = 50000
+REF_DATE = np.datetime64("2025-05-16")
+
+FIRST = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+         "Lars", "Maria", "Wei", "Aisha", "Carlos", "Yuki", "Omar", "Sofia", "Ivan", "Priya"]
+LAST = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+        "Schmidt", "Nguyen", "Kim", "Patel", "Cohen", "Okafor", "Rossi", "Silva", "Novak", "Tanaka"]
+RACES = ["white", "black", "asian", "native", "hawaiian", "other"]
+RACE_P = [0.6, 0.13, 0.06, 0.02, 0.01, 0.18]
+STATES = ["Massachusetts", "California", "Texas", "New York", "Florida", "Ohio"]
+SPECIALITIES = ["GENERAL PRACTICE", "INTERNAL MEDICINE", "CARDIOLOGY", "PEDIATRICS", "ONCOLOGY", "NEUROLOGY"]
+ENCOUNTER_CLASSES = ["wellness", "ambulatory", "outpatient", "emergency", "inpatient", "urgentcare"]
+ENCOUNTER_P = [0.35, 0.3, 0.2, 0.07, 0.04, 0.04]
+REASONS = ["Hypertension", "Prediabetes", "Acute bronchitis", "Viral sinusitis", "Chronic kidney disease",
+           "Osteoarthritis of knee", "Anemia", "Hyperlipidemia", "Asthma", "Normal pregnancy"]
+PAYERS = [("Medicare", "GOVERNMENT"), ("Medicaid", "GOVERNMENT"), ("Dual Eligible", "GOVERNMENT"),
+          ("Blue Cross Blue Shield", "PRIVATE"), ("Aetna", "PRIVATE"), ("Cigna Health", "PRIVATE"),
+          ("UnitedHealthcare", "PRIVATE"), ("Humana", "PRIVATE"), ("Anthem", "PRIVATE"), ("NO_INSURANCE", "NO_INSURANCE")]
+N_MEDICATION_CODES = 500
+
+
+def ids(prefix, start, n):
+    return np.char.add(prefix, np.char.zfill(np.arange(start, start + n).astype(str), 12))
+
+
+def dates(rng, start, end, n):
+    # Uniform dates between two ISO strings, as ISO date strings
+    lo, hi = np.datetime64(start, "D").astype(np.int64), np.datetime64(end, "D").astype(np.int64)
+    return rng.integers(lo, hi, n).astype("datetime64[D]").astype(str)
+
+
+def providers_frame(rng, n):
+    return pd.DataFrame({
+        "Id": ids("prov-", 0, n),
+        "ORGANIZATION": ids("org-", 0, n // 10 + 1)[rng.integers(0, n // 10 + 1, n)],
+        "NAME": np.char.add(np.char.add(rng.choice(FIRST, n), " "), rng.choice(LAST, n)),
+        "GENDER": rng.choice(["M", "F"], n),
+        "SPECIALITY": rng.choice(SPECIALITIES, n),
+        "ADDRESS": np.char.add(rng.integers(1, 9999, n).astype(str), " Main St"),
+        "CITY": rng.choice(["Boston", "Springfield", "Austin", "Albany", "Miami", "Columbus"], n),
+        "STATE": rng.choice(STATES, n),
+        "ZIP": rng.integers(1000, 99999, n),
+    })
+
+
+def payers_frame():
+    names, ownership = zip(*PAYERS)
+    n = len(PAYERS)
+    return pd.DataFrame({
+        "Id": ids("payer-", 0, n), "NAME": names, "OWNERSHIP": ownership,
+        "ADDRESS": ["1 Payer Plaza"] * n, "CITY": ["Baltimore"] * n,
+        "STATE_HEADQUARTERED": ["MD"] * n, "ZIP": [21244] * n,
+    })
+
+
+def patient_block(rng, start, n):
+    birth = dates(rng, "1930-01-01", "2024-12-31", n)
+    income = np.round(rng.lognormal(10.8, 0.7, n)).astype(np.int64)
+    age = (REF_DATE - birth.astype("datetime64[D]")).astype(np.int64) // 365
+    # Payer index into PAYERS: 65+ -> Medicare, low income -> Medicaid, both -> dual
+    payer = rng.integers(3, 9, n)
+    payer[income < 25000] = 1
+    payer[age >= 65] = 0
+    payer[(age >= 65) & (income < 20000)] = 2
+    payer[rng.random(n) < 0.05] = 9
+    frame = pd.DataFrame({
+        "Id": ids("pat-", start, n),
+        "BIRTHDATE": birth,
+        "PREFIX": rng.choice(["Mr.", "Mrs.", "Ms."], n),
+        "FIRST": rng.choice(FIRST, n),
+        "LAST": rng.choice(LAST, n),
+        "MARITAL": rng.choice(["M", "S", "D", "W"], n),
+        "RACE": rng.choice(RACES, n, p=RACE_P),
+        "ETHNICITY": rng.choice(["hispanic", "nonhispanic"], n, p=[0.18, 0.82]),
+        "GENDER": rng.choice(["M", "F"], n),
+        "BIRTHPLACE": rng.choice(["Boston Massachusetts US", "Austin Texas US", "Miami Florida US"], n),
+        "ADDRESS": np.char.add(rng.integers(1, 9999, n).astype(str), " Elm St"),
+        "CITY": rng.choice(["Boston", "Springfield", "Austin", "Albany", "Miami", "Columbus"], n),
+        "STATE": rng.choice(STATES, n),
+        "COUNTY": rng.choice(["Suffolk County", "Travis County", "Dade County"], n),
+        "ZIP": rng.integers(1000, 99999, n),
+        "HEALTHCARE_EXPENSES": np.round(rng.gamma(2.0, 20000, n), 2),
+        "HEALTHCARE_COVERAGE": np.round(rng.gamma(2.0, 10000, n), 2),
+        "INCOME": income,
+    })
+    return frame, payer
+
+
+def activity_block(rng, patients, payer, n_providers, encounters_per_patient, meds_per_encounter,
+                   encounter_start, medication_start):
+    payer_ids = ids("payer-", 0, len(PAYERS))
+    fanout = rng.poisson(encounters_per_patient, len(patients))
+    owner = np.repeat(np.arange(len(patients)), fanout)
+    n = len(owner)
+    enc_ids = ids("enc-", encounter_start, n)
+    start = dates(rng, "2010-01-01", "2025-05-01", n)
+    provider = ids("prov-", 0, n_providers)[rng.integers(0, n_providers, n)]
+    enc_payer = payer_ids[payer[owner]]
+    cost = np.round(rng.gamma(2.0, 150, n), 2)
+    coverage = np.round(cost * np.where(payer[owner] == 9, 0, rng.uniform(0.5, 1.0, n)), 2)
+    reason = rng.choice(REASONS, n)
+    patient_ids = patients["Id"].to_numpy()[owner]
+    encounters = pd.DataFrame({
+        "Id": enc_ids, "START": start, "STOP": start, "PATIENT": patient_ids,
+        "ORGANIZATION": ids("org-", 0, 1)[np.zeros(n, dtype=int)], "PROVIDER": provider, "PAYER": enc_payer,
+        "ENCOUNTERCLASS": rng.choice(ENCOUNTER_CLASSES, n, p=ENCOUNTER_P),
+        "CODE": rng.integers(100000, 999999, n), "DESCRIPTION": np.char.add("Encounter for ", reason),
+        "BASE_ENCOUNTER_COST": cost, "TOTAL_CLAIM_COST": cost, "PAYER_COVERAGE": coverage,
+        "REASONCODE": rng.integers(100000, 999999, n), "REASONDESCRIPTION": reason,
+    })
+    claims = pd.DataFrame({
+        "Id": ids("claim-", encounter_start, n), "PATIENTID": patient_ids, "PROVIDERID": provider,
+        "PRIMARYPATIENTINSURANCEID": enc_payer, "SECONDARYPATIENTINSURANCEID": "0",
+        "DEPARTMENTID": rng.integers(1, 20, n), "DIAGNOSIS1": rng.integers(100000, 999999, n),
+        "DIAGNOSIS2": rng.integers(100000, 999999, n), "STATUS1": "CLOSED", "STATUSP": "CLOSED",
+        "OUTSTANDINGP": 0, "SERVICEDATE": start,
+    })
+    med_fanout = rng.poisson(meds_per_encounter, n)
+    enc_of_med = np.repeat(np.arange(n), med_fanout)
+    m = len(enc_of_med)
+    codes = rng.zipf(1.3, m) % N_MEDICATION_CODES  # a few drugs dominate
+    base = np.round(rng.gamma(2.0, 20, m), 2)
+    dispenses = rng.integers(1, 12, m)
+    medications = pd.DataFrame({
+        "START": start[enc_of_med], "STOP": start[enc_of_med], "PATIENT": patient_ids[enc_of_med],
+        "PAYER": enc_payer[enc_of_med], "ENCOUNTER": enc_ids[enc_of_med],
+        "CODE": (100000 + codes).astype(str), "DESCRIPTION": np.char.add("Medication ", codes.astype(str)),
+        "BASE_COST": base, "PAYER_COVERAGE": np.round(base * 0.8, 2), "DISPENSES": dispenses,
+        "TOTALCOST": np.round(base * dispenses, 2), "REASONCODE": rng.integers(100000, 999999, m),
+        "REASONDESCRIPTION": reason[enc_of_med],
+    })
+    return encounters, claims, medications
+
+
+def generate(out_dir, patients, encounters_per_patient=10.0, meds_per_encounter=0.5, seed=0,
+             block=BLOCK_PATIENTS):
+    # Returns row counts per CSV
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n_providers = max(10, patients // 100)
+    counts = {}
+    for name, frame in [("providers", providers_frame(rng, n_providers)), ("payers", payers_frame())]:
+        frame.to_csv(os.path.join(out_dir, f"{name}.csv"), index=False)
+        counts[name] = len(frame)
+    paths = {name: os.path.join(out_dir, f"{name}.csv") for name in ["patients", "encounters", "claims", "medications"]}
+    counts.update({name: 0 for name in paths})
+    for start in range(0, patients, block):
+        frame, payer = patient_block(rng, start, min(block, patients - start))
+        encounters, claims, medications = activity_block(
+            rng, frame, payer, n_providers, encounters_per_patient, meds_per_encounter,
+            counts["encounters"], counts["medications"],
+        )
+        for name, part in [("patients", frame), ("encounters", encounters), ("claims", claims),
+                           ("medications", medications)]:
+            part.to_csv(paths[name], mode="a" if start else "w", header=not start, index=False)
+            counts[name] += len(part)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic patients/encounters/... CSVs.")
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--encounters", type=float, default=10.0, help="mean encounters per patient")
+    parser.add_argument("--meds-per-encounter", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="data/synthetic")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.out, args.patients, args.encounters, args.meds_per_encounter, args.seed)
+    print(f"Wrote {counts} to {args.out} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,79 @@
+# benchmarks/vector_parity.py
+# Recall and latency of the local vector index against the Neo4j
+# patient_embedding_index, using stored patient vectors as queries.
+#
+#   python -m benchmarks.vector_parity --queries 200 --top-k 5 --min-recall 0.95
+
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from utils.retrieval import query_vector_index
+from utils.vector_index import LocalVectorIndex, SNAPSHOT_DIR
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99))}
+
+
+def recall(expected, got):
+    expected = {pid for pid, _ in expected}
+    return len(expected & {pid for pid, _ in got}) / len(expected) if expected else 1.0
+
+
+def run(driver, index, queries, top_k):
+    report = {"queries": len(queries), "top_k": top_k, "index_size": len(index)}
+    neo4j_results, neo4j_times = [], []
+    for q in queries:
+        t = time.perf_counter()
+        neo4j_results.append(query_vector_index(driver, q, top_k))
+        neo4j_times.append(time.perf_counter() - t)
+    report["neo4j"] = percentiles(neo4j_times)
+
+    backends = {"local_exact": index.search}
+    if index._ann is not None:
+        backends["local_ann"] = index.search_approximate
+    for name, search in backends.items():
+        results, times = [], []
+        for q in queries:
+            t = time.perf_counter()
+            results.append(search(q, top_k)[0])
+            times.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        search(queries, top_k)
+        batched = time.perf_counter() - t
+        diffs = [abs(dict(r)[pid] - s) for ref, r in zip(neo4j_results, results) for pid, s in ref if pid in dict(r)]
+        report[name] = dict(percentiles(times),
+                            batched_total_ms=batched * 1000,
+                            recall_vs_neo4j=float(np.mean([recall(ref, r) for ref, r in zip(neo4j_results, results)])),
+                            max_score_diff=float(max(diffs)) if diffs else None)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local vs Neo4j vector index recall and latency.")
+    parser.add_argument("--snapshot", default=SNAPSHOT_DIR)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--min-recall", type=float, default=None,
+                        help="exit non-zero if local_exact recall falls below this")
+    args = parser.parse_args()
+
+    load_dotenv()
+    driver = GraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASS")))
+    index = LocalVectorIndex.load(args.snapshot)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(index), size=min(args.queries, len(index)), replace=False)
+    queries = np.asarray(index.vectors[np.sort(sample)])
+    report = run(driver, index, queries, args.top_k)
+    driver.close()
+    print(json.dumps(report, indent=2))
+    if args.min_recall is not None and report["local_exact"]["recall_vs_neo4j"] < args.min_recall:
+        exit(1)
@@ -2,11 +2,34 @@ from neo4j import GraphDatabase
 import pandas as pd
 import numpy as np
 from dotenv import load_dotenv
+import argparse
 import os
 from utils.neo4j_helper import *
+from utils.ingest import open_csv, CSV_ID_COLUMNS, CHUNK_SIZE
+from utils.incremental import scan_sources, apply_deltas, save_manifests
+from utils.build_dag import build_graph
+from utils.metrics import METRICS
+from utils.query_profile import profile_pipeline
 
 load_dotenv()
 
+parser = argparse.ArgumentParser(description="Build the patient knowledge graph in Neo4j.")
+parser.add_argument("--stream", action="store_true",
+                    help="read the CSVs in chunks instead of loading them fully into memory")
+parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                    help="rows per CSV chunk in --stream mode")
+parser.add_argument("--incremental", action="store_true",
+                    help="only upsert/delete rows that changed since the last build's manifest")
+parser.add_argument("--restart", action="store_true",
+                    help="start over instead of resuming from the checkpoint ledger of a failed build")
+parser.add_argument("--fresh-load", action="store_true",
+                    help="empty database: add uniqueness constraints and CREATE instead of MERGE")
+parser.add_argument("--profile-queries", choices=["explain", "profile"],
+                    help="EXPLAIN or PROFILE every pipeline query once and check the schema before loading")
+parser.add_argument("--metrics-out", metavar="DIR",
+                    help="write per-stage metrics to DIR/build_metrics.json and DIR/build_metrics.prom")
+args = parser.parse_args()
+
 # Neo4j connection
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER")
@@ -14,155 +37,39 @@ NEO4J_PASS = os.getenv("NEO4J_PASS")
 
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
 
-# Load CSVs
+# Load CSVs (IDs are cleaned up to str; in --stream mode this happens per chunk)
 try:
-    patients = pd.read_csv("./data/patients.csv")
-    encounters = pd.read_csv("./data/encounters.csv")
-    providers = pd.read_csv("./data/providers.csv")
-    payers = pd.read_csv("./data/payers.csv")
-    claims = pd.read_csv("./data/claims.csv")
-    medications = pd.read_csv("./data/medications.csv")
+    data = {name: open_csv(name, args.stream, args.chunk_size) for name in CSV_ID_COLUMNS}
 except Exception as e:
     print(f"Error loading CSV files: {e}")
     exit(1)
 
-try: 
-    # Clean up IDs (if any NaN)
-    patients['Id'] = patients['Id'].astype(str)
-    encounters['Id'] = encounters['Id'].astype(str)
-    providers['Id'] = providers['Id'].astype(str)
-    payers['Id'] = payers['Id'].astype(str)
-    claims['Id'] = claims['Id'].astype(str)
-    medications['CODE'] = medications['CODE'].astype(str)
-except Exception as e:  
-    print(f"Error converting IDs to string: {e}")
-    exit(1)
-
 print("Data loaded successfully.")
-# --- Indexes for performance ---
-with driver.session() as session:
-    session.run("CREATE INDEX IF NOT EXISTS FOR (p:Patient) ON (p.Id)")
-    session.run("CREATE INDEX IF NOT EXISTS FOR (e:Encounter) ON (e.Id)")
-    session.run("CREATE INDEX IF NOT EXISTS FOR (pr:Provider) ON (pr.Id)")
-    session.run("CREATE INDEX IF NOT EXISTS FOR (py:Payer) ON (py.Id)")
-    session.run("CREATE INDEX IF NOT EXISTS FOR (c:Claim) ON (c.Id)")
-    session.run("CREATE INDEX IF NOT EXISTS FOR (m:Medication) ON (m.CODE)")
-    session.run("CREATE INDEX IF NOT EXISTS FOR (z:Zipcode) ON (z.zipcode)")
-    session.run("CREATE INDEX IF NOT EXISTS FOR (a:Age_Range) ON (a.range)")
-    session.run("CREATE INDEX IF NOT EXISTS FOR (i:Income_Range) ON (i.range)")
-
-# --- Create Nodes ---
-create_nodes("Patient", patients, "Id", driver)
-create_nodes("Provider", providers, "Id", driver)
-create_nodes("Payer", payers, "Id", driver)
-create_nodes("Encounter", encounters, "Id", driver)
-create_nodes("Claim", claims, "Id", driver)
-create_nodes("Medication", medications, "CODE", driver)
-
-
-
-patients['AGE'] = patients['BIRTHDATE'].apply(get_age)
-patients['AGE_RANGE'] = patients['AGE'].apply(age_bucket)
-patients['INCOME_RANGE'] = patients['INCOME'].apply(income_bucket)
-patients['ZIPCODE'] = patients['ZIP'].astype(str)
-
-# Create Age_Range, Income_Range, Zipcode nodes
-age_ranges = patients['AGE_RANGE'].unique()
-income_ranges = patients['INCOME_RANGE'].unique()
-zipcodes = patients['ZIPCODE'].unique()
-
-with driver.session() as session:
-    for age in age_ranges:
-        session.run("MERGE (:Age_Range {range: $age})", age=age)
-    for inc in income_ranges:
-        session.run("MERGE (:Income_Range {range: $inc})", inc=inc)
-    for zc in zipcodes:
-        session.run("MERGE (:Zipcode {zipcode: $zc})", zc=zc)
-
-
-for batch in batcher(patients.to_dict("records")):
-    connect_patient_demographics(batch, driver)
-
-
-# 1. PATIENT -[:HAS_ENCOUNTER]-> ENCOUNTER
-rel_query = """
-UNWIND $batch AS row
-MATCH (p:Patient {Id: row.PATIENT})
-MATCH (e:Encounter {Id: row.Id})
-MERGE (p)-[:HAS_ENCOUNTER]->(e)
-"""
-create_relationships(encounters, rel_query, driver)
-
-# 2. ENCOUNTER -[:ATTENDED_BY]-> PROVIDER
-rel_query = """
-UNWIND $batch AS row
-MATCH (e:Encounter {Id: row.Id})
-MATCH (pr:Provider {Id: row.PROVIDER})
-MERGE (e)-[:ATTENDED_BY]->(pr)
-"""
-create_relationships(encounters, rel_query, driver)
-
-# 3. ENCOUNTER -[:BILLED_BY]-> PAYER
-rel_query = """
-UNWIND $batch AS row
-MATCH (e:Encounter {Id: row.Id})
-MATCH (py:Payer {Id: row.PAYER})
-MERGE (e)-[:BILLED_BY]->(py)
-"""
-create_relationships(encounters, rel_query, driver)
-
-# 4. PATIENT -[:HAS_CLAIM]-> CLAIM
-rel_query = """
-UNWIND $batch AS row
-MATCH (p:Patient {Id: row.PATIENTID})
-MATCH (c:Claim {Id: row.Id})
-MERGE (p)-[:HAS_CLAIM]->(c)
-"""
-create_relationships(claims, rel_query, driver)
-
-# 5. CLAIM -[:PROVIDED_BY]-> PROVIDER
-rel_query = """
-UNWIND $batch AS row
-MATCH (c:Claim {Id: row.Id})
-MATCH (pr:Provider {Id: row.PROVIDERID})
-MERGE (c)-[:PROVIDED_BY]->(pr)
-"""
-create_relationships(claims, rel_query, driver)
-
-# 6. CLAIM -[:PAID_BY]-> PAYER
-rel_query = """
-UNWIND $batch AS row
-MATCH (c:Claim {Id: row.Id})
-MATCH (py:Payer {Id: row.PRIMARYPATIENTINSURANCEID})
-MERGE (c)-[:PAID_BY]->(py)
-"""
-create_relationships(claims, rel_query, driver)
-
-# 7. ENCOUNTER -[:HAS_MEDICATION]-> MEDICATION
-rel_query = """
-UNWIND $batch AS row
-MATCH (e:Encounter {Id: row.ENCOUNTER})
-MATCH (m:Medication {CODE: row.CODE})
-MERGE (e)-[:HAS_MEDICATION]->(m)
-"""
-create_relationships(medications, rel_query, driver)
-
-# 8. PATIENT -[:HAS_MEDICATION]-> MEDICATION
-rel_query = """
-UNWIND $batch AS row
-MATCH (p:Patient {Id: row.PATIENT})
-MATCH (m:Medication {CODE: row.CODE})
-MERGE (p)-[:HAS_MEDICATION]->(m)
-"""
-create_relationships(medications, rel_query, driver)
 
-# 9. MEDICATION -[:COVERED_BY]-> PAYER
-rel_query = """
-UNWIND $batch AS row
-MATCH (m:Medication {CODE: row.CODE})
-MATCH (py:Payer {Id: row.PAYER})
-MERGE (m)-[:COVERED_BY]->(py)
-"""
-create_relationships(medications, rel_query, driver)
+# --- Query plans and schema, before anything is loaded ---
+if args.profile_queries:
+    report = profile_pipeline(driver, data, args.profile_queries, create=args.fresh_load, out_dir=args.metrics_out)
+    if report["errors"]:
+        driver.close()
+        exit(1)
+
+if args.incremental:
+    # --- Indexes for performance ---
+    create_indexes(driver)
+
+    # --- Apply only the rows that changed since the last build ---
+    deltas = scan_sources(data)
+    apply_deltas(deltas, driver)
+    save_manifests(deltas)
+else:
+    # --- Indexes, nodes, demographics, relationships and eligibility as a
+    # stage DAG (utils/build_dag.py); resumes from the ledger after a failure ---
+    build_graph(data, driver, resume=not args.restart, fresh_load=args.fresh_load)
+
+    # Baseline for the next --incremental run
+    save_manifests(scan_sources(data, with_added=False))
+
+if args.metrics_out:
+    METRICS.write(args.metrics_out)
 
 driver.close()
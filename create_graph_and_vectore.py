@@ -4,250 +4,140 @@ import pandas as pd
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
 import os
-from sentence_transformers import SentenceTransformer
 from utils.neo4j_helper import *
+from utils.ingest import open_csv, CSV_ID_COLUMNS, CHUNK_SIZE
+from utils.incremental import scan_sources, apply_deltas, save_manifests
+from utils.build_dag import build_graph
+from utils.embeddings import embed_nodes, has_vector_setter, LazyModel, TEXT_FIELDS, EMBEDDING_DIM, BATCH_SIZE
+from utils.encoder_pool import EncoderPool, ENCODER_PROCESSES
+from utils.graph_schema import node_spec
+from utils.embedding_cache import default_cache
+from utils.metrics import METRICS
+from utils.feature_embedder import embed_patient_features, create_feature_index
+from utils.knn_graph import refresh_knn
+from utils.query_profile import profile_pipeline
+import argparse
 import time
 
-start = time.time()
-# --- CONFIG ---
-EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # Free, local, 384 dims
-EMBEDDING_DIM = 384
-BATCH_SIZE = 128
-
-# --- LOAD ENV ---
-load_dotenv()
-NEO4J_URI = os.getenv("NEO4J_URI")
-NEO4J_USER = os.getenv("NEO4J_USER")
-NEO4J_PASS = os.getenv("NEO4J_PASS")
-
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
-
-try:
-    # --- LOAD DATA ---
-    patients = pd.read_csv("./data/patients.csv")
-    encounters = pd.read_csv("./data/encounters.csv")
-    providers = pd.read_csv("./data/providers.csv")
-    payers = pd.read_csv("./data/payers.csv")
-    claims = pd.read_csv("./data/claims.csv")
-    medications = pd.read_csv("./data/medications.csv")
-    print("Data loaded successfully.")
-
-    # --- Clean up IDs ---
-    patients['Id'] = patients['Id'].astype(str)
-    encounters['Id'] = encounters['Id'].astype(str)
-    providers['Id'] = providers['Id'].astype(str)
-    payers['Id'] = payers['Id'].astype(str)
-    claims['Id'] = claims['Id'].astype(str)
-    medications['CODE'] = medications['CODE'].astype(str)
-    print("IDs cleaned successfully.")
-
-    # --- Create Indexes ---
-    with driver.session() as session:
-        session.run("CREATE INDEX IF NOT EXISTS FOR (p:Patient) ON (p.Id)")
-        session.run("CREATE INDEX IF NOT EXISTS FOR (e:Encounter) ON (e.Id)")
-        session.run("CREATE INDEX IF NOT EXISTS FOR (pr:Provider) ON (pr.Id)")
-        session.run("CREATE INDEX IF NOT EXISTS FOR (py:Payer) ON (py.Id)")
-        session.run("CREATE INDEX IF NOT EXISTS FOR (c:Claim) ON (c.Id)")
-        session.run("CREATE INDEX IF NOT EXISTS FOR (m:Medication) ON (m.CODE)")
-        session.run("CREATE INDEX IF NOT EXISTS FOR (z:Zipcode) ON (z.zipcode)")
-        session.run("CREATE INDEX IF NOT EXISTS FOR (a:Age_Range) ON (a.range)")
-        session.run("CREATE INDEX IF NOT EXISTS FOR (i:Income_Range) ON (i.range)")
-
-    # --- Create Nodes ---
-    create_nodes("Patient", patients, "Id", driver)
-    create_nodes("Provider", providers, "Id", driver)
-    create_nodes("Payer", payers, "Id", driver)
-    create_nodes("Encounter", encounters, "Id", driver)
-    create_nodes("Claim", claims, "Id", driver)
-    create_nodes("Medication", medications, "CODE", driver)
-    print("Nodes created successfully.")
-
-    # --- Demographics ---
-    patients['AGE'] = patients['BIRTHDATE'].apply(get_age)
-    patients['AGE_RANGE'] = patients['AGE'].apply(age_bucket)
-    patients['INCOME_RANGE'] = patients['INCOME'].apply(income_bucket)
-    patients['ZIPCODE'] = patients['ZIP'].astype(str)
-
-    age_ranges = patients['AGE_RANGE'].unique()
-    income_ranges = patients['INCOME_RANGE'].unique()
-    zipcodes = patients['ZIPCODE'].unique()
-
-    with driver.session() as session:
-        for age in age_ranges:
-            session.run("MERGE (:Age_Range {range: $age})", age=age)
-        for inc in income_ranges:
-            session.run("MERGE (:Income_Range {range: $inc})", inc=inc)
-        for zc in zipcodes:
-            session.run("MERGE (:Zipcode {zipcode: $zc})", zc=zc)
-
-    for batch in batcher(patients.to_dict("records")):
-        connect_patient_demographics(batch, driver)
-    print("Demographics connected successfully.")
-
-    # --- Relationships ---
-    rel_query = """
-    UNWIND $batch AS row
-    MATCH (p:Patient {Id: row.PATIENT})
-    MATCH (e:Encounter {Id: row.Id})
-    MERGE (p)-[:HAS_ENCOUNTER]->(e)
-    """
-    create_relationships(encounters, rel_query, driver)
-
-    rel_query = """
-    UNWIND $batch AS row
-    MATCH (e:Encounter {Id: row.Id})
-    MATCH (pr:Provider {Id: row.PROVIDER})
-    MERGE (e)-[:ATTENDED_BY]->(pr)
-    """
-    create_relationships(encounters, rel_query, driver)
-
-    rel_query = """
-    UNWIND $batch AS row
-    MATCH (e:Encounter {Id: row.Id})
-    MATCH (py:Payer {Id: row.PAYER})
-    MERGE (e)-[:BILLED_BY]->(py)
-    """
-    create_relationships(encounters, rel_query, driver)
-
-    rel_query = """
-    UNWIND $batch AS row
-    MATCH (p:Patient {Id: row.PATIENTID})
-    MATCH (c:Claim {Id: row.Id})
-    MERGE (p)-[:HAS_CLAIM]->(c)
-    """
-    create_relationships(claims, rel_query, driver)
-
-    rel_query = """
-    UNWIND $batch AS row
-    MATCH (c:Claim {Id: row.Id})
-    MATCH (pr:Provider {Id: row.PROVIDERID})
-    MERGE (c)-[:PROVIDED_BY]->(pr)
-    """
-    create_relationships(claims, rel_query, driver)
-
-    rel_query = """
-    UNWIND $batch AS row
-    MATCH (c:Claim {Id: row.Id})
-    MATCH (py:Payer {Id: row.PRIMARYPATIENTINSURANCEID})
-    MERGE (c)-[:PAID_BY]->(py)
-    """
-    create_relationships(claims, rel_query, driver)
-
-    rel_query = """
-    UNWIND $batch AS row
-    MATCH (e:Encounter {Id: row.ENCOUNTER})
-    MATCH (m:Medication {CODE: row.CODE})
-    MERGE (e)-[:HAS_MEDICATION]->(m)
-    """
-    create_relationships(medications, rel_query, driver)
-
-    rel_query = """
-    UNWIND $batch AS row
-    MATCH (p:Patient {Id: row.PATIENT})
-    MATCH (m:Medication {CODE: row.CODE})
-    MERGE (p)-[:HAS_MEDICATION]->(m)
-    """
-    create_relationships(medications, rel_query, driver)
-
-    rel_query = """
-    UNWIND $batch AS row
-    MATCH (m:Medication {CODE: row.CODE})
-    MATCH (py:Payer {Id: row.PAYER})
-    MERGE (m)-[:COVERED_BY]->(py)
-    """
-    create_relationships(medications, rel_query, driver)
-    print("Relationships created successfully.")
-    # --- Embedding Generation and Storage ---
-    def patient_to_text(patient_dict):
-        fields = [
-            str(patient_dict.get("FIRST", "")),
-            str(patient_dict.get("LAST", "")),
-            str(patient_dict.get("GENDER", "")),
-            str(patient_dict.get("BIRTHDATE", "")),
-            str(patient_dict.get("ETHNICITY", "")),
-            str(patient_dict.get("RACE", "")),
-            str(patient_dict.get("INCOME", "")),
-            str(patient_dict.get("ZIP", ""))
-        ]
-        return " ".join(fields)
-
-    model = SentenceTransformer(EMBEDDING_MODEL)
-
-    print("Generating and storing patient embeddings...")
-    for i in range(0, len(patients), BATCH_SIZE):
-        batch = patients.iloc[i:i+BATCH_SIZE]
-        texts = [patient_to_text(row) for _, row in batch.iterrows()]
-        embeddings = model.encode(texts, normalize_embeddings=True)
-        for idx, emb in zip(batch.index, embeddings):
-            patient_id = patients.loc[idx, "Id"]
-            with driver.session() as session:
-                session.run(
-                    "MATCH (p:Patient {Id: $Id}) SET p.embedding = $embedding",
-                    Id=patient_id,
-                    embedding=emb.tolist()
-                )
-
-    print("All patient embeddings created and stored.")
-
-    # --- Create Vector Index ---
-    with driver.session() as session:
-        session.execute_write(
-            create_vector_index,
-            index_name="patient_embedding_index",
-            node_label="Patient",
-            embedding_property="embedding",
-            embedding_dimension=EMBEDDING_DIM,
-            similarity_function="cosine"
-        )
-
-        session.execute_write(
-            create_vector_index,
-            index_name="provider_embedding_index",
-            node_label="Provider",
-            embedding_property="embedding",
-            embedding_dimension=EMBEDDING_DIM,
-            similarity_function="cosine"
-        )
-        session.execute_write(
-            create_vector_index,
-            index_name="payer_embedding_index",
-            node_label="Payer",
-            embedding_property="embedding",
-            embedding_dimension=EMBEDDING_DIM,
-            similarity_function="cosine"
-        )
-        session.execute_write(
-            create_vector_index,
-            index_name="claim_embedding_index",
-            node_label="Claim",
-            embedding_property="embedding",
-            embedding_dimension=EMBEDDING_DIM,
-            similarity_function="cosine"
-        )
-        session.execute_write(
-            create_vector_index,
-            index_name="encounter_embedding_index",
-            node_label="Encounter",
-            embedding_property="embedding",
-            embedding_dimension=EMBEDDING_DIM,
-            similarity_function="cosine"
-        )
-        session.execute_write(
-            create_vector_index,
-            index_name="medication_embedding_index",
-            node_label="Medication",
-            embedding_property="embedding",
-            embedding_dimension=EMBEDDING_DIM,
-            similarity_function="cosine"
-        )
-
-
-    print("Vector index created.")
-
-    driver.close()
-    end = time.time()
-    print(f"Total time taken: {end - start} seconds")
-except Exception as e:
-    print(f"Error: {e}")
-    driver.close()
-    exit(1)
+# Encoder pool workers are spawned and re-import this file, so the build
+# itself only runs as __main__
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the patient knowledge graph, embeddings and vector indexes.")
+    parser.add_argument("--stream", action="store_true",
+                        help="read the CSVs in chunks instead of loading them fully into memory")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="rows per CSV chunk in --stream mode")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="re-encode every node instead of reusing the on-disk embedding cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only upsert/delete rows that changed since the last build's manifest")
+    parser.add_argument("--restart", action="store_true",
+                        help="start over instead of resuming from the checkpoint ledger of a failed build")
+    parser.add_argument("--fresh-load", action="store_true",
+                        help="empty database: add uniqueness constraints and CREATE instead of MERGE")
+    parser.add_argument("--labels", nargs="+", default=list(TEXT_FIELDS), choices=list(TEXT_FIELDS),
+                        help="node labels to embed (default: all labels with a vector index)")
+    parser.add_argument("--processes", type=int, default=ENCODER_PROCESSES,
+                        help="encoder processes (0 = one per CPU core, 1 = encode in this process)")
+    parser.add_argument("--features", action="store_true",
+                        help="also write structured patient feature vectors and their vector index")
+    parser.add_argument("--knn", type=int, default=0, metavar="K",
+                        help="also precompute every patient's K nearest neighbours as SIMILAR_TO relationships")
+    parser.add_argument("--profile-queries", choices=["explain", "profile"],
+                        help="EXPLAIN or PROFILE every pipeline query once and check the schema before loading")
+    parser.add_argument("--metrics-out", metavar="DIR",
+                        help="write per-stage metrics to DIR/build_metrics.json and DIR/build_metrics.prom")
+    args = parser.parse_args()
+
+    start = time.time()
+    # --- LOAD ENV ---
+    load_dotenv()
+    NEO4J_URI = os.getenv("NEO4J_URI")
+    NEO4J_USER = os.getenv("NEO4J_USER")
+    NEO4J_PASS = os.getenv("NEO4J_PASS")
+
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
+
+    try:
+        # --- LOAD DATA (IDs are cleaned up to str; in --stream mode per chunk) ---
+        data = {name: open_csv(name, args.stream, args.chunk_size) for name in CSV_ID_COLUMNS}
+        print("Data loaded successfully.")
+
+        # --- Query plans and schema (vector dimensions included), before anything is loaded ---
+        if args.profile_queries:
+            report = profile_pipeline(driver, data, args.profile_queries, create=args.fresh_load,
+                                      embedding_dimension=EMBEDDING_DIM, features=args.features, knn=bool(args.knn),
+                                      out_dir=args.metrics_out)
+            if report["errors"]:
+                raise RuntimeError("schema check failed, see [profile] ERROR lines above")
+
+        # Either way the model is only loaded if some text misses the cache
+        if args.processes == 1:
+            model, chunk_size = LazyModel(), BATCH_SIZE
+        else:
+            # a few length-sorted batches per worker per encode call
+            model = EncoderPool(args.processes)
+            chunk_size = BATCH_SIZE * 4 * model.processes
+        # One cache per label; flushed once per label rather than per chunk
+        caches = {label: None if args.no_cache else default_cache(label) for label in args.labels}
+        vector_setter = has_vector_setter(driver)
+        embed = lambda label, chunk: embed_nodes(label, chunk, model, driver, key=node_spec(label).key,
+                                                 batch_size=BATCH_SIZE, cache=caches[label], chunk_size=chunk_size,
+                                                 vector_setter=vector_setter, flush=False)
+
+        def embed_done(label):
+            if caches[label] is not None:
+                caches[label].flush()
+                print(caches[label])
+
+        if args.incremental:
+            # --- Create Indexes ---
+            create_indexes(driver)
+
+            # --- Apply only the rows that changed since the last build ---
+            deltas = scan_sources(data)
+            apply_deltas(deltas, driver)
+            print("Delta applied successfully.")
+
+            # --- Embed only new/changed nodes ---
+            for label in args.labels:
+                embed(label, deltas[node_spec(label).source].added)
+                embed_done(label)
+            print("All embeddings created and stored.")
+
+            # --- Create Vector Index ---
+            create_vector_indexes(driver, EMBEDDING_DIM)
+            print("Vector index created.")
+
+            # --- Recompute the k-NN lists the changed embeddings affect ---
+            if args.knn:
+                refresh_knn(driver, args.knn)
+        else:
+            # --- Graph, embeddings and vector indexes as a stage DAG
+            # (utils/build_dag.py); resumes from the ledger after a failure ---
+            build_graph(data, driver, embed=embed, embedding_dimension=EMBEDDING_DIM, resume=not args.restart,
+                        fresh_load=args.fresh_load, embed_labels=args.labels, knn_k=args.knn, embed_done=embed_done)
+            print("Graph, embeddings and vector indexes created.")
+
+        if args.features:
+            # --- Structured feature vectors (utils/feature_embedder.py) ---
+            embed_patient_features(deltas["patients"].added if args.incremental else data["patients"], driver)
+            create_feature_index(driver)
+            print("Patient feature vectors and index created.")
+
+        # Manifest for the next --incremental run
+        save_manifests(deltas if args.incremental else scan_sources(data, with_added=False))
+
+        if isinstance(model, EncoderPool):
+            model.close()
+        driver.close()
+        end = time.time()
+        print(f"Total time taken: {end - start} seconds")
+    except Exception as e:
+        print(f"Error: {e}")
+        driver.close()
+        exit(1)
+    finally:
+        # Also after a failure: shows where the stopped build spent its time
+        if args.metrics_out:
+            METRICS.write(args.metrics_out)
@@ -0,0 +1,60 @@
+# create_import_files.py
+# Cold load: write neo4j-admin import files instead of MERGEing into a live
+# database, then (after the import) create the indexes with --post-import.
+
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+import argparse
+import os
+import time
+from utils.ingest import open_csv, CSV_ID_COLUMNS, CHUNK_SIZE
+from utils.bulk_import import export_import_files, post_import, IMPORT_DIR
+from utils.incremental import scan_sources, save_manifests
+from utils.embeddings import encode_texts, patient_texts, LazyModel, EMBEDDING_DIM, BATCH_SIZE
+
+parser = argparse.ArgumentParser(description="Write neo4j-admin bulk import files for an empty database.")
+parser.add_argument("--out", default=IMPORT_DIR, help="directory for the import CSVs")
+parser.add_argument("--database", default="neo4j", help="target database name")
+parser.add_argument("--embeddings", action="store_true",
+                    help="encode patients and write their vectors as embedding:float[]")
+parser.add_argument("--no-cache", action="store_true",
+                    help="re-encode every patient instead of reusing the on-disk embedding cache")
+parser.add_argument("--stream", action="store_true",
+                    help="read the CSVs in chunks instead of loading them fully into memory")
+parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                    help="rows per CSV chunk in --stream mode")
+parser.add_argument("--post-import", action="store_true",
+                    help="after neo4j-admin has run: create the key and vector indexes")
+args = parser.parse_args()
+
+load_dotenv()
+start = time.time()
+
+if args.post_import:
+    driver = GraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASS")))
+    post_import(driver, EMBEDDING_DIM)
+    driver.close()
+    print("Indexes and vector indexes created.")
+    exit(0)
+
+try:
+    data = {name: open_csv(name, args.stream, args.chunk_size) for name in CSV_ID_COLUMNS}
+except Exception as e:
+    print(f"Error loading CSV files: {e}")
+    exit(1)
+
+embed = None
+if args.embeddings:
+    from utils.embedding_cache import default_cache
+    model = LazyModel()
+    cache = None if args.no_cache else default_cache()
+    embed = lambda chunk: encode_texts(model, patient_texts(chunk), BATCH_SIZE, cache)
+
+command = export_import_files(data, args.out, embed=embed, database=args.database)
+
+# Baseline for later --incremental runs of the online build scripts
+save_manifests(scan_sources(data, with_added=False))
+
+print(f"Import files written in {time.time() - start:.1f} seconds. Stop the database and run:\n")
+print(command)
+print("\nthen: python create_import_files.py --post-import")
@@ -0,0 +1,23 @@
+# create_knn_graph.py
+# Precompute every patient's k nearest neighbours (utils/knn_graph.py) as
+# SIMILAR_TO relationships. Incremental by default: only lists affected by
+# new or changed embeddings are rewritten.
+
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+import argparse
+import os
+from utils.knn_graph import refresh_knn, KNN_K
+
+parser = argparse.ArgumentParser(description="Precompute SIMILAR_TO k-NN lists for every patient.")
+parser.add_argument("--k", type=int, default=KNN_K, help="neighbours per patient")
+parser.add_argument("--full", action="store_true", help="recompute every list, not only the affected ones")
+args = parser.parse_args()
+
+load_dotenv()
+driver = GraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASS")))
+
+try:
+    refresh_knn(driver, args.k, full=args.full)
+finally:
+    driver.close()
@@ -0,0 +1,26 @@
+# create_vector_snapshot.py
+# Dump Patient embeddings from Neo4j into a local memory-mapped snapshot used
+# by VECTOR_BACKEND=local (utils/vector_index.py).
+
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+import argparse
+import os
+from utils.vector_index import export_snapshot, SNAPSHOT_DIR
+
+parser = argparse.ArgumentParser(description="Export Patient embeddings to a local vector snapshot.")
+parser.add_argument("--out", default=SNAPSHOT_DIR, help="snapshot directory")
+parser.add_argument("--ann", action="store_true",
+                    help="also build an approximate HNSW index (needs hnswlib)")
+args = parser.parse_args()
+
+load_dotenv()
+driver = GraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASS")))
+
+try:
+    index = export_snapshot(driver, args.out)
+    if args.ann:
+        index.build_ann()
+        print("Approximate index built.")
+finally:
+    driver.close()
@@ -2,6 +2,9 @@ from neo4j import GraphDatabase
 from dotenv import load_dotenv
 import os
 from utils.neo4j_helper import *
+from utils.embeddings import EMBEDDING_DIM
+from utils.feature_embedder import FEATURE_PROPERTY, FEATURE_DIM, create_feature_index
+from utils.query_profile import mismatched_vector_indexes
 
 load_dotenv()
 
@@ -12,55 +15,24 @@ NEO4J_PASS = os.getenv("NEO4J_PASS")
 
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
 
-with driver.session() as session:
-    # Create vector indexes for all relevant node types
-    session.execute_write(
-        create_vector_index,
-        index_name="patient_embedding_index",
-        node_label="Patient",
-        embedding_property="embedding",
-        embedding_dimension=1536,
-        similarity_function="cosine"
-    )
-    session.execute_write(
-        create_vector_index,
-        index_name="provider_embedding_index",
-        node_label="Provider",
-        embedding_property="embedding",
-        embedding_dimension=1536,
-        similarity_function="cosine"
-    )
-    session.execute_write(
-        create_vector_index,
-        index_name="payer_embedding_index",
-        node_label="Payer",
-        embedding_property="embedding",
-        embedding_dimension=1536,
-        similarity_function="cosine"
-    )
-    session.execute_write(
-        create_vector_index,
-        index_name="claim_embedding_index",
-        node_label="Claim",
-        embedding_property="embedding",
-        embedding_dimension=1536,
-        similarity_function="cosine"
-    )
-    session.execute_write(
-        create_vector_index,
-        index_name="encounter_embedding_index",
-        node_label="Encounter",
-        embedding_property="embedding",
-        embedding_dimension=1536,
-        similarity_function="cosine"
-    )
-    session.execute_write(
-        create_vector_index,
-        index_name="medication_embedding_index",
-        node_label="Medication",
-        embedding_property="embedding",
-        embedding_dimension=1536,
-        similarity_function="cosine"
-    )
+# Existing vector indexes must match the encoder: IF NOT EXISTS would keep
+# an index with the wrong dimension (these used to be created with 1536),
+# so those are dropped first
+mismatched = mismatched_vector_indexes(driver, EMBEDDING_DIM, features=True)
+for name, label, prop, found, dim in mismatched:
+    print(f"Dropping vector index {name} on :{label}({prop}): {found} dimensions, the encoder writes {dim}")
+    drop_index(driver, name)
 
-driver.close()
\ No newline at end of file
+# Create vector indexes for all relevant node types (VECTOR_INDEXES),
+# sized to the embedding model
+create_vector_indexes(driver, EMBEDDING_DIM)
+recreated = sum(prop == "embedding" for _, _, prop, _, _ in mismatched)
+print(f"Vector indexes created ({EMBEDDING_DIM} dimensions, {recreated} recreated).")
+
+# The structured feature index is only recreated if it was there (--features)
+if any(prop == FEATURE_PROPERTY for _, _, prop, _, _ in mismatched):
+    create_feature_index(driver)
+    print(f"Feature index recreated ({FEATURE_DIM} dimensions); rebuild with --features to rewrite the "
+          f"stored feature vectors.")
+
+driver.close()
@@ -3,6 +3,11 @@ import os
 from dotenv import load_dotenv
 from utils.neo4j_helper import *
 from utils.add_patient import *
+from utils.retrieval import (find_neighbours, fetch_eligibility, score_applicants, eligibility_score, find_hybrid,
+                             score_existing)
+import argparse
+import time
+import pandas as pd
 
 load_dotenv()
 NEO4J_URI = os.getenv("NEO4J_URI")
@@ -11,51 +16,82 @@ NEO4J_PASS = os.getenv("NEO4J_PASS")
 
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
 
-def get_embedding(patient_id):
-    with driver.session() as session:
-        result = session.run(
-            "MATCH (p:Patient {Id: $Id}) RETURN p.embedding AS embedding",
-            Id=patient_id
-        )
-        record = result.single()
-        return record["embedding"] if record else None
-
-def find_similar_patients(embedding, top_k=5):
-    with driver.session() as session:
-        result = session.run(
-            """
-            CALL db.index.vector.queryNodes('patient_embedding_index', $top_k, $embedding)
-            YIELD node, score
-            RETURN node.Id AS patient_id, score
-            ORDER BY score DESC
-            """,
-            top_k=top_k,
-            embedding=embedding
-        )
-        return [(r["patient_id"], r["score"]) for r in result]
+# Optional in-process backend (utils/vector_index.py); when set, similarity
+# search runs against the local snapshot instead of the Neo4j vector index
+LOCAL_INDEX = None
+if os.getenv("VECTOR_BACKEND") == "local":
+    from utils.vector_index import LocalVectorIndex
+    LOCAL_INDEX = LocalVectorIndex.load()
+
+# Same for GRAPH_BACKEND=local: eligibility is walked in the CSR snapshot
+# (utils/csr_graph.py, built by create_graph_snapshot.py)
+LOCAL_GRAPH = None
+if os.getenv("GRAPH_BACKEND") == "local":
+    from utils.csr_graph import LocalGraph
+    LOCAL_GRAPH = LocalGraph.load()
+
+def find_similar_patients(embedding, top_k=5, index=None):
+    index = index if index is not None else LOCAL_INDEX
+    return find_neighbours(driver, [embedding], top_k, index)[0]
 
 def check_eligibility(patient_ids):
-    cypher_patient_ids = "[" + ", ".join(f'"{pid}"' for pid in patient_ids) + "]"
-    query = f"""
-    UNWIND {cypher_patient_ids} AS pid
-    MATCH (p:Patient {{Id: pid}})-[:HAS_CLAIM]->(c:Claim)-[:PAID_BY]->(py:Payer)
-    WHERE py.NAME IN ['Medicare', 'Medicaid']
-    RETURN p.Id AS patient_id, collect(DISTINCT py.NAME) AS eligible_payers
-    """
-    with driver.session() as session:
-        result = session.run(
-            query
-        )
-        return {r["patient_id"]: r["eligible_payers"] for r in result}
-
-def eligibility_score(similar_patients, eligibility):
-    eligible_scores = [score for pid, score in similar_patients if eligibility.get(pid)]
-    total_score = sum([score for _, score in similar_patients])
-    if total_score == 0:
-        return 0
-    return sum(eligible_scores) / total_score
+    return fetch_eligibility(driver, patient_ids, graph=LOCAL_GRAPH)
+
+def find_similar_patients_hybrid(patient, embedding, top_k=5, require=()):
+    # Neighbours re-ranked by shared demographics, and their eligibility, in
+    # one round trip (see utils/retrieval.find_hybrid)
+    demographics = add_demographics(pd.DataFrame([patient])).to_dict("records")
+    neighbours, eligibility = find_hybrid(driver, [embedding], demographics, top_k, require)
+    return neighbours[0], eligibility
+
+def score_patients(patients, top_k=5, store=True, hybrid=False, require=(), features=False):
+    # Batch API: a list of patient dicts -> one result dict per applicant
+    # (see utils/retrieval.score_applicants)
+    return score_applicants(patients, model, driver, top_k=top_k, store=store,
+                            index=LOCAL_INDEX, cache=default_cache(), graph=LOCAL_GRAPH,
+                            hybrid=hybrid, require=require, features=features)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score applicants for Medicare/Medicaid eligibility.")
+    parser.add_argument("--applicants", help="CSV of applicants (patients.csv columns) to score in one batch")
+    parser.add_argument("--existing", nargs="+", metavar="ID",
+                        help="re-score patients already in the graph (precomputed SIMILAR_TO lists when fresh)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--hybrid", action="store_true",
+                        help="re-rank neighbours by shared demographics and fetch eligibility in the same query")
+    parser.add_argument("--require", nargs="+", default=[], choices=["AGE_RANGE", "INCOME_RANGE", "ZIPCODE"],
+                        help="with --hybrid: only keep neighbours in the applicant's bucket(s)")
+    parser.add_argument("--features", action="store_true",
+                        help="with --applicants: match on structured feature vectors instead of text embeddings")
+    args = parser.parse_args()
+
+    if args.existing:
+        try:
+            start = time.perf_counter()
+            results = score_existing(driver, args.existing, top_k=args.top_k, index=LOCAL_INDEX, graph=LOCAL_GRAPH)
+            elapsed = time.perf_counter() - start
+            for r in results:
+                source = "precomputed" if r["precomputed"] else "live"
+                print(f"{r['Id']}: {r['eligibility_score']:.3f} ({source} neighbours)")
+            print(f"Scored {len(results)} patients in {elapsed:.2f}s")
+        finally:
+            driver.close()
+        exit(0)
+
+    if args.applicants:
+        try:
+            applicants = pd.read_csv(args.applicants).to_dict("records")
+            start = time.perf_counter()
+            results = score_patients(applicants, top_k=args.top_k, hybrid=args.hybrid, require=args.require,
+                                     features=args.features)
+            elapsed = time.perf_counter() - start
+            for r in results:
+                print(f"{r['Id']}: {r['eligibility_score']:.3f}")
+            print(f"Scored {len(results)} applicants in {elapsed:.2f}s ({len(results) / elapsed:.1f} applicants/sec)")
+        finally:
+            driver.close()
+        exit(0)
+
     try:
         new_patient = {
             "Id": "dff5e8b2-1234-4cde-8f9a-abcdef123456",  # unique and different
@@ -80,9 +116,8 @@ if __name__ == "__main__":
 
 
         add_patient(new_patient, driver)
-        embed_and_store(new_patient["Id"], new_patient, driver)  # No openai argument needed
-
-        embedding = get_embedding(new_patient["Id"])
+        # embed_and_store returns the vector it wrote, so no read-back round trip
+        embedding = embed_and_store(new_patient["Id"], new_patient, driver)
         # print(f"Embedding for new patient {new_patient['Id']}: {embedding}")
 
         if embedding is None:
@@ -90,9 +125,13 @@ if __name__ == "__main__":
             driver.close()
             exit(1)
 
-        similar_patients = find_similar_patients(embedding, top_k=5)
+        if args.hybrid:
+            similar_patients, eligibility = find_similar_patients_hybrid(
+                new_patient, embedding, top_k=args.top_k, require=args.require)
+        else:
+            similar_patients = find_similar_patients(embedding, top_k=args.top_k)
+            eligibility = check_eligibility([str(pid) for pid, _ in similar_patients])
         print(['"'+str(pid)+'"' for pid, _ in similar_patients])
-        eligibility = check_eligibility([str(pid) for pid, _ in similar_patients])
         print(eligibility)
         score = eligibility_score(similar_patients, eligibility)
         print(f"Eligibility score for Medicare/Medicaid: {score:.3f}")
@@ -0,0 +1,65 @@
+# serve.py
+# Asyncio HTTP service for "score this applicant" (utils/service.py).
+# Concurrent requests are coalesced into batched encode / k-NN / eligibility
+# calls over the async Neo4j driver.
+#
+#   python serve.py --port 8080
+#   curl -X POST localhost:8080/score -d '{"Id": "a1", "FIRST": "Lars", ...}'
+
+from neo4j import AsyncGraphDatabase
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import os
+from utils.embeddings import get_model, warm_up
+from utils.embedding_cache import default_cache
+from utils.service import ScoringService, serve, COALESCE_WINDOW_MS, MAX_BATCH
+
+parser = argparse.ArgumentParser(description="Serve applicant eligibility scoring over HTTP.")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8080)
+parser.add_argument("--top-k", type=int, default=5)
+parser.add_argument("--window-ms", type=float, default=COALESCE_WINDOW_MS,
+                    help="how long to wait for more requests before scoring a batch")
+parser.add_argument("--max-batch", type=int, default=MAX_BATCH,
+                    help="score a batch as soon as it reaches this size (1 disables coalescing)")
+parser.add_argument("--no-cache", action="store_true", help="don't use the on-disk embedding cache")
+parser.add_argument("--no-warm-up", action="store_true",
+                    help="load the model on the first request instead of at startup")
+args = parser.parse_args()
+
+load_dotenv()
+
+
+async def main():
+    driver = AsyncGraphDatabase.driver(os.getenv("NEO4J_URI"), auth=(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASS")))
+    index = None
+    if os.getenv("VECTOR_BACKEND") == "local":
+        from utils.vector_index import LocalVectorIndex
+        index = LocalVectorIndex.load()
+    graph = None
+    if os.getenv("GRAPH_BACKEND") == "local":
+        from utils.csr_graph import LocalGraph
+        graph = LocalGraph.load()
+    if not args.no_warm_up:
+        warm_up()
+    # One encoder thread: the model and the embedding cache are shared
+    executor = ThreadPoolExecutor(max_workers=1)
+    service = ScoringService(
+        driver, get_model(), top_k=args.top_k, index=index,
+        cache=None if args.no_cache else default_cache(), executor=executor,
+        window_ms=args.window_ms, max_batch=args.max_batch, graph=graph,
+    )
+    try:
+        await serve(service, args.host, args.port)
+    finally:
+        await service.close()
+        await driver.close()
+        executor.shutdown()
+
+
+try:
+    asyncio.run(main())
+except KeyboardInterrupt:
+    pass
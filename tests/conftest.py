@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# Scripts and utils/ are imported from the repository root, as when run there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeResult:
+    def __init__(self, records=()):
+        self.records = list(records)
+
+    def consume(self):
+        return None
+
+    def single(self):
+        return self.records[0] if self.records else None
+
+    def data(self):
+        return self.records
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        with self.driver.lock:
+            self.driver.calls.append((query, params))
+        return FakeResult(self.driver.respond(query, params))
+
+    def execute_write(self, work, *args, **kwargs):
+        return work(self, *args, **kwargs)
+
+    execute_read = execute_write
+
+
+class FakeDriver:
+    # Records every query and its parameters; `respond(query, params)`
+    # supplies result records
+    def __init__(self, respond=None):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.respond = respond or (lambda query, params: [])
+
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+    def close(self):
+        pass
+
+    def batches(self, fragment):
+        # Rows sent as $batch to queries containing `fragment`
+        return [row for query, params in self.calls if fragment in query for row in params.get("batch", [])]
+
+
+@pytest.fixture
+def driver():
+    return FakeDriver()
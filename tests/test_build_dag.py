@@ -0,0 +1,24 @@
+import pandas as pd
+
+from utils.build_dag import source_fingerprint
+from utils.ingest import open_csv
+
+
+def write_patients(directory, ids):
+    directory.mkdir()
+    pd.DataFrame({"Id": ids, "ZIP": [2134] * len(ids)}).to_csv(directory / "patients.csv", index=False)
+
+
+def test_fingerprint_follows_the_directory_sources_came_from(tmp_path):
+    write_patients(tmp_path / "a", ["p1", "p2"])
+    write_patients(tmp_path / "b", ["p1", "p2"])
+    for stream in (False, True):
+        a = source_fingerprint({"patients": open_csv("patients", stream, data_dir=tmp_path / "a")})
+        b = source_fingerprint({"patients": open_csv("patients", stream, data_dir=tmp_path / "b")})
+        assert a["patients"] and a != b
+
+
+def test_fingerprint_of_in_memory_frames_tracks_content():
+    frame = pd.DataFrame({"Id": ["p1", "p2"], "ZIP": [2134, 2139]})
+    assert source_fingerprint({"patients": frame}) == source_fingerprint({"patients": frame.copy()})
+    assert source_fingerprint({"patients": frame}) != source_fingerprint({"patients": frame.assign(ZIP=[2134, 2140])})
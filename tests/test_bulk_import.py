@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from utils.bulk_import import ImportWriter
+
+
+def test_node_header_types_come_from_every_chunk(tmp_path):
+    # DEATHDATE is empty in the first chunk, INCOME has a NaN in the second
+    chunks = [pd.DataFrame({"Id": ["p1"], "DEATHDATE": [np.nan], "INCOME": [52000], "LAT": [42.1]}),
+              pd.DataFrame({"Id": ["p2", "p3"], "DEATHDATE": ["2020-01-01", np.nan], "INCOME": [np.nan, 18000.0],
+                            "LAT": [41.5, 40.0]})]
+    ImportWriter(tmp_path).write_nodes("Patient", chunks, "Id")
+    lines = (tmp_path / "nodes_Patient.csv").read_text().splitlines()
+    assert lines[0] == "Id:ID(Patient),DEATHDATE,INCOME:long,LAT:double"
+    assert lines[1:] == ["p1,,52000,42.1", "p2,2020-01-01,,41.5", "p3,,18000,40.0"]
+
+
+def test_relationships_are_written_once(tmp_path):
+    chunks = [pd.DataFrame({"s": ["a", "a", "b", "x"], "e": ["1", "1", "2", "1"]}),
+              pd.DataFrame({"s": ["b", "a", np.nan], "e": ["2", "2", "1"]})]
+    ImportWriter(tmp_path).write_relationships("R", "R", "A", "B", chunks, {"a", "b"}, {"1", "2"})
+    lines = (tmp_path / "relationships_R.csv").read_text().splitlines()
+    assert lines[1:] == ["a,1,R", "b,2,R", "a,2,R"]
+
+
+def test_repeated_key_keeps_its_last_row(tmp_path):
+    # One Medication per CODE; the online MERGE ... SET n += row ends with the last dispense's values
+    chunks = [pd.DataFrame({"CODE": ["m1", "m2", "m1"], "BASE_COST": [1.5, 2.5, 3.5]}),
+              pd.DataFrame({"CODE": ["m2", None], "BASE_COST": [4.5, 9.5]})]
+    ids = ImportWriter(tmp_path).write_nodes("Medication", chunks, "CODE")
+    lines = (tmp_path / "nodes_Medication.csv").read_text().splitlines()
+    assert sorted(lines[1:]) == ["m1,3.5", "m2,4.5"]
+    assert ids == {"m1", "m2"}
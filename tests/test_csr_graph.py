@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from utils.csr_graph import build_snapshot
+
+
+def tiny_data():
+    empty = lambda *columns: pd.DataFrame({c: pd.Series(dtype=object) for c in columns})
+    return {
+        "patients": pd.DataFrame({"Id": ["p1", "p2", "p3"], "BIRTHDATE": ["1950-01-01", "1990-01-01", None],
+                                  "INCOME": [15000, 60000, np.nan], "ZIP": [2134, 2134.0, np.nan]}),
+        "payers": pd.DataFrame({"Id": ["py1", "py2"], "NAME": ["Medicare", "Aetna"]}),
+        "providers": empty("Id"),
+        "encounters": empty("Id", "PATIENT", "PROVIDER", "PAYER"),
+        # c4 belongs to a patient that isn't loaded; c5 has no payer
+        "claims": pd.DataFrame({"Id": ["c1", "c2", "c3", "c4", "c5"], "PATIENTID": ["p1", "p2", "p1", "p9", "p3"],
+                                "PROVIDERID": [None] * 5,
+                                "PRIMARYPATIENTINSURANCEID": ["py1", "py2", "py2", "py1", None]}),
+        "medications": empty("CODE", "ENCOUNTER", "PATIENT", "PAYER"),
+    }
+
+
+def test_snapshot_answers_like_the_graph(tmp_path):
+    graph = build_snapshot(tiny_data(), str(tmp_path))
+    assert graph.eligibility(["p1", "p2", "p3", "p9"]) == {"p1": ["Medicare"]}
+    demographics = graph.demographics(["p1", "p3"])
+    assert demographics["p1"] == {"AGE_RANGE": ["65+"], "INCOME_RANGE": ["<20k"], "ZIPCODE": ["2134"]}
+    assert demographics["p3"] == {"AGE_RANGE": ["Unknown"], "INCOME_RANGE": ["Unknown"], "ZIPCODE": []}
+    assert sorted(graph.patients_with("ZIPCODE", "2134")) == ["p1", "p2"]
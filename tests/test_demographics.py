@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from utils.neo4j_helper import add_demographics, age_bucket, create_demographics, income_bucket, zipcode, zipcodes
+
+
+def test_zipcodes_agree_across_dtypes():
+    assert zipcodes(pd.Series([2134, 2139])).tolist() == ["2134", "2139"]
+    # A missing ZIP turns the column float; the others keep their key
+    assert zipcodes(pd.Series([2134.0, np.nan])).tolist() == ["2134", None]
+    assert zipcodes(pd.Series(["2134", " K1A ", None], dtype=object)).tolist() == ["2134", "K1A", None]
+    assert [zipcode(v) for v in (2134, 2134.0, "2134", np.nan, None)] == ["2134"] * 3 + [None] * 2
+
+
+def test_chunks_merge_one_zipcode_and_skip_missing(driver):
+    # Streamed chunks: the second has a missing ZIP, so its column is float
+    def chunk(ids, zips):
+        return pd.DataFrame({"Id": ids, "BIRTHDATE": ["1980-01-01"] * len(ids), "INCOME": [30000] * len(ids),
+                             "ZIP": zips})
+    chunks = [chunk(["p1"], [2134]), chunk(["p2", "p3"], [np.nan, 2134.0])]
+    create_demographics(chunks, driver)
+    merged = [params["values"] for query, params in driver.calls if "MERGE (:Zipcode" in query]
+    assert sorted(v for values in merged for v in values) == ["2134"]
+    assert add_demographics(chunks[1].copy())["ZIPCODE"].tolist() == [None, "2134"]
+
+
+def test_missing_age_and_income_are_unknown():
+    patients = pd.DataFrame({"Id": ["p1", "p2"], "BIRTHDATE": ["1950-03-01", None], "INCOME": [np.nan, 250000],
+                             "ZIP": [2134, 2139]})
+    derived = add_demographics(patients.copy())
+    assert derived["AGE_RANGE"].tolist() == ["65+", "Unknown"]
+    assert derived["INCOME_RANGE"].tolist() == ["Unknown", "100k+"]
+    # Scalar versions (add_patient) agree
+    assert age_bucket(np.nan) == age_bucket(None) == income_bucket(np.nan) == income_bucket(None) == "Unknown"
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from utils.embedding_cache import CacheInUse, EmbeddingCache
+
+
+class CountingModel:
+    # Deterministic unit vectors per text, so a wrong row is easy to spot
+    def __init__(self, dim):
+        self.dim = dim
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += len(texts)
+        out = np.stack([np.random.default_rng(sum(t.encode())).standard_normal(self.dim) for t in texts])
+        return (out / np.linalg.norm(out, axis=1, keepdims=True)).astype(np.float32)
+
+
+def open_cache(path, max_entries=8):
+    return EmbeddingCache(path=str(path), model_name="test", dim=4, max_entries=max_entries)
+
+
+def test_round_trip_across_reopen(tmp_path):
+    model = CountingModel(4)
+    cache = open_cache(tmp_path)
+    first = cache.encode(model, ["a", "b", "c"])
+    cache.close()
+    cache = open_cache(tmp_path)
+    assert np.allclose(cache.encode(model, ["c", "a", "b"]), first[[2, 0, 1]])
+    assert model.calls == 3
+    cache.close()
+
+
+def test_evicted_rows_never_serve_another_text(tmp_path):
+    model = CountingModel(4)
+    cache = open_cache(tmp_path, max_entries=4)
+    cache.encode(model, [f"t{i}" for i in range(4)])
+    cache.flush()
+    cache.encode(model, ["u0", "u1"])  # evicts two rows, no flush after
+    # Simulate a crash: reopen from what is on disk without close()
+    cache._lock_file.close()
+    reopened = open_cache(tmp_path, max_entries=4)
+    texts = [f"t{i}" for i in range(4)] + ["u0", "u1"]
+    for text, slot in ((t, reopened._slots.get(reopened.key(t))) for t in texts):
+        if slot is not None:
+            assert np.allclose(reopened._vectors[slot], model.encode([text])[0])
+    reopened.close()
+
+
+def test_second_process_is_refused(tmp_path):
+    cache = open_cache(tmp_path)
+    with pytest.raises(CacheInUse):
+        open_cache(tmp_path)
+    cache.close()
+    open_cache(tmp_path).close()
@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.embedding_cache import EmbeddingCache
+from utils.embeddings import TEXT_FIELDS, embed_nodes, node_texts
+
+
+class FakeModel:
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+
+def test_chunked_embedding_resolves_setter_once_and_defers_flush(driver, tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path), model_name="test", dim=4)
+    chunks = [pd.DataFrame({"Id": ["p1", "p2"]}), pd.DataFrame({"Id": ["p3"]})]
+    for chunk in chunks:
+        embed_nodes("Patient", chunk, FakeModel(), driver, cache=cache, vector_setter=False, flush=False, workers=1)
+    assert not any("SHOW PROCEDURES" in query for query, _ in driver.calls)
+    assert sorted(row["id"] for row in driver.batches("SET n.embedding")) == ["p1", "p2", "p3"]
+    assert not (tmp_path / "test-4" / "meta.json").exists()
+    cache.close()
+
+
+def test_medication_text_is_per_code():
+    # Two dispenses of one code for different reasons embed the same text
+    dispenses = pd.DataFrame({"CODE": ["834061", "834061"], "DESCRIPTION": ["Penicillin V 250 MG"] * 2,
+                              "REASONDESCRIPTION": ["Sore throat", "Otitis media"]})
+    texts = node_texts(dispenses, TEXT_FIELDS["Medication"])
+    assert texts[0] == texts[1]
+
+
+def test_encoder_pool_starts_once_under_concurrent_stages(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from utils import encoder_pool
+
+    started = []
+
+    class Context:
+        def Pool(self, *args, **kwargs):
+            started.append(args)
+            time.sleep(0.05)  # widen the race window
+            return object()
+
+    monkeypatch.setattr(encoder_pool.multiprocessing, "get_context", lambda method: Context())
+    pool = encoder_pool.EncoderPool(2)
+    with ThreadPoolExecutor(4) as executor:
+        pools = list(executor.map(lambda _: pool._start(), range(4)))
+    assert len(started) == 1 and all(p is pools[0] for p in pools)
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from utils.feature_embedder import CATEGORICAL_FIELDS, FEATURE_DIM, _one_hot, patient_features
+
+
+def test_known_categories_get_distinct_slots():
+    for field, values in CATEGORICAL_FIELDS.items():
+        column = pd.Series(values + ["something else", None], dtype=object)
+        slots = _one_hot(column, values)
+        known = slots[:len(values)].argmax(axis=1)
+        assert len(set(known.tolist())) == len(values), field
+        # Any other value shares the last slot; missing sets none
+        assert slots[len(values)].argmax() == len(values)
+        assert slots[len(values)].argmax() not in known
+        assert not slots[-1].any()
+
+
+def test_gender_separates_patients():
+    frame = pd.DataFrame({"GENDER": pd.Categorical(["M", "F", None]), "BIRTHDATE": ["1980-01-01"] * 3})
+    vectors = patient_features(frame)
+    assert vectors.shape == (3, FEATURE_DIM)
+    assert not np.allclose(vectors[0], vectors[1])
+    assert not np.allclose(vectors[0], vectors[2])
+
+
+def test_vectors_are_unit_length_and_batch_independent():
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        "GENDER": rng.choice(["M", "F"], 50), "RACE": rng.choice(CATEGORICAL_FIELDS["RACE"], 50),
+        "ETHNICITY": rng.choice(["hispanic", "nonhispanic"], 50), "MARITAL": rng.choice(["M", "S"], 50),
+        "BIRTHDATE": ["1960-05-01"] * 50, "INCOME": rng.integers(0, 200000, 50), "ZIP": rng.integers(1000, 99999, 50),
+        "LAT": rng.uniform(25, 48, 50), "LON": rng.uniform(-120, -70, 50),
+    })
+    whole = patient_features(frame)
+    assert np.allclose(np.linalg.norm(whole, axis=1), 1.0)
+    assert np.allclose(whole[10:20], patient_features(frame.iloc[10:20]))
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from utils.incremental import row_hashes, scan_source, save_manifest
+
+
+def patients(zips, incomes):
+    n = len(zips)
+    return pd.DataFrame({"Id": [f"p{i}" for i in range(n)], "ZIP": zips, "INCOME": incomes,
+                         "GENDER": pd.Categorical(["M", "F"] * (n // 2) + ["M"] * (n % 2))})
+
+
+def test_row_hashes_ignore_dtype_drift():
+    ints = patients([2134, 2139], [52000, 18000])
+    floats = patients([2134.0, 2139.0, np.nan], [52000.0, 18000.0, None])
+    floats["GENDER"] = floats["GENDER"].astype(object)
+    assert (row_hashes(ints) == row_hashes(floats)[:2]).all()
+
+
+def test_row_hashes_see_real_changes():
+    before = patients([2134, 2139], [52000.5, 18000])
+    after = patients([2134, 2140], [52000.25, 18000])
+    changed = row_hashes(before) != row_hashes(after)
+    assert changed.tolist() == [True, True]
+    assert (row_hashes(before) != row_hashes(patients([np.nan, 2139], [52000.5, 18000]))).tolist() == [True, False]
+
+
+def test_scan_source_only_reports_rows_that_changed(tmp_path):
+    first = patients([2134, 2139, 2140], [52000, 18000, 75000])
+    save_manifest(scan_source("patients", first, tmp_path, with_added=False), tmp_path)
+    # One new row without a ZIP turns the column float; only that row is new
+    second = pd.concat([first, patients([np.nan], [30000]).assign(Id="p9")], ignore_index=True)
+    delta = scan_source("patients", second, tmp_path)
+    assert delta.added["Id"].tolist() == ["p9"]
+    assert delta.removed.empty
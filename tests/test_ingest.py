@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from utils.graph_schema import RELATIONSHIPS, relationship_columns, relationship_query
+from utils.ingest import frame_records, iter_records
+from utils.neo4j_helper import create_relationships
+
+
+def test_frame_records_drops_or_nulls_empty_cells():
+    frame = pd.DataFrame({"Id": ["a", "b"], "ZIP": [2134.0, np.nan], "EMPTY": [np.nan, np.nan]})
+    assert frame_records(frame) == [{"Id": "a", "ZIP": 2134.0}, {"Id": "b"}]
+    assert frame_records(frame, drop_nulls=False) == [
+        {"Id": "a", "ZIP": 2134.0, "EMPTY": None}, {"Id": "b", "ZIP": None, "EMPTY": None}]
+    assert frame_records(frame, ["Id"]) == [{"Id": "a"}, {"Id": "b"}]
+
+
+def test_iter_records_skips_rows_missing_a_required_column():
+    frame = pd.DataFrame({"Id": ["c1", "c2", "c3"], "PATIENTID": ["p1", np.nan, "p3"], "X": [1, 2, 3]})
+    rows = list(iter_records(frame, columns=["Id", "PATIENTID"], required=["Id", "PATIENTID"]))
+    assert rows == [{"Id": "c1", "PATIENTID": "p1"}, {"Id": "c3", "PATIENTID": "p3"}]
+
+
+def test_relationship_load_skips_null_endpoint(driver):
+    # A null start column used to drop out of the row and fail the loader's
+    # partition lookup; such rows can't MATCH anything and are skipped
+    rel = next(r for r in RELATIONSHIPS if r.name == "HAS_CLAIM")
+    claims = pd.DataFrame({"Id": ["c1", "c2", "c3"], "PATIENTID": ["p1", np.nan, "p3"]})
+    stats = create_relationships(claims, relationship_query(rel), driver, key=rel.start_col, name=rel.name,
+                                 columns=relationship_columns(rel), workers=2, batch_size=1)
+    assert stats.rows == 2
+    assert sorted(r["Id"] for r in driver.batches("HAS_CLAIM")) == ["c1", "c3"]
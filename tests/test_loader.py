@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+from neo4j.exceptions import TransientError
+
+from utils import loader
+from utils.loader import load_rows
+
+
+def test_rows_with_one_key_share_a_worker(driver):
+    seen = {}
+    def respond(query, params):
+        for row in params["batch"]:
+            seen.setdefault(row["k"], set()).add(threading.current_thread().name)
+        return []
+    driver.respond = respond
+    rows = [{"k": f"key{i % 7}", "n": i} for i in range(500)]
+    stats = load_rows(driver, "UNWIND $batch AS row", rows, key="k", workers=4, batch_size=16, verbose=False)
+    assert stats.rows == 500
+    assert sorted(r["n"] for r in driver.batches("UNWIND")) == list(range(500))
+    assert all(len(threads) == 1 for threads in seen.values())
+
+
+def test_transient_errors_are_retried(driver, monkeypatch):
+    monkeypatch.setattr(loader.time, "sleep", lambda seconds: None)
+    failures = [TransientError("deadlock")] * 2
+    def respond(query, params):
+        if failures:
+            raise failures.pop()
+        return []
+    driver.respond = respond
+    stats = load_rows(driver, "UNWIND $batch AS row", [{"n": 1}], workers=1, verbose=False)
+    assert (stats.rows, stats.retries) == (1, 2)
+
+
+def test_a_failed_batch_fails_the_load(driver):
+    def respond(query, params):
+        raise ValueError("bad row")
+    driver.respond = respond
+    with pytest.raises(ValueError):
+        load_rows(driver, "UNWIND $batch AS row", [{"n": i} for i in range(50)], workers=2, batch_size=5,
+                  verbose=False)
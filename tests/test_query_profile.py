@@ -0,0 +1,16 @@
+from conftest import FakeDriver
+from utils.query_profile import check_schema, mismatched_vector_indexes
+
+
+def vector_index(name, label, prop, dim):
+    return {"name": name, "type": "VECTOR", "state": "ONLINE", "labelsOrTypes": [label], "properties": [prop],
+            "options": {"indexConfig": {"vector.dimensions": dim}}}
+
+
+def test_wrong_dimension_vector_index_is_an_error():
+    indexes = [vector_index("patient_embedding_index", "Patient", "embedding", 1536),
+               vector_index("claim_embedding_index", "Claim", "embedding", 384)]
+    driver = FakeDriver(lambda query, params: indexes if query.startswith("SHOW INDEXES") else [])
+    assert mismatched_vector_indexes(driver, 384) == [("patient_embedding_index", "Patient", "embedding", 1536, 384)]
+    errors, _ = check_schema(driver, 384)
+    assert len(errors) == 1 and "create_vectors.py" in errors[0]
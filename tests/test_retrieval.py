@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from utils.retrieval import BATCH_VECTOR_QUERY, find_hybrid, score_applicants
+from utils.result_cache import LRUCache, invalidate_eligibility, invalidate_neighbours
+
+
+class FakeModel:
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+
+def test_applicants_are_scored_before_they_are_stored(driver):
+    invalidate_neighbours()
+    invalidate_eligibility()
+    # The index already holds a1 from an earlier run; a2 is new
+    def respond(query, params):
+        if query == BATCH_VECTOR_QUERY:
+            return [{"i": i, "patient_id": pid, "score": score}
+                    for i in range(len(params["embeddings"]))
+                    for pid, score in (("a1", 1.0), ("x", 0.9), ("y", 0.8))]
+        return []
+    driver.respond = respond
+    patients = [{"Id": "a1", "BIRTHDATE": "1980-01-01", "INCOME": 30000, "ZIP": 2134},
+                {"Id": "a2", "BIRTHDATE": "1990-01-01", "INCOME": 60000, "ZIP": 2139}]
+    results = score_applicants(patients, FakeModel(), driver, top_k=2)
+    assert [[q for q, _, _ in r["similar_patients"]] for r in results] == [["x", "y"], ["a1", "x"]]
+    queries = [query for query, _ in driver.calls]
+    stored = next(n for n, query in enumerate(queries) if "Patient" in query and "MERGE" in query)
+    assert queries.index(BATCH_VECTOR_QUERY) < stored
+
+
+def test_hybrid_require_filters_before_ranking(driver):
+    demographics = [{"AGE_RANGE": "35-50", "INCOME_RANGE": "20k-50k", "ZIPCODE": "2134"}]
+    find_hybrid(driver, [[0.5] * 4], demographics, top_k=3, require=["ZIPCODE"])
+    find_hybrid(driver, [[0.5] * 4], demographics, top_k=3)
+    (required, _), (ranked, _) = driver.calls
+    # Candidates come from the applicant's Zipcode, not the vector index's top hits
+    assert "MATCH (:Zipcode {zipcode: q.ZIPCODE})<-[:LIVES_IN]-(p:Patient)" in required
+    assert "queryNodes" not in required and "vector.similarity.cosine" in required
+    assert "queryNodes" in ranked
+
+
+def test_add_patient_writes_the_same_properties_as_a_batch(driver):
+    from utils.add_patient import add_patient
+    from utils.retrieval import store_applicants
+
+    patient = {"Id": "a1", "FIRST": "Ana", "SSN": "999-12-3456", "BIRTHDATE": "1980-01-01", "GENDER": "F",
+               "INCOME": 30000, "ZIP": 2134, "DEATHDATE": None}
+    add_patient(patient, driver)
+    single = driver.batches("MERGE (n:Patient")
+    driver.calls.clear()
+    store_applicants(pd.DataFrame([patient]), np.ones((1, 4), dtype=np.float32), driver)
+    assert single == driver.batches("MERGE (n:Patient")
+    assert "SSN" not in single[0] and "DEATHDATE" not in single[0]
+
+
+def test_cache_items_snapshot_skips_expired_entries():
+    cache = LRUCache("Test", ttl=60)
+    cache.put("p1", ["Medicaid"])
+    cache.put("p2", [])
+    cache.put("p3", ["Medicare"])
+    value, _, size = cache._entries["p2"]
+    cache._entries["p2"] = (value, 0.0, size)
+    assert cache.items() == [("p1", ["Medicaid"]), ("p3", ["Medicare"])]
+    assert cache.hits == cache.misses == 0
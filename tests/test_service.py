@@ -0,0 +1,23 @@
+import asyncio
+
+from utils.service import Coalescer
+
+
+def test_coalescer_keeps_batch_tasks_until_close():
+    async def handler(items):
+        await asyncio.sleep(0.01)
+        return [item * 2 for item in items]
+
+    async def main():
+        coalescer = Coalescer(handler, window_ms=1, max_batch=2)
+        waiters = [asyncio.ensure_future(coalescer.submit(i)) for i in range(3)]
+        await asyncio.sleep(0)
+        # The full batch is running; the leftover item is still pending
+        assert len(coalescer._tasks) == 1
+        await coalescer.close()
+        assert not coalescer._tasks
+        return await asyncio.gather(*waiters), coalescer.batches
+
+    results, batches = asyncio.run(main())
+    assert results == [0, 2, 4]
+    assert batches == 2
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from utils.vector_index import LocalVectorIndex
+
+
+def random_index(n=2000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return LocalVectorIndex(np.array([f"p{i}" for i in range(n)]), vectors), rng
+
+
+def test_blocked_exact_search_matches_brute_force():
+    index, rng = random_index()
+    queries = rng.standard_normal((20, 32)).astype(np.float32)
+    results = index.search(queries, top_k=10, block_size=300)
+    unit = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    expected = np.argsort(-(unit @ index.vectors.T), axis=1)[:, :10]
+    assert [[pid for pid, _ in r] for r in results] == [[f"p{i}" for i in row] for row in expected]
+    assert all(r[0][1] >= r[-1][1] for r in results)
+
+
+def test_ann_top_k_matches_exact():
+    pytest.importorskip("hnswlib")
+    index, rng = random_index()
+    index.build_ann(ef=200)
+    queries = rng.standard_normal((50, 32)).astype(np.float32)
+    exact, approximate = index.search(queries, 10), index.search_approximate(queries, 10)
+    recall = np.mean([len({p for p, _ in e} & {p for p, _ in a}) / 10 for e, a in zip(exact, approximate)])
+    assert recall >= 0.95
+    # Same score scale: (1 + cosine) / 2
+    scores = dict(exact[0])
+    assert all(abs(scores[pid] - s) < 1e-4 for pid, s in approximate[0] if pid in scores)
@@ -1,51 +1,46 @@
+import pandas as pd
 from neo4j import GraphDatabase
-from utils.neo4j_helper import get_age, age_bucket, income_bucket, connect_patient_demographics
+from utils.graph_schema import node_spec, node_columns, node_query
+from utils.ingest import frame_records
+from utils.neo4j_helper import get_age, age_bucket, income_bucket, zipcode, connect_patient_demographics
+from utils.embeddings import PATIENT_TEXT_FIELDS, LazyModel, encode_texts
+from utils.embedding_cache import default_cache
+from utils.result_cache import invalidate_eligibility, invalidate_neighbours
 
 def add_patient(patient_dict, driver):
-    # Create Patient node
+    # Create Patient node, projected like the batch loads (create_nodes):
+    # NODE_PROPERTIES only, empty values left out
+    node = node_spec("Patient")
+    row = frame_records(pd.DataFrame([patient_dict]).astype({"Id": str}), node_columns(node))[0]
     with driver.session() as session:
-        session.run(
-            """
-            MERGE (p:Patient {Id: $Id})
-            SET p += $props
-            """,
-            Id=patient_dict["Id"],
-            props=patient_dict
-        )
+        session.run(node_query(node), batch=[row])
     # Add demographic relationships
     patient = patient_dict.copy()
     patient["AGE"] = get_age(patient["BIRTHDATE"])
     patient["AGE_RANGE"] = age_bucket(patient["AGE"])
     patient["INCOME_RANGE"] = income_bucket(patient["INCOME"])
-    patient["ZIPCODE"] = str(patient["ZIP"])
+    patient["ZIPCODE"] = zipcode(patient.get("ZIP"))
     connect_patient_demographics([patient], driver)
+    invalidate_eligibility([patient_dict["Id"]])
 
 def patient_to_text(patient_dict):
-    # Customize as needed
-    fields = [
-        patient_dict.get("FIRST", ""),
-        patient_dict.get("LAST", ""),
-        patient_dict.get("GENDER", ""),
-        patient_dict.get("BIRTHDATE", ""),
-        patient_dict.get("ETHNICITY", ""),
-        patient_dict.get("RACE", ""),
-        str(patient_dict.get("INCOME", "")),
-        str(patient_dict.get("ZIP", ""))
-    ]
-    return " ".join(fields)
+    # Must stay in sync with utils.embeddings.patient_texts (same cache keys)
+    return " ".join(str(patient_dict.get(field, "")) for field in PATIENT_TEXT_FIELDS)
 
-from sentence_transformers import SentenceTransformer
+# Loaded on first encode (utils.embeddings.get_model); must match the model
+# used for all other patients
+model = LazyModel()
 
-# Load the model only once (do this at the top-level, not inside the function)
-EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # must match the model used for all other patients
-model = SentenceTransformer(EMBEDDING_MODEL)
-
-def embed_and_store(patient_id, patient_dict, driver):
+def embed_and_store(patient_id, patient_dict, driver, cache=None):
     text = patient_to_text(patient_dict)
-    embedding = model.encode(text, normalize_embeddings=True).tolist()
+    if cache is None:
+        cache = default_cache()
+    embedding = encode_texts(model, [text], cache=cache)[0].tolist()
     with driver.session() as session:
         session.run(
             "MATCH (p:Patient {Id: $Id}) SET p.embedding = $embedding",
             Id=patient_id,
             embedding=embedding
-        )
\ No newline at end of file
+        )
+    invalidate_neighbours()
+    return embedding
\ No newline at end of file
@@ -0,0 +1,310 @@
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+from utils.loader import LoadStats, load_rows
+from utils.metrics import METRICS
+from utils.ingest import iter_chunks, iter_records, source_path
+from utils.graph_schema import (NODES, RELATIONSHIPS, node_query, node_spec, relationship_query, node_columns,
+                                relationship_columns)
+from utils.neo4j_helper import (create_indexes, create_constraints, database_is_empty,
+                                create_demographics, create_vector_indexes)
+from utils.eligibility import refresh_all_eligibility
+from utils.knn_graph import refresh_knn
+
+# --- Build DAG ---
+# The full build as stages with dependencies, derived from utils/graph_schema.py:
+#   indexes -> nodes:<Label> -> rel:<name> (once both endpoint labels exist)
+#           -> demographics (Patient)     -> eligibility (HAS_CLAIM, PAID_BY)
+#           -> embeddings:<Label>         -> vector_indexes
+#                                         -> knn (SIMILAR_TO lists, optional)
+# Independent stages run concurrently (at most MAX_PARALLEL_STAGES, each with
+# its own loader workers). Loads are cut into CHECKPOINT_ROWS-row chunks and
+# every finished chunk and stage is written to the ledger, so a rerun after a
+# failure skips what already committed. MERGE makes re-running a chunk that
+# was cut off half-way harmless.
+#
+# Fresh loads (an empty database) install uniqueness constraints instead of
+# plain indexes and CREATE nodes and edges rather than MERGE them, which
+# skips the existence checks. Repeated keys / edge pairs within a source
+# still go through MERGE, as does any stage that was started by an earlier
+# run (its rows may already exist).
+MAX_PARALLEL_STAGES = int(os.getenv("BUILD_MAX_PARALLEL_STAGES", 3))
+CHECKPOINT_ROWS = int(os.getenv("BUILD_CHECKPOINT_ROWS", 50000))
+LEDGER_PATH = os.getenv("BUILD_LEDGER", "./.build_ledger.json")
+
+# `run(checkpoint)` does the work; `deps` are stage names
+Stage = namedtuple("Stage", ["name", "deps", "run"])
+
+
+def source_fingerprint(data):
+    # A ledger is only reused while the inputs are unchanged: each CSV by the
+    # path it was read from, its size and mtime; a frame built in memory by
+    # its content
+    fingerprint = {}
+    for name in sorted(data):
+        path = source_path(data[name])
+        if path is not None and os.path.exists(path):
+            st = os.stat(path)
+            fingerprint[name] = [os.path.abspath(path), st.st_size, st.st_mtime_ns]
+        elif isinstance(data[name], pd.DataFrame):
+            fingerprint[name] = [len(data[name]), int(pd.util.hash_pandas_object(data[name], index=False).sum())]
+    return fingerprint
+
+
+class Ledger:
+    def __init__(self, path=LEDGER_PATH, fingerprint=None):
+        self.path = path
+        self.fingerprint = fingerprint or {}
+        self.mode = "merge"  # or "create" for a fresh load
+        self.stages = {}  # name -> {"done": bool, "chunks": [chunk indexes]}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path=LEDGER_PATH, fingerprint=None, resume=True):
+        ledger = cls(path, fingerprint)
+        if resume and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("fingerprint") == ledger.fingerprint:
+                ledger.stages = saved.get("stages", {})
+                ledger.mode = saved.get("mode", "merge")
+            else:
+                print(f"Input CSVs changed since {path} was written; starting from scratch.")
+        return ledger
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"fingerprint": self.fingerprint, "mode": self.mode, "stages": self.stages}, f)
+        os.replace(tmp, self.path)
+
+    def _entry(self, stage):
+        return self.stages.setdefault(stage, {"done": False, "chunks": []})
+
+    def is_done(self, stage):
+        return self.stages.get(stage, {}).get("done", False)
+
+    def done_chunks(self, stage):
+        return set(self.stages.get(stage, {}).get("chunks", []))
+
+    def mark_started(self, stage):
+        with self._lock:
+            self._entry(stage)
+            self._save()
+
+    def mark_chunk(self, stage, chunk):
+        with self._lock:
+            self._entry(stage)["chunks"].append(chunk)
+            self._save()
+
+    def mark_done(self, stage):
+        with self._lock:
+            self._entry(stage)["done"] = True
+            self._save()
+
+    def clear(self):
+        self.stages = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Checkpoint:
+    # What a stage sees of the ledger
+    def __init__(self, ledger, stage):
+        self.ledger = ledger
+        self.stage = stage
+        self.done = ledger.done_chunks(stage)
+        self.resumed = stage in ledger.stages  # started by an earlier run
+
+    def chunks(self, data, size=CHECKPOINT_ROWS):
+        # Yields (index, frame) for the chunks not committed by an earlier run;
+        # time spent reading them is the stage's "read" phase
+        chunks = enumerate(iter_chunks(data, size))
+        while True:
+            with METRICS.phase("read"):
+                i, chunk = next(chunks, (None, None))
+            if chunk is None:
+                return
+            if i in self.done:
+                continue
+            yield i, chunk
+
+    def commit(self, chunk):
+        self.ledger.mark_chunk(self.stage, chunk)
+
+
+def _first_seen(chunk, cols, seen):
+    # True for rows whose `cols` value this stage hasn't loaded before
+    mask = []
+    for value in zip(*(chunk[c].tolist() for c in cols)):
+        mask.append(value not in seen)
+        seen.add(value)
+    return pd.Series(mask, index=chunk.index, dtype=bool)
+
+
+def _load_stage(driver, query, data, key, name, create_query=None, unique_cols=None, columns=None,
+                required=None):
+    # With `create_query` (fresh loads), the first row for each `unique_cols`
+    # value is CREATEd and repeats are MERGEd with `query`. Rows carry only
+    # `columns` (None = all); rows with a null `required` column are skipped.
+    def run(checkpoint):
+        stats = LoadStats(name)
+        skipped = len(checkpoint.done)
+        create = create_query is not None and not checkpoint.resumed
+        seen, merged = set(), 0
+        for i, chunk in checkpoint.chunks(data):
+            parts = [(query, chunk)]
+            if create:
+                first = _first_seen(chunk, unique_cols, seen)
+                parts = [(create_query, chunk[first]), (query, chunk[~first])]
+                merged += int((~first).sum())
+            for q, rows in parts:
+                if rows.empty:
+                    continue
+                records = iter_records(rows, columns=columns, required=required)
+                part = load_rows(driver, q, records, name=name, key=key, verbose=False)
+                stats.rows += part.rows
+                stats.batches += part.batches
+                stats.retries += part.retries
+                stats.seconds += part.seconds
+            checkpoint.commit(i)
+        notes = [f"{skipped} chunks resumed"] if skipped else []
+        if create:
+            notes.append(f"CREATE, {merged} repeats merged")
+        suffix = f" ({', '.join(notes)})" if notes else ""
+        print(f"{stats}{suffix}")
+    return run
+
+
+def _chunked_stage(fn, data, done=None):
+    # fn(frame) for each checkpoint chunk of `data`, then done()
+    def run(checkpoint):
+        for i, chunk in checkpoint.chunks(data):
+            fn(chunk)
+            checkpoint.commit(i)
+        if done is not None:
+            done()
+    return run
+
+
+def build_stages(data, driver, embed=None, embedding_dimension=None, create=False, embed_labels=("Patient",),
+                 knn_k=None, embed_done=None):
+    # `data` maps CSV name -> DataFrame or CsvSource; `embed(label, chunk)`
+    # adds an embeddings stage per label in `embed_labels` (then
+    # `embed_done(label)`, e.g. to flush its cache) and the vector index
+    # stage, `knn_k` the precomputed k-NN stage; `create` = fresh load
+    schema = create_constraints if create else create_indexes
+    stages = [Stage("indexes", [], lambda checkpoint: schema(driver))]
+    for node in NODES:
+        stages.append(Stage(f"nodes:{node.label}", ["indexes"], _load_stage(
+            driver, node_query(node), data[node.source], node.key, node.label,
+            create_query=node_query(node, create=True) if create else None, unique_cols=[node.key],
+            columns=node_columns(node),
+        )))
+    stages.append(Stage("demographics", ["nodes:Patient"],
+                        _chunked_stage(lambda chunk: create_demographics(chunk, driver), data["patients"])))
+    for rel in RELATIONSHIPS:
+        deps = sorted({f"nodes:{rel.start_label}", f"nodes:{rel.end_label}"})
+        stages.append(Stage(f"rel:{rel.name}", deps, _load_stage(
+            driver, relationship_query(rel), data[rel.source], rel.start_col, rel.name,
+            create_query=relationship_query(rel, create=True) if create else None,
+            unique_cols=[rel.start_col, rel.end_col], columns=relationship_columns(rel),
+            required=relationship_columns(rel),
+        )))
+    # HAS_CLAIM / PAID_BY feed Patient.eligible_payers
+    stages.append(Stage("eligibility", ["rel:HAS_CLAIM", "rel:PAID_BY"],
+                        lambda checkpoint: refresh_all_eligibility(driver)))
+    if embed is not None:
+        for label in embed_labels:
+            stages.append(Stage(f"embeddings:{label}", [f"nodes:{label}"], _chunked_stage(
+                lambda chunk, label=label: embed(label, chunk), data[node_spec(label).source],
+                done=(lambda label=label: embed_done(label)) if embed_done else None,
+            )))
+        stages.append(Stage("vector_indexes", [f"embeddings:{label}" for label in embed_labels],
+                            lambda checkpoint: create_vector_indexes(driver, embedding_dimension)))
+        if knn_k and "Patient" in embed_labels:
+            stages.append(Stage("knn", ["embeddings:Patient"],
+                                lambda checkpoint: refresh_knn(driver, knn_k, dim=embedding_dimension)))
+    return stages
+
+
+def run_stages(stages, ledger, max_parallel=MAX_PARALLEL_STAGES):
+    # Starts every stage whose dependencies are done, up to max_parallel at a
+    # time. On a failure no new stages start; running ones finish and get
+    # checkpointed, then the first error is raised.
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"stage {s.name} depends on unknown stages {missing}")
+    done = {s.name for s in stages if ledger.is_done(s.name)}
+    for name in sorted(done):
+        print(f"[build] {name}: done in a previous run, skipped")
+    pending = [s for s in stages if s.name not in done]
+    running, errors = {}, []
+
+    def timed(stage):
+        # Loads inside the stage record into its utils/metrics.py entry
+        start = time.perf_counter()
+        checkpoint = Checkpoint(ledger, stage.name)
+        ledger.mark_started(stage.name)
+        with METRICS.scope(stage.name):
+            stage.run(checkpoint)
+        return time.perf_counter() - start
+
+    timings = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as pool:
+        while pending or running:
+            if not errors:
+                ready = [s for s in pending if all(d in done for d in s.deps)]
+                for s in ready[:max(1, max_parallel) - len(running)]:
+                    pending.remove(s)
+                    print(f"[build] {s.name}: started")
+                    running[pool.submit(timed, s)] = s
+            if not running:
+                if errors:
+                    break
+                raise RuntimeError(f"stages can never run (dependency cycle?): {[s.name for s in pending]}")
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    print(f"[build] {stage.name}: FAILED ({e})")
+                    errors.append(e)
+                    continue
+                ledger.mark_done(stage.name)
+                done.add(stage.name)
+                timings[stage.name] = seconds
+                print(f"[build] {stage.name}: done in {seconds:.1f}s")
+    if errors:
+        print(f"[build] stopped; rerun to resume from {ledger.path}")
+        raise errors[0]
+    return timings
+
+
+def build_graph(data, driver, embed=None, embedding_dimension=None, resume=True,
+                ledger_path=LEDGER_PATH, max_parallel=MAX_PARALLEL_STAGES, fresh_load=False,
+                embed_labels=("Patient",), knn_k=None, embed_done=None):
+    # Returns {stage: seconds} for the stages run this time
+    ledger = Ledger.open(ledger_path, source_fingerprint(data), resume)
+    if fresh_load and not (ledger.stages and ledger.mode == "create"):
+        # Only safe into an empty database (or when resuming a fresh load)
+        if ledger.stages or not database_is_empty(driver):
+            print("Database is not empty; loading with MERGE instead of a fresh load.")
+            fresh_load = False
+    ledger.mode = "create" if fresh_load else "merge"
+    stages = build_stages(data, driver, embed, embedding_dimension, create=fresh_load, embed_labels=embed_labels,
+                          knn_k=knn_k, embed_done=embed_done)
+    timings = run_stages(stages, ledger, max_parallel)
+    # Finished: the next build starts from scratch
+    ledger.clear()
+    return timings
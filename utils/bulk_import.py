@@ -0,0 +1,189 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.ingest import iter_chunks
+from utils.graph_schema import NODES, RELATIONSHIPS, DEMOGRAPHIC_NODES, DEMOGRAPHIC_LINKS, node_columns
+from utils.neo4j_helper import add_demographics, create_indexes, create_vector_indexes
+from utils.eligibility import refresh_all_eligibility
+
+# --- neo4j-admin database import files ---
+# One CSV per node label and relationship type, header on the first line.
+# Node ids live in a per-label ID space (`Id:ID(Patient)`), so the same
+# string may be a key under two labels without clashing.
+IMPORT_DIR = os.getenv("BULK_IMPORT_DIR", "./import")
+ARRAY_DELIMITER = ";"
+
+
+def _column_type(series):
+    # None when the chunk has no values to go by
+    values = series.dropna()
+    if values.empty:
+        return None
+    if pd.api.types.is_bool_dtype(values):
+        return "boolean"
+    if pd.api.types.is_integer_dtype(values):
+        return "long"
+    if pd.api.types.is_float_dtype(values):
+        # an int column with NaNs reads as float
+        return "long" if (values == values.round()).all() else "double"
+    return "string"
+
+
+def _merge_type(a, b):
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    return "double" if {a, b} == {"long", "double"} else "string"
+
+
+def _scan(data, key, columns=None):
+    # One pass over every chunk before writing (one extra read of a streamed
+    # CSV). Returns (types, last):
+    # - header types from every chunk, not just the first: a column that is
+    #   null (or integral) in the first chunk still gets the type of the
+    #   values that come later; columns with no values anywhere are strings
+    # - key -> position of its last row, which is the row written for it
+    types, last, offset = {}, {}, 0
+    for chunk in iter_chunks(data):
+        for c in (columns or chunk.columns):
+            if c != key and c in chunk:
+                types[c] = _merge_type(types.get(c), _column_type(chunk[c]))
+        keys = chunk[key]
+        positions = np.arange(offset, offset + len(chunk))[keys.notna().to_numpy()]
+        last.update(zip(keys.dropna().tolist(), positions.tolist()))
+        offset += len(chunk)
+    return {c: t or "string" for c, t in types.items()}, last
+
+
+def _coerce(chunk, types):
+    # Each chunk infers its own dtypes; cast to the header type
+    chunk = chunk.copy()
+    for col, typ in types.items():
+        if typ == "long":
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce").round().astype("Int64")
+        elif typ == "double":
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+    return chunk
+
+
+def _vector_strings(embeddings):
+    return [ARRAY_DELIMITER.join(f"{v:.8g}" for v in row) for row in embeddings]
+
+
+class ImportWriter:
+    def __init__(self, out_dir=IMPORT_DIR):
+        self.out_dir = out_dir
+        self.nodes = []          # (label, filename)
+        self.relationships = []  # (type, filename)
+        os.makedirs(out_dir, exist_ok=True)
+
+    def _path(self, kind, name):
+        return os.path.join(self.out_dir, f"{kind}_{name}.csv")
+
+    def write_nodes(self, label, data, key, embed=None, columns=None):
+        # `embed(chunk)` may return a (rows, dim) array stored as embedding:float[]
+        # (computed from the full row); only `columns` (None = all) are written.
+        # A repeated key is written once, from its last row, as the online
+        # build's MERGE ... SET n += row leaves it. Returns the set of ids written.
+        path = self._path("nodes", label)
+        seen = set()
+        types, last = _scan(data, key, columns)
+        offset = 0
+        with open(path, "w", newline="") as f:
+            header = [f"{key}:ID({label})"] + [c if t == "string" else f"{c}:{t}" for c, t in types.items()]
+            if embed is not None:
+                header.append("embedding:float[]")
+            f.write(",".join(header) + "\n")
+            for chunk in iter_chunks(data):
+                positions = np.arange(offset, offset + len(chunk))
+                offset += len(chunk)
+                chunk = chunk[chunk[key].map(last).to_numpy() == positions]
+                rows = _coerce(chunk[[key] + list(types)], types)
+                if embed is not None and len(chunk):
+                    rows["embedding"] = _vector_strings(embed(chunk))
+                rows.to_csv(f, header=False, index=False)
+                seen.update(rows[key].tolist())
+        self.nodes.append((label, path))
+        print(f"{label}: {len(seen)} nodes -> {path}")
+        return seen
+
+    def write_key_nodes(self, label, key, values):
+        path = self._path("nodes", label)
+        pd.DataFrame({f"{key}:ID({label})": sorted(values)}).to_csv(path, index=False)
+        self.nodes.append((label, path))
+        print(f"{label}: {len(values)} nodes -> {path}")
+
+    def write_relationships(self, name, rel_type, start_label, end_label, edges, start_ids, end_ids):
+        # `edges` yields 2-column frames (start, end). Pairs are de-duplicated
+        # (MERGE semantics) and rows whose endpoint has no node are dropped,
+        # as the MATCH in the online load would. Within a chunk that's a
+        # drop_duplicates; across chunks, pairs are remembered by their 64-bit
+        # row hash rather than as tuples.
+        path = self._path("relationships", name)
+        start_ids, end_ids = pd.Index(list(start_ids)), pd.Index(list(end_ids))
+        seen = set()
+        with open(path, "w", newline="") as f:
+            f.write(f":START_ID({start_label}),:END_ID({end_label}),:TYPE\n")
+            for pairs in edges:
+                pairs = pairs.dropna().drop_duplicates()
+                pairs = pairs[pairs.iloc[:, 0].isin(start_ids) & pairs.iloc[:, 1].isin(end_ids)]
+                hashes = pd.util.hash_pandas_object(pairs, index=False).tolist()
+                new = ~np.fromiter(map(seen.__contains__, hashes), dtype=bool, count=len(hashes))
+                seen.update(hashes)
+                pairs[new].assign(t=rel_type).to_csv(f, header=False, index=False)
+        self.relationships.append((rel_type, path))
+        print(f"{name}: {len(seen)} relationships -> {path}")
+
+    def command(self, database="neo4j"):
+        args = ["neo4j-admin database import full", database, "--overwrite-destination",
+                f"--array-delimiter='{ARRAY_DELIMITER}'", "--multiline-fields=true"]
+        args += [f"--nodes={label}={path}" for label, path in self.nodes]
+        args += [f"--relationships={path}" for _, path in self.relationships]
+        return " \\\n  ".join(args)
+
+
+def export_import_files(data, out_dir=IMPORT_DIR, embed=None, database="neo4j"):
+    # `data` maps CSV name -> DataFrame or CsvSource (same inputs as the
+    # online build); `embed(patients_chunk)` optionally adds Patient vectors.
+    writer = ImportWriter(out_dir)
+    ids = {}
+    for node in NODES:
+        ids[node.label] = writer.write_nodes(
+            node.label, data[node.source], node.key,
+            embed=embed if node.label == "Patient" else None, columns=node_columns(node)
+        )
+
+    # Demographics derived chunk by chunk, like create_demographics
+    links = {rel_type: [] for rel_type, _, _, _ in DEMOGRAPHIC_LINKS}
+    values = {label: set() for label, _ in DEMOGRAPHIC_NODES}
+    for chunk in iter_chunks(data["patients"]):
+        chunk = add_demographics(chunk.copy())
+        for rel_type, label, _, col in DEMOGRAPHIC_LINKS:
+            values[label].update(chunk[col].dropna().tolist())
+            links[rel_type].append(chunk[["Id", col]].dropna())
+    for label, key in DEMOGRAPHIC_NODES:
+        writer.write_key_nodes(label, key, values[label])
+    for rel_type, label, _, _ in DEMOGRAPHIC_LINKS:
+        writer.write_relationships(rel_type, rel_type, "Patient", label, links[rel_type],
+                                   ids["Patient"], values[label])
+
+    for rel in RELATIONSHIPS:
+        edges = (chunk[[rel.start_col, rel.end_col]] for chunk in iter_chunks(data[rel.source]))
+        writer.write_relationships(rel.name, rel.type, rel.start_label, rel.end_label, edges,
+                                   ids[rel.start_label], ids[rel.end_label])
+
+    command = writer.command(database)
+    with open(os.path.join(out_dir, "import.sh"), "w") as f:
+        f.write("#!/bin/sh\n# Run with the database stopped, then run the post-import step\n")
+        f.write(command + "\n")
+    return command
+
+
+# --- Post-import: schema that neo4j-admin doesn't create ---
+def post_import(driver, embedding_dimension):
+    create_indexes(driver)
+    create_vector_indexes(driver, embedding_dimension)
+    refresh_all_eligibility(driver)
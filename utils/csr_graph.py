@@ -0,0 +1,264 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.ingest import iter_chunks
+from utils.graph_schema import NODES, RELATIONSHIPS, DEMOGRAPHIC_LINKS
+from utils.neo4j_helper import add_demographics
+from utils.eligibility import ELIGIBLE_PAYERS
+
+# --- In-process graph backend ---
+# The graph built by create_graph.py, read straight from the same CSVs into
+# compressed sparse row (CSR) adjacency: node keys are interned to row
+# numbers (position in a sorted id column), and each relationship is an
+# indptr/indices pair, so a hop is two array reads instead of a Bolt round
+# trip. Everything is saved as .npy files and memory-mapped on load.
+#
+# Answers match the Neo4j path: endpoints that don't exist as nodes are
+# dropped like a failed MATCH, repeated edges collapse like MERGE, and a
+# repeated node key keeps its last row's properties (SET n += row). The
+# snapshot is as fresh as the CSVs it was built from; rebuild it after an
+# ingest.
+GRAPH_SNAPSHOT_DIR = os.getenv("GRAPH_SNAPSHOT_DIR", "./.graph_snapshot")
+
+# Node properties kept as columns (only what the traversals read)
+SNAPSHOT_NODE_PROPERTIES = {"Payer": ["NAME"]}
+
+
+def _encode(values):
+    # Ids are stored as UTF-8 bytes (fixed width, mmap-able, about a quarter
+    # the size of numpy unicode); byte order is code point order
+    return np.array([v.encode("utf-8") for v in values], dtype=bytes)
+
+
+def _decode(values):
+    return [v.decode("utf-8") for v in values]
+
+
+def _endpoint(column):
+    # Values Neo4j could MATCH against a string key; numbers and nulls never do
+    if pd.api.types.is_string_dtype(column):
+        return column.notna().to_numpy()
+    if pd.api.types.is_object_dtype(column):
+        return column.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    return np.zeros(len(column), dtype=bool)
+
+
+class NodeTable:
+    __slots__ = ("label", "ids", "props")
+
+    def __init__(self, label, ids, props=None):
+        self.label = label
+        self.ids = ids  # sorted bytes; row number = interned id
+        self.props = props or {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def lookup(self, keys):
+        # Row number for each key, -1 where the node doesn't exist
+        keys = keys if isinstance(keys, np.ndarray) else _encode(keys)
+        if not len(self.ids) or not len(keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.searchsorted(self.ids, keys)
+        pos[pos == len(self.ids)] = 0
+        return np.where(self.ids[pos] == keys, pos, -1)
+
+
+class CSR:
+    __slots__ = ("indptr", "indices")
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_edges(cls, start, end, n_start):
+        # Duplicate (start, end) pairs are kept once, as MERGE would
+        edges = np.unique(np.stack([start, end], axis=1), axis=0) if len(start) else np.empty((0, 2), dtype=np.int64)
+        indptr = np.zeros(n_start + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edges[:, 0], minlength=n_start), out=indptr[1:])
+        return cls(indptr, edges[:, 1].astype(np.int32))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def neighbours(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def gather(self, nodes):
+        # Neighbours of every node in `nodes`, concatenated
+        starts, ends = self.indptr[nodes], self.indptr[np.asarray(nodes) + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=self.indices.dtype)
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        return self.indices[offsets]
+
+    def transpose(self, n_end):
+        start = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        return CSR.from_edges(np.asarray(self.indices, dtype=np.int64), start, n_end)
+
+
+# --- Snapshot build ---
+def _node_table(label, key, source):
+    props = SNAPSHOT_NODE_PROPERTIES.get(label, [])
+    frames = [chunk[[key] + [p for p in props if p in chunk]] for chunk in iter_chunks(source)]
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[key] + props)
+    frame = frame.drop_duplicates(subset=key, keep="last")
+    ids = _encode(frame[key].astype(str).tolist())
+    order = np.argsort(ids, kind="stable")
+    columns = {}
+    for p in props:
+        values = frame[p] if p in frame else pd.Series([None] * len(frame))
+        columns[p] = _encode(values.where(values.notna(), "").astype(str).tolist())[order]
+    return NodeTable(label, ids[order], columns)
+
+
+def _relationship(rel, source, nodes):
+    starts, ends = [], []
+    start_table, end_table = nodes[rel.start_label], nodes[rel.end_label]
+    for chunk in iter_chunks(source):
+        valid = _endpoint(chunk[rel.start_col]) & _endpoint(chunk[rel.end_col])
+        s = start_table.lookup(_encode(chunk[rel.start_col][valid].tolist()))
+        e = end_table.lookup(_encode(chunk[rel.end_col][valid].tolist()))
+        found = (s >= 0) & (e >= 0)
+        starts.append(s[found])
+        ends.append(e[found])
+    start = np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+    end = np.concatenate(ends) if ends else np.empty(0, dtype=np.int64)
+    return CSR.from_edges(start, end, len(start_table))
+
+
+def _demographics(patients, nodes):
+    # Patient -[IN_AGE_RANGE|IN_INCOME_RANGE|LIVES_IN]-> demographic nodes, as
+    # create_demographics derives them
+    columns = {link_type: ([], []) for link_type, _, _, _ in DEMOGRAPHIC_LINKS}
+    for chunk in iter_chunks(patients):
+        chunk = add_demographics(chunk.copy())
+        rows = nodes["Patient"].lookup(_encode(chunk["Id"].tolist()))
+        for link_type, _, _, column in DEMOGRAPHIC_LINKS:
+            keep = (rows >= 0) & chunk[column].notna().to_numpy()  # no ZIP, no LIVES_IN
+            columns[link_type][0].append(rows[keep])
+            columns[link_type][1].append(chunk[column].astype(str).to_numpy()[keep])
+    rels = {}
+    for link_type, label, _, _ in DEMOGRAPHIC_LINKS:
+        rows, values = columns[link_type]
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        values = np.concatenate(values) if values else np.empty(0, dtype=object)
+        ids = np.unique(_encode(values.tolist()))
+        nodes[label] = NodeTable(label, ids)
+        rels[link_type] = CSR.from_edges(rows, nodes[label].lookup(_encode(values.tolist())), len(nodes["Patient"]))
+    return rels
+
+
+def build_snapshot(data, path=GRAPH_SNAPSHOT_DIR):
+    # `data` maps CSV name -> DataFrame or CsvSource, as for create_graph.py
+    start = time.perf_counter()
+    nodes = {node.label: _node_table(node.label, node.key, data[node.source]) for node in NODES}
+    rels = {rel.name: _relationship(rel, data[rel.source], nodes) for rel in RELATIONSHIPS}
+    rels.update(_demographics(data["patients"], nodes))
+    graph = LocalGraph(nodes, rels, path)
+    graph.save(path)
+    print(f"Graph snapshot: {sum(len(t) for t in nodes.values())} nodes, "
+          f"{sum(len(r) for r in rels.values())} relationships -> {path} "
+          f"({time.perf_counter() - start:.1f}s)")
+    return LocalGraph.load(path)
+
+
+# Relationship name -> (start label, end label)
+def _endpoints():
+    ends = {rel.name: (rel.start_label, rel.end_label) for rel in RELATIONSHIPS}
+    ends.update({link_type: ("Patient", label) for link_type, label, _, _ in DEMOGRAPHIC_LINKS})
+    return ends
+
+
+class LocalGraph:
+    def __init__(self, nodes, rels, path=None):
+        self.nodes = nodes  # label -> NodeTable
+        self.rels = rels  # relationship name -> CSR (start -> end)
+        self.path = path
+        self._reverse = {}
+
+    # --- Persistence ---
+    def save(self, path=GRAPH_SNAPSHOT_DIR):
+        os.makedirs(path, exist_ok=True)
+        for label, table in self.nodes.items():
+            np.save(os.path.join(path, f"{label}.ids.npy"), table.ids)
+            for prop, values in table.props.items():
+                np.save(os.path.join(path, f"{label}.{prop}.npy"), values)
+        for name, csr in self.rels.items():
+            np.save(os.path.join(path, f"rel.{name}.indptr.npy"), csr.indptr)
+            np.save(os.path.join(path, f"rel.{name}.indices.npy"), csr.indices)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"nodes": {label: {"size": len(t), "props": list(t.props)} for label, t in self.nodes.items()},
+                       "relationships": {name: len(csr) for name, csr in self.rels.items()},
+                       "created": time.time()}, f)
+
+    @classmethod
+    def load(cls, path=GRAPH_SNAPSHOT_DIR):
+        # Memory-mapped: pages are read on first touch, not up front
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        nodes = {
+            label: NodeTable(label, load(f"{label}.ids.npy"), {p: load(f"{label}.{p}.npy") for p in info["props"]})
+            for label, info in meta["nodes"].items()
+        }
+        rels = {name: CSR(load(f"rel.{name}.indptr.npy"), load(f"rel.{name}.indices.npy"))
+                for name in meta["relationships"]}
+        return cls(nodes, rels, path)
+
+    def reverse(self, name):
+        # end -> start adjacency, built on first use
+        if name not in self._reverse:
+            end_label = _endpoints()[name][1]
+            self._reverse[name] = self.rels[name].transpose(len(self.nodes[end_label]))
+        return self._reverse[name]
+
+    # --- Traversals ---
+    def eligibility(self, patient_ids, payers=ELIGIBLE_PAYERS):
+        # Same answer as utils.eligibility.lookup_eligibility: names of the
+        # payers in `payers` (and in ELIGIBLE_PAYERS, which is what
+        # Patient.eligible_payers is materialized for) that paid any of the
+        # patient's claims; patients without one are left out
+        patient_ids = list(patient_ids)
+        rows = self.nodes["Patient"].lookup(patient_ids)
+        names = self.nodes["Payer"].props["NAME"]
+        wanted = np.isin(names, _encode([p for p in payers if p in ELIGIBLE_PAYERS]))
+        has_claim, paid_by = self.rels["HAS_CLAIM"], self.rels["PAID_BY"]
+        result = {}
+        for pid, row in zip(patient_ids, rows):
+            if row < 0:
+                continue
+            paid = paid_by.gather(has_claim.neighbours(row))
+            paid = paid[wanted[paid]]
+            if len(paid):
+                result[pid] = list(dict.fromkeys(_decode(names[paid])))
+        return result
+
+    def demographics(self, patient_ids):
+        # patient id -> {AGE_RANGE: [...], INCOME_RANGE: [...], ZIPCODE: [...]}
+        patient_ids = list(patient_ids)
+        rows = self.nodes["Patient"].lookup(patient_ids)
+        result = {}
+        for pid, row in zip(patient_ids, rows):
+            if row < 0:
+                continue
+            result[pid] = {
+                column: sorted(_decode(self.nodes[label].ids[self.rels[link_type].neighbours(row)]))
+                for link_type, label, _, column in DEMOGRAPHIC_LINKS
+            }
+        return result
+
+    def patients_with(self, column, value):
+        # Ids of the patients linked to demographic `value` (e.g. ZIPCODE "02139")
+        link_type, label = next((t, l) for t, l, _, c in DEMOGRAPHIC_LINKS if c == column)
+        node = self.nodes[label].lookup([str(value)])[0]
+        if node < 0:
+            return []
+        return _decode(self.nodes["Patient"].ids[self.reverse(link_type).neighbours(node)])
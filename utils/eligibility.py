@@ -0,0 +1,82 @@
+from utils.loader import load_rows
+from utils.result_cache import invalidate_eligibility
+
+# --- Materialized eligibility ---
+# Patient.eligible_payers holds the names of the eligible payers that paid
+# any of the patient's claims (Patient-HAS_CLAIM->Claim-PAID_BY->Payer), so
+# the retrieval path reads one property instead of walking two hops.
+ELIGIBLE_PAYERS = ["Medicare", "Medicaid"]
+
+_REFRESH = """
+    OPTIONAL MATCH (p)-[:HAS_CLAIM]->(:Claim)-[:PAID_BY]->(py:Payer)
+    WHERE py.NAME IN $payers
+    WITH p, collect(DISTINCT py.NAME) AS payers
+    SET p.eligible_payers = payers
+"""
+
+REFRESH_ALL_QUERY = """
+MATCH (p:Patient)
+CALL {
+    WITH p
+""" + _REFRESH + """
+} IN TRANSACTIONS OF 10000 ROWS
+"""
+
+REFRESH_PATIENTS_QUERY = """
+UNWIND $batch AS row
+MATCH (p:Patient {Id: row.id})
+WITH p
+""" + _REFRESH
+
+REFRESH_PAYERS_QUERY = """
+UNWIND $batch AS row
+MATCH (:Payer {Id: row.id})<-[:PAID_BY]-(:Claim)<-[:HAS_CLAIM]-(p:Patient)
+WITH DISTINCT p
+""" + _REFRESH
+
+# Read side: one parameterized lookup by patient id. Patients loaded before
+# eligible_payers existed fall back to the traversal.
+LOOKUP_QUERY = """
+UNWIND $patient_ids AS pid
+MATCH (p:Patient {Id: pid})
+WITH p, CASE
+    WHEN p.eligible_payers IS NULL
+    THEN COLLECT { MATCH (p)-[:HAS_CLAIM]->(:Claim)-[:PAID_BY]->(py:Payer) WHERE py.NAME IN $payers RETURN DISTINCT py.NAME }
+    ELSE [name IN p.eligible_payers WHERE name IN $payers]
+END AS payers
+WHERE size(payers) > 0
+RETURN p.Id AS patient_id, payers AS eligible_payers
+"""
+
+
+def refresh_all_eligibility(driver, payers=ELIGIBLE_PAYERS):
+    # CALL ... IN TRANSACTIONS needs an auto-commit transaction
+    with driver.session() as session:
+        session.run(REFRESH_ALL_QUERY, payers=payers).consume()
+    invalidate_eligibility()
+    print("Patient eligibility materialized.")
+
+
+def refresh_patient_eligibility(driver, patient_ids, payers=ELIGIBLE_PAYERS):
+    patient_ids = list(patient_ids)
+    rows = ({"id": pid} for pid in patient_ids)
+    stats = load_rows(driver, REFRESH_PATIENTS_QUERY, rows, name="eligibility (patients)",
+                      key="id", params={"payers": payers})
+    invalidate_eligibility(patient_ids)
+    return stats
+
+
+def refresh_payer_eligibility(driver, payer_ids, payers=ELIGIBLE_PAYERS):
+    # A payer rename can flip eligibility for every patient it paid for.
+    # One worker: different payers share patients.
+    rows = ({"id": pid} for pid in payer_ids)
+    stats = load_rows(driver, REFRESH_PAYERS_QUERY, rows, name="eligibility (payers)",
+                      workers=1, params={"payers": payers})
+    invalidate_eligibility()
+    return stats
+
+
+def lookup_eligibility(driver, patient_ids, payers=ELIGIBLE_PAYERS):
+    with driver.session() as session:
+        result = session.run(LOOKUP_QUERY, patient_ids=list(patient_ids), payers=payers)
+        return {r["patient_id"]: r["eligible_payers"] for r in result}
@@ -0,0 +1,256 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process lock
+    fcntl = None
+
+from utils.embeddings import EMBEDDING_MODEL, EMBEDDING_DIM, BATCH_SIZE, model_id
+
+# --- Cache settings (override through .env) ---
+CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./.embedding_cache")
+MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 5_000_000))
+INITIAL_CAPACITY = 4096
+KEY_BYTES = 40  # sha1 hex digest (hex so numpy never strips trailing NULs)
+
+
+class CacheInUse(RuntimeError):
+    pass
+
+
+class EmbeddingCache:
+    # Content-addressed store of normalized embeddings. Keys are
+    # sha1(model, dim, text); vectors live in a memory-mapped float32 matrix
+    # (vectors.f32) whose rows are looked up through a second mapped file of
+    # keys (keys.s40), so a hit is a view into the mapped file rather than a
+    # copy. When max_entries is reached the least recently used rows are
+    # overwritten.
+    #
+    # Keys are written in place around every vector write (an evicted row's
+    # key is cleared first, the new key is set after its vector), so a crash
+    # at any point leaves no key pointing at an overwritten vector; only the
+    # LRU ticks (last_used.npy) wait for flush(). One process at a time: the
+    # directory is locked (flock) for the cache's lifetime and a second
+    # process gets CacheInUse.
+    def __init__(self, path=CACHE_DIR, model_name=EMBEDDING_MODEL, dim=EMBEDDING_DIM,
+                 max_entries=MAX_ENTRIES):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self.dir = os.path.join(path, f"{model_name.replace('/', '_')}-{dim}")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        os.makedirs(self.dir, exist_ok=True)
+        self._lock_dir()
+        self._load()
+
+    # --- Storage ---
+    def _paths(self):
+        return (os.path.join(self.dir, "vectors.f32"),
+                os.path.join(self.dir, "keys.s40"),
+                os.path.join(self.dir, "last_used.npy"),
+                os.path.join(self.dir, "meta.json"))
+
+    def _lock_dir(self):
+        self._lock_file = open(os.path.join(self.dir, "lock"), "w")
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise CacheInUse(f"embedding cache {self.dir} is in use by another process")
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._lock_file.close()
+
+    def _load(self):
+        vec_path, keys_path, used_path, meta_path = self._paths()
+        legacy = os.path.join(self.dir, "keys.npy")
+        if os.path.exists(legacy):
+            # Written by the old flush-only index, whose keys may point at
+            # overwritten rows; it's only a cache, so start over
+            for stale in (legacy, vec_path, used_path, meta_path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        if os.path.exists(keys_path):
+            capacity = os.path.getsize(keys_path) // KEY_BYTES
+        else:
+            capacity = min(INITIAL_CAPACITY, self.max_entries)
+        self._open(capacity)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        if os.path.exists(used_path):
+            used = np.load(used_path)
+            self._last_used[:min(len(used), capacity)] = used[:capacity]
+        self._tick = 0
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self._tick = json.load(f)["tick"]
+        self._tick = max(self._tick, int(self._last_used.max(initial=0)))
+        filled = np.flatnonzero(self._keys != b"")
+        self._last_used[self._keys == b""] = 0  # rows cleared mid-eviction go first
+        self._size = int(filled[-1]) + 1 if len(filled) else 0
+        self._slots = {self._keys[i]: int(i) for i in filled.tolist()}
+
+    def _map(self, path, dtype, shape):
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < nbytes:
+                f.truncate(nbytes)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _open(self, capacity):
+        vec_path, keys_path = self._paths()[:2]
+        self._vectors = self._map(vec_path, np.float32, (capacity, self.dim))
+        self._keys = self._map(keys_path, f"S{KEY_BYTES}", (capacity,))
+
+    def _grow(self):
+        capacity = min(len(self._keys) * 2, self.max_entries)
+        self._vectors.flush()
+        self._keys.flush()
+        del self._vectors, self._keys
+        self._last_used = np.concatenate([self._last_used, np.zeros(capacity - len(self._last_used), dtype=np.int64)])
+        self._open(capacity)
+
+    def _replace(self, path, write):
+        # Write to a temp file, then rename over `path` (atomic)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+
+    def flush(self):
+        with self._lock:
+            used_path, meta_path = self._paths()[2:]
+            self._vectors.flush()
+            self._keys.flush()
+            self._replace(used_path, lambda f: np.save(f, self._last_used))
+            meta = {"model": self.model_name, "dim": self.dim, "size": self._size, "tick": self._tick}
+            self._replace(meta_path, lambda f: f.write(json.dumps(meta).encode()))
+
+    # --- Lookup / insert ---
+    def key(self, text):
+        return hashlib.sha1(f"{self.model_name}\0{self.dim}\0{text}".encode("utf-8")).hexdigest().encode()
+
+    def get(self, key):
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._tick += 1
+            self._last_used[slot] = self._tick
+            return self._vectors[slot]
+
+    def _free_slots(self, n):
+        # Unused capacity first, then grow the file, then evict the n least
+        # recently used rows in one pass.
+        slots = []
+        while len(slots) < n:
+            if self._size < len(self._keys):
+                take = min(n - len(slots), len(self._keys) - self._size)
+                slots.extend(range(self._size, self._size + take))
+                self._size += take
+            elif len(self._keys) < self.max_entries:
+                self._grow()
+            else:
+                break
+        if len(slots) < n:
+            need = n - len(slots)
+            used = self._last_used[:self._size].copy()
+            used[slots] = np.iinfo(np.int64).max  # don't hand out a slot twice
+            victims = np.argpartition(used, need - 1)[:need] if need < len(used) else np.arange(len(used))
+            for slot in victims.tolist():
+                self._slots.pop(self._keys[slot], None)
+                self._keys[slot] = b""  # before its vector is overwritten
+                slots.append(slot)
+            self.evictions += len(victims)
+        return slots[:n]
+
+    def put_many(self, keys, vectors):
+        with self._lock:
+            new = [k for k in dict.fromkeys(keys) if k not in self._slots]
+            free = dict(zip(new, self._free_slots(len(new))))
+            for k, vec in zip(keys, vectors):
+                slot = free.pop(k, None)
+                if slot is not None:
+                    # Vector first, then the key that makes it visible
+                    self._vectors[slot] = vec
+                    self._keys[slot] = k
+                    self._slots[k] = slot
+                else:
+                    slot = self._slots.get(k)
+                    if slot is None:  # no room, or evicted within this same call
+                        continue
+                self._tick += 1
+                self._last_used[slot] = self._tick
+
+    def put(self, key, vector):
+        self.put_many([key], [vector])
+
+    def encode(self, model, texts, batch_size=BATCH_SIZE):
+        # Returns a (len(texts), dim) matrix; only cache misses reach the model
+        keys = [self.key(t) for t in texts]
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        missing = []
+        for i, k in enumerate(keys):
+            vec = self.get(k)
+            if vec is None:
+                missing.append(i)
+            else:
+                out[i] = vec
+        if missing:
+            encoded = model.encode([texts[i] for i in missing], batch_size=batch_size,
+                                   normalize_embeddings=True)
+            out[missing] = encoded
+            self.put_many([keys[i] for i in missing], encoded)
+        return out
+
+    # --- Metrics ---
+    def __len__(self):
+        return len(self._slots)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self):
+        return (
+            f"Embedding cache: {len(self)} entries, {self.hits} hits, {self.misses} misses "
+            f"({self.hit_rate:.1%} hit rate), {self.evictions} evictions"
+        )
+
+
+_default_caches = {}
+_default_lock = threading.Lock()
+
+
+# Shared per-process cache for `label`; flushed to disk when the process
+# exits. Each label has its own directory (Patient keeps the top level), so
+# Encounter or Claim texts never evict patients. None (encode without a
+# cache) while another process holds the directory.
+def default_cache(label="Patient"):
+    with _default_lock:
+        if label not in _default_caches:
+            path = CACHE_DIR if label == "Patient" else os.path.join(CACHE_DIR, label)
+            # Keyed by model and backend, so int8 and fp32 vectors never mix
+            try:
+                cache = EmbeddingCache(path=path, model_name=model_id())
+            except CacheInUse as e:
+                print(f"{e}; encoding without the cache")
+                return None
+            atexit.register(cache.close)
+            _default_caches[label] = cache
+        return _default_caches[label]
@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+
+from utils.ingest import iter_chunks
+from utils.loader import load_rows, DEFAULT_WORKERS
+from utils.metrics import METRICS
+from utils.result_cache import invalidate_neighbours
+
+# --- CONFIG ---
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # Free, local, 384 dims
+EMBEDDING_DIM = 384
+BATCH_SIZE = 128
+
+
+# --- Model loading ---
+# sentence_transformers pulls in torch (seconds of import time), so it is
+# imported and the model built on first use, once per process and name.
+# EMBEDDING_BACKEND=int8 runs the same model with dynamically quantized
+# (int8) Linear layers on CPU; EMBEDDING_THREADS sets torch's intra-op
+# thread count (0 = torch's default).
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0))
+BACKENDS = ("torch", "int8")
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def model_id(name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND):
+    # What cached vectors are keyed by: int8 vectors drift slightly from fp32
+    return name if backend == "torch" else f"{name}+{backend}"
+
+
+def configure_threads(threads=EMBEDDING_THREADS):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+
+def _build_model(name, backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown embedding backend {backend!r} (expected one of {BACKENDS})")
+    from sentence_transformers import SentenceTransformer
+    configure_threads()
+    if backend == "int8":
+        import torch
+        model = SentenceTransformer(name, device="cpu")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return SentenceTransformer(name)
+
+
+def get_model(name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND):
+    model = _models.get((name, backend))
+    if model is None:
+        with _models_lock:
+            model = _models.get((name, backend))
+            if model is None:
+                model = _models[(name, backend)] = _build_model(name, backend)
+    return model
+
+
+class LazyModel:
+    # Stands in for the model wherever one is passed around; only an actual
+    # encode() loads it, so runs served entirely from the embedding cache
+    # never import torch.
+    def __init__(self, name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND):
+        self.name = name
+        self.backend = backend
+
+    def encode(self, texts, **kwargs):
+        return get_model(self.name, self.backend).encode(texts, **kwargs)
+
+
+def warm_up(name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND):
+    # For long-lived services: load the model and run one encode up front so
+    # the first request doesn't pay for it
+    start = time.perf_counter()
+    get_model(name, backend).encode(["warm up"], normalize_embeddings=True)
+    elapsed = time.perf_counter() - start
+    print(f"Model {model_id(name, backend)} warmed up in {elapsed:.2f}s")
+    return elapsed
+
+
+# Fields joined (in this order) into the text that gets embedded
+PATIENT_TEXT_FIELDS = ["FIRST", "LAST", "GENDER", "BIRTHDATE", "ETHNICITY", "RACE", "INCOME", "ZIP"]
+
+# Same for the other labels with a vector index (Synthea column names;
+# a column missing from the CSV contributes an empty string)
+TEXT_FIELDS = {
+    "Patient": PATIENT_TEXT_FIELDS,
+    "Provider": ["NAME", "GENDER", "SPECIALITY", "CITY", "STATE"],
+    "Payer": ["NAME", "OWNERSHIP", "CITY", "STATE_HEADQUARTERED"],
+    "Encounter": ["ENCOUNTERCLASS", "DESCRIPTION", "REASONDESCRIPTION", "TOTAL_CLAIM_COST", "PAYER_COVERAGE"],
+    "Claim": ["DIAGNOSIS1", "DIAGNOSIS2", "DIAGNOSIS3", "DIAGNOSIS4", "STATUS1", "STATUSP"],
+    "Medication": ["DESCRIPTION"],  # one node per CODE, so no per-dispense fields
+}
+
+
+# Same text as patient_to_text, built from column arrays instead of row by row
+def node_texts(frame, fields):
+    n = len(frame)
+    cols = [frame[f].tolist() if f in frame else [""] * n for f in fields]
+    return [" ".join(map(str, values)) for values in zip(*cols)]
+
+
+def patient_texts(frame, fields=PATIENT_TEXT_FIELDS):
+    return node_texts(frame, fields)
+
+
+# --- Vector writeback ---
+def has_vector_setter(driver):
+    # db.create.setNodeVectorProperty stores a typed float[] and validates it
+    # (Neo4j 5.11+); older servers fall back to a plain SET.
+    try:
+        with driver.session() as session:
+            record = session.run(
+                "SHOW PROCEDURES YIELD name WHERE name = 'db.create.setNodeVectorProperty' "
+                "RETURN count(*) AS n"
+            ).single()
+            return record["n"] > 0
+    except Exception:
+        return False
+
+
+def embedding_write_query(label, id_col, prop="embedding", vector_setter=True):
+    if vector_setter:
+        return (
+            f"UNWIND $batch AS row MATCH (n:{label} {{{id_col}: row.id}}) "
+            f"CALL db.create.setNodeVectorProperty(n, '{prop}', row.embedding)"
+        )
+    return f"UNWIND $batch AS row MATCH (n:{label} {{{id_col}: row.id}}) SET n.{prop} = row.embedding"
+
+
+# --- Encode / write pipeline ---
+def encode_texts(model, texts, batch_size=BATCH_SIZE, cache=None):
+    if cache is not None:
+        return cache.encode(model, texts, batch_size)
+    return model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+
+
+def encode_rows(frame, model, texts_fn, id_col, batch_size=BATCH_SIZE, cache=None, chunk_size=None):
+    # Producer: yields {"id", "embedding"} rows one encoded chunk at a time.
+    # load_rows' writer threads consume them while the next chunk encodes.
+    # A chunk is one encode call, so with an EncoderPool it should span
+    # several batches per worker (chunk_size).
+    for chunk in iter_chunks(frame, chunk_size or batch_size):
+        chunk = chunk.drop_duplicates(subset=id_col)  # e.g. one medications row per dispense
+        with METRICS.phase("transform"):
+            texts = texts_fn(chunk)
+        with METRICS.phase("encode"):
+            embeddings = encode_texts(model, texts, batch_size, cache)
+        for node_id, emb in zip(chunk[id_col].tolist(), embeddings):
+            yield {"id": node_id, "embedding": emb.tolist()}
+
+
+def embed_nodes(label, frame, model, driver, key="Id", batch_size=BATCH_SIZE, workers=DEFAULT_WORKERS,
+                cache=None, chunk_size=None, vector_setter=None, flush=True):
+    # Encode TEXT_FIELDS[label] for every row of `frame` (DataFrame or
+    # CsvSource) and write the vectors back in UNWIND batches. Callers that
+    # embed chunk by chunk pass `vector_setter` (has_vector_setter, resolved
+    # once) and flush=False, and flush the cache once the label is done.
+    fields = TEXT_FIELDS[label]
+    if vector_setter is None:
+        vector_setter = has_vector_setter(driver)
+    query = embedding_write_query(label, key, vector_setter=vector_setter)
+    rows = encode_rows(frame, model, lambda chunk: node_texts(chunk, fields), key, batch_size, cache, chunk_size)
+    stats = load_rows(driver, query, rows, name=f"{label} embeddings", key="id",
+                      workers=workers, batch_size=batch_size, unit="embeddings")
+    if label == "Patient":
+        invalidate_neighbours()
+    if cache is not None and flush:
+        cache.flush()
+        print(cache)
+    return stats
+
+
+def embed_patients(patients, model, driver, batch_size=BATCH_SIZE, workers=DEFAULT_WORKERS, cache=None,
+                   chunk_size=None):
+    return embed_nodes("Patient", patients, model, driver, "Id", batch_size, workers, cache, chunk_size)
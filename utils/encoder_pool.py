@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+
+from utils.embeddings import EMBEDDING_MODEL, EMBEDDING_BACKEND, BATCH_SIZE, configure_threads, get_model
+
+# --- Multi-process encoder ---
+# A pool of worker processes, each holding its own copy of the model, used
+# wherever a model is passed (encode_texts, EmbeddingCache.encode,
+# embed_nodes). Texts are sorted by length before batching so each batch
+# pads to roughly the same length, then results are put back in input order.
+ENCODER_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", 0))  # 0 = one per CPU core
+
+_worker_config = None
+
+
+def _init_worker(name, backend, threads):
+    global _worker_config
+    _worker_config = (name, backend, threads)
+
+
+def _encode_batch(job):
+    # The model is loaded by the first job rather than the pool initializer:
+    # a load error then reaches the caller instead of the pool respawning
+    # workers forever
+    name, backend, threads = _worker_config
+    configure_threads(threads)
+    start, texts, normalize = job
+    return start, get_model(name, backend).encode(texts, batch_size=len(texts), normalize_embeddings=normalize)
+
+
+def length_sorted_batches(texts, batch_size):
+    # (order, batches): batches of texts of similar length; order[i] is the
+    # input position of the i-th text across the concatenated batches
+    order = np.argsort([len(t) for t in texts], kind="stable")
+    batches = [[texts[i] for i in order[s:s + batch_size]] for s in range(0, len(order), batch_size)]
+    return order, batches
+
+
+class EncoderPool:
+    def __init__(self, processes=ENCODER_PROCESSES, name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND):
+        self.processes = processes or os.cpu_count() or 1
+        self.name = name
+        self.backend = backend
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # Build stages embed labels concurrently from one pool; started once
+        pool = self._pool
+        if pool is None:
+            with self._lock:
+                pool = self._pool
+                if pool is None:
+                    # Split the cores between the workers instead of letting every
+                    # worker's torch grab all of them; spawn, since torch and fork don't mix
+                    threads = max(1, (os.cpu_count() or 1) // self.processes)
+                    pool = self._pool = multiprocessing.get_context("spawn").Pool(
+                        self.processes, initializer=_init_worker, initargs=(self.name, self.backend, threads)
+                    )
+        return pool
+
+    def encode(self, texts, batch_size=BATCH_SIZE, normalize_embeddings=True, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        order, batches = length_sorted_batches(texts, batch_size)
+        jobs, start = [], 0
+        for batch in batches:
+            jobs.append((start, batch, normalize_embeddings))
+            start += len(batch)
+        encoded = [None] * len(texts)
+        for start, vectors in self._start().imap_unordered(_encode_batch, jobs):
+            for offset, vec in enumerate(vectors):
+                encoded[order[start + offset]] = vec
+        return np.asarray(encoded, dtype=np.float32)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,149 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from utils.ingest import iter_chunks
+from utils.loader import load_rows, DEFAULT_WORKERS, DEFAULT_BATCH_SIZE
+from utils.metrics import METRICS
+from utils.neo4j_helper import get_ages, create_vector_index
+from utils.embeddings import embedding_write_query, has_vector_setter
+
+# --- Structured patient features ---
+# A second patient vector built straight from the patients columns with
+# NumPy, no tokenizer or model: one-hots for the categorical fields,
+# log-scaled numerics and geography (hashed ZIP3 + LAT/LON on the unit
+# sphere). Scales are fixed rather than fitted, so a vector never depends
+# on which other rows were in its batch. Stored next to the text embedding
+# as Patient.feature_embedding, with its own vector index.
+FEATURE_PROPERTY = "feature_embedding"
+FEATURE_INDEX = "patient_feature_index"
+
+# field -> known values (Synthea's); each gets its own slot, plus one shared
+# slot for any other value. A missing value leaves the field's block at zero.
+CATEGORICAL_FIELDS = {
+    "GENDER": ["M", "F"],
+    "RACE": ["white", "black", "asian", "native", "hawaiian", "other"],
+    "ETHNICITY": ["hispanic", "nonhispanic"],
+    "MARITAL": ["M", "S", "D", "W"],
+}
+# field -> value mapped to 1.0 (AGE linear, money log1p-scaled)
+NUMERIC_FIELDS = {"AGE": 100.0, "INCOME": 1e6, "HEALTHCARE_COVERAGE": 1e7, "HEALTHCARE_EXPENSES": 1e7}
+ZIP3_BUCKETS = 16
+# Relative weight of each block before the vector is L2-normalized
+BLOCK_WEIGHTS = {"categorical": 1.0, "numeric": 2.0, "geo": 1.0}
+
+FEATURE_DIM = sum(len(v) + 1 for v in CATEGORICAL_FIELDS.values()) + len(NUMERIC_FIELDS) + ZIP3_BUCKETS + 3
+
+
+def _column(frame, field):
+    return frame[field] if field in frame else pd.Series([None] * len(frame), index=frame.index)
+
+
+def _one_hot(column, vocabulary):
+    present = column.notna().to_numpy()
+    codes = np.full(len(column), len(vocabulary), dtype=np.int64)  # "other"
+    known = pd.Index(vocabulary).get_indexer(column[present].astype(str).str.strip())
+    codes[present] = np.where(known >= 0, known, len(vocabulary))
+    out = np.zeros((len(column), len(vocabulary) + 1), dtype=np.float32)
+    out[np.flatnonzero(present), codes[present]] = 1.0
+    return out
+
+
+def _hashed(column, field, buckets):
+    # One-hot of crc32(field=value) % buckets; hashed once per distinct value
+    codes, uniques = pd.factorize(column.astype(object).fillna("").astype(str))
+    slots = np.array([zlib.crc32(f"{field}={u}".encode("utf-8")) % buckets for u in uniques], dtype=np.int64)
+    out = np.zeros((len(column), buckets), dtype=np.float32)
+    if len(uniques):
+        out[np.arange(len(column)), slots[codes]] = 1.0
+    return out
+
+
+def _numeric(frame):
+    ages = np.full(len(frame), np.nan)
+    if "BIRTHDATE" in frame:
+        ages = get_ages(frame["BIRTHDATE"]).to_numpy(dtype=float)
+    out = np.zeros((len(frame), len(NUMERIC_FIELDS)), dtype=np.float32)
+    for j, (field, scale) in enumerate(NUMERIC_FIELDS.items()):
+        if field == "AGE":
+            values = np.clip(ages / scale, 0.0, 1.5)
+        else:
+            money = pd.to_numeric(_column(frame, field), errors="coerce").to_numpy(dtype=float)
+            values = np.log1p(np.clip(money, 0.0, None)) / np.log1p(scale)
+        out[:, j] = np.nan_to_num(values)
+    return out
+
+
+def _geo(frame):
+    zips = pd.to_numeric(_column(frame, "ZIP"), errors="coerce")
+    zip3 = zips.astype("Int64").astype(str).str.zfill(5).str[:3].where(zips.notna(), "")
+    lat = np.radians(pd.to_numeric(_column(frame, "LAT"), errors="coerce").to_numpy(dtype=float))
+    lon = np.radians(pd.to_numeric(_column(frame, "LON"), errors="coerce").to_numpy(dtype=float))
+    # Nearby patients get nearby points on the unit sphere; unknown = origin
+    xyz = np.nan_to_num(np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=1))
+    return np.hstack([_hashed(zip3, "ZIP3", ZIP3_BUCKETS), xyz.astype(np.float32)])
+
+
+def patient_features(frame):
+    # (len(frame), FEATURE_DIM) float32, unit length
+    blocks = [
+        BLOCK_WEIGHTS["categorical"] * np.hstack(
+            [_one_hot(_column(frame, f), values) for f, values in CATEGORICAL_FIELDS.items()]),
+        BLOCK_WEIGHTS["numeric"] * _numeric(frame),
+        BLOCK_WEIGHTS["geo"] * _geo(frame),
+    ]
+    vectors = np.hstack(blocks).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# --- Write / index / query ---
+def embed_patient_features(patients, driver, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS):
+    # `patients` is a DataFrame or CsvSource
+    query = embedding_write_query("Patient", "Id", prop=FEATURE_PROPERTY, vector_setter=has_vector_setter(driver))
+
+    def rows():
+        for chunk in iter_chunks(patients):
+            chunk = chunk.drop_duplicates(subset="Id", keep="last")
+            with METRICS.phase("encode"):
+                vectors = patient_features(chunk)
+            for pid, vec in zip(chunk["Id"].tolist(), vectors):
+                yield {"id": pid, "embedding": vec.tolist()}
+
+    return load_rows(driver, query, rows(), name="Patient feature vectors", key="id",
+                     workers=workers, batch_size=batch_size, unit="embeddings")
+
+
+def create_feature_index(driver, similarity_function="cosine"):
+    with driver.session() as session:
+        session.execute_write(
+            create_vector_index,
+            index_name=FEATURE_INDEX,
+            node_label="Patient",
+            embedding_property=FEATURE_PROPERTY,
+            embedding_dimension=FEATURE_DIM,
+            similarity_function=similarity_function,
+        )
+
+
+FEATURE_VECTOR_QUERY = """
+UNWIND range(0, size($embeddings) - 1) AS i
+CALL db.index.vector.queryNodes('""" + FEATURE_INDEX + """', $top_k, $embeddings[i])
+YIELD node, score
+RETURN i, node.Id AS patient_id, score
+ORDER BY i, score DESC
+"""
+
+
+def query_feature_index(driver, vectors, top_k=5):
+    neighbours = [[] for _ in range(len(vectors))]
+    if not len(vectors):
+        return neighbours
+    with driver.session() as session:
+        result = session.run(FEATURE_VECTOR_QUERY, top_k=top_k,
+                             embeddings=[list(map(float, v)) for v in vectors])
+        for r in result:
+            neighbours[r["i"]].append((r["patient_id"], r["score"]))
+    return neighbours
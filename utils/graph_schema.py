@@ -0,0 +1,116 @@
+import os
+from collections import namedtuple
+
+# --- Graph schema: node labels, keys and relationship definitions ---
+NodeSpec = namedtuple("NodeSpec", ["label", "source", "key"])
+RelSpec = namedtuple("RelSpec", [
+    "name", "type", "source",
+    "start_label", "start_key", "start_col",
+    "end_label", "end_key", "end_col",
+])
+
+# Nodes loaded from a CSV (source = name under data/)
+NODES = [
+    NodeSpec("Patient", "patients", "Id"),
+    NodeSpec("Provider", "providers", "Id"),
+    NodeSpec("Payer", "payers", "Id"),
+    NodeSpec("Encounter", "encounters", "Id"),
+    NodeSpec("Claim", "claims", "Id"),
+    NodeSpec("Medication", "medications", "CODE"),
+]
+
+# Properties each label gets besides its key. Only these columns are sent
+# to Neo4j; names, addresses and identifiers (SSN, DRIVERS, PASSPORT) stay
+# in the CSVs, which is also where the embedders read their text from.
+# GRAPH_PROPERTIES=all writes every CSV column instead.
+NODE_PROPERTIES = {
+    "Patient": ["BIRTHDATE", "DEATHDATE", "GENDER", "RACE", "ETHNICITY", "MARITAL", "STATE", "COUNTY", "ZIP",
+                "INCOME", "HEALTHCARE_EXPENSES", "HEALTHCARE_COVERAGE"],
+    "Provider": ["NAME", "GENDER", "SPECIALITY", "STATE"],
+    "Payer": ["NAME", "OWNERSHIP", "STATE_HEADQUARTERED"],
+    "Encounter": ["START", "STOP", "ENCOUNTERCLASS", "CODE", "DESCRIPTION", "REASONCODE", "REASONDESCRIPTION",
+                  "BASE_ENCOUNTER_COST", "TOTAL_CLAIM_COST", "PAYER_COVERAGE"],
+    "Claim": ["DIAGNOSIS1", "DIAGNOSIS2", "DIAGNOSIS3", "DIAGNOSIS4", "STATUS1", "STATUSP", "CURRENTILLNESSDATE",
+              "SERVICEDATE"],
+    "Medication": ["DESCRIPTION", "BASE_COST"],
+}
+PROJECT_PROPERTIES = os.getenv("GRAPH_PROPERTIES", "projected") != "all"
+
+# Nodes derived from patients by add_demographics: (label, key)
+DEMOGRAPHIC_NODES = [
+    ("Zipcode", "zipcode"),
+    ("Age_Range", "range"),
+    ("Income_Range", "range"),
+]
+# (Patient)-[type]->(label {key: patients[column]}) after add_demographics
+DEMOGRAPHIC_LINKS = [
+    ("IN_AGE_RANGE", "Age_Range", "range", "AGE_RANGE"),
+    ("IN_INCOME_RANGE", "Income_Range", "range", "INCOME_RANGE"),
+    ("LIVES_IN", "Zipcode", "zipcode", "ZIPCODE"),
+]
+DEMOGRAPHIC_RELATIONSHIPS = [link[0] for link in DEMOGRAPHIC_LINKS]
+
+# One row of `source` = one (start)-[type]->(end) edge. Batches are
+# partitioned on start_col by the loader.
+RELATIONSHIPS = [
+    RelSpec("HAS_ENCOUNTER", "HAS_ENCOUNTER", "encounters",
+            "Patient", "Id", "PATIENT", "Encounter", "Id", "Id"),
+    RelSpec("ATTENDED_BY", "ATTENDED_BY", "encounters",
+            "Encounter", "Id", "Id", "Provider", "Id", "PROVIDER"),
+    RelSpec("BILLED_BY", "BILLED_BY", "encounters",
+            "Encounter", "Id", "Id", "Payer", "Id", "PAYER"),
+    RelSpec("HAS_CLAIM", "HAS_CLAIM", "claims",
+            "Patient", "Id", "PATIENTID", "Claim", "Id", "Id"),
+    RelSpec("PROVIDED_BY", "PROVIDED_BY", "claims",
+            "Claim", "Id", "Id", "Provider", "Id", "PROVIDERID"),
+    RelSpec("PAID_BY", "PAID_BY", "claims",
+            "Claim", "Id", "Id", "Payer", "Id", "PRIMARYPATIENTINSURANCEID"),
+    RelSpec("Encounter-HAS_MEDICATION", "HAS_MEDICATION", "medications",
+            "Encounter", "Id", "ENCOUNTER", "Medication", "CODE", "CODE"),
+    RelSpec("Patient-HAS_MEDICATION", "HAS_MEDICATION", "medications",
+            "Patient", "Id", "PATIENT", "Medication", "CODE", "CODE"),
+    RelSpec("COVERED_BY", "COVERED_BY", "medications",
+            "Medication", "CODE", "CODE", "Payer", "Id", "PAYER"),
+]
+
+# Vector indexes: (index name, label), all on the `embedding` property
+VECTOR_INDEXES = [
+    ("patient_embedding_index", "Patient"),
+    ("provider_embedding_index", "Provider"),
+    ("payer_embedding_index", "Payer"),
+    ("claim_embedding_index", "Claim"),
+    ("encounter_embedding_index", "Encounter"),
+    ("medication_embedding_index", "Medication"),
+]
+
+
+def node_spec(label):
+    return next(n for n in NODES if n.label == label)
+
+
+# Columns a node / relationship query reads from each row (None = all)
+def node_columns(node):
+    if not PROJECT_PROPERTIES or node.label not in NODE_PROPERTIES:
+        return None
+    return [node.key] + [p for p in NODE_PROPERTIES[node.label] if p != node.key]
+
+
+def relationship_columns(rel):
+    return list(dict.fromkeys([rel.start_col, rel.end_col]))
+
+
+# create=True: CREATE instead of MERGE, for rows known not to exist yet
+# (fresh loads; see utils/build_dag.py)
+def node_query(node, create=False):
+    if create:
+        return f"UNWIND $batch AS row CREATE (n:{node.label}) SET n = row"
+    return f"UNWIND $batch AS row MERGE (n:{node.label} {{{node.key}: row.{node.key}}}) SET n += row"
+
+
+def relationship_query(rel, create=False):
+    return f"""
+    UNWIND $batch AS row
+    MATCH (a:{rel.start_label} {{{rel.start_key}: row.{rel.start_col}}})
+    MATCH (b:{rel.end_label} {{{rel.end_key}: row.{rel.end_col}}})
+    {"CREATE" if create else "MERGE"} (a)-[:{rel.type}]->(b)
+    """
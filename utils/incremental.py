@@ -0,0 +1,228 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.ingest import iter_chunks, iter_records
+from utils.graph_schema import (NODES, RELATIONSHIPS, DEMOGRAPHIC_RELATIONSHIPS, relationship_query,
+                                relationship_columns)
+from utils.loader import load_rows
+from utils.neo4j_helper import create_nodes, create_relationships, create_demographics
+from utils.eligibility import refresh_patient_eligibility, refresh_payer_eligibility
+
+# --- Manifest of per-row content hashes (one pickle per CSV) ---
+MANIFEST_DIR = os.getenv("INGEST_MANIFEST_DIR", "./.ingest_manifest")
+HASH_COL = "_row_hash"
+
+
+def manifest_columns(source):
+    # Node keys and relationship endpoints of `source`: enough to undo a row
+    cols = [n.key for n in NODES if n.source == source]
+    for rel in RELATIONSHIPS:
+        if rel.source == source:
+            cols += [rel.start_col, rel.end_col]
+    return list(dict.fromkeys(cols))
+
+
+NULL_TEXT = "\x00null"
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NA or value is pd.NaT:
+        return NULL_TEXT
+    if isinstance(value, (bool, np.bool_)):
+        return str(bool(value))
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+def canonical_text(column):
+    # One text form per value whatever dtype this chunk was read with: an int
+    # column that turns float because some row is empty still gives "2134",
+    # not "2134.0"; other floats use repr (shortest round-trip form) and
+    # nulls a sentinel no CSV cell can hold
+    if pd.api.types.is_integer_dtype(column) and not column.hasnans:
+        return column.astype(np.int64).astype(str).to_numpy(dtype=object)
+    if pd.api.types.is_float_dtype(column) or pd.api.types.is_integer_dtype(column):
+        values = column.to_numpy(dtype=float, na_value=np.nan)
+        out = np.full(len(values), NULL_TEXT, dtype=object)
+        integral = np.isfinite(values) & (values == np.round(values)) & (np.abs(values) < 2 ** 53)
+        out[integral] = values[integral].astype(np.int64).astype(str)
+        other = ~np.isnan(values) & ~integral
+        out[other] = [repr(float(v)) for v in values[other]]
+        return out
+    return np.array([_text(v) for v in column.astype(object).tolist()], dtype=object)
+
+
+def row_hashes(frame):
+    # Hash the canonical text of every cell, so dtype drift between chunks
+    # or runs (int -> float once a value is missing, categorical vs object)
+    # doesn't show up as a change
+    canonical = pd.DataFrame({i: canonical_text(frame[c]) for i, c in enumerate(frame.columns)})
+    return pd.util.hash_pandas_object(canonical, index=False).to_numpy()
+
+
+def manifest_path(source, manifest_dir=MANIFEST_DIR):
+    return os.path.join(manifest_dir, f"{source}.pkl")
+
+
+def load_manifest(source, manifest_dir=MANIFEST_DIR):
+    path = manifest_path(source, manifest_dir)
+    return pd.read_pickle(path) if os.path.exists(path) else None
+
+
+class SourceDelta:
+    # current: manifest rows for the whole CSV as it is now
+    # added:   full rows that are new or changed since the last manifest
+    # removed: manifest rows that are gone or changed
+    def __init__(self, source, current, added, removed, old_keys):
+        self.source = source
+        self.current = current
+        self.added = added
+        self.removed = removed
+        self.old_keys = old_keys
+
+    def __str__(self):
+        return f"{self.source}: {len(self.added)} new/changed rows, {len(self.removed)} removed/changed rows"
+
+
+def scan_source(source, data, manifest_dir=MANIFEST_DIR, with_added=True):
+    # One pass over the CSV: hash every row, keep the manifest columns and
+    # (with_added) the full rows whose hash the previous manifest doesn't have.
+    cols = manifest_columns(source)
+    old = load_manifest(source, manifest_dir)
+    old_hashes = old[HASH_COL].to_numpy() if old is not None else np.empty(0, dtype=np.uint64)
+    snapshots, added = [], []
+    for chunk in iter_chunks(data):
+        hashes = row_hashes(chunk)
+        snap = chunk[cols].copy()
+        snap[HASH_COL] = hashes
+        snapshots.append(snap)
+        added.append(chunk[~np.isin(hashes, old_hashes)] if with_added else chunk.iloc[0:0])
+    current = pd.concat(snapshots, ignore_index=True)
+    added = pd.concat(added, ignore_index=True)
+    if old is None:
+        removed = current.iloc[0:0]
+        old_keys = {n.label: set() for n in NODES if n.source == source}
+    else:
+        removed = old[~old[HASH_COL].isin(current[HASH_COL])]
+        old_keys = {n.label: set(old[n.key]) for n in NODES if n.source == source}
+    return SourceDelta(source, current, added, removed, old_keys)
+
+
+def save_manifest(delta, manifest_dir=MANIFEST_DIR):
+    os.makedirs(manifest_dir, exist_ok=True)
+    delta.current.to_pickle(manifest_path(delta.source, manifest_dir))
+
+
+def scan_sources(data, manifest_dir=MANIFEST_DIR, with_added=True):
+    deltas = {name: scan_source(name, frame, manifest_dir, with_added) for name, frame in data.items()}
+    if with_added:
+        for delta in deltas.values():
+            print(delta)
+    return deltas
+
+
+def save_manifests(deltas, manifest_dir=MANIFEST_DIR):
+    for delta in deltas.values():
+        save_manifest(delta, manifest_dir)
+
+
+# --- Applying a delta ---
+def _edges(frame, rel):
+    return frame[[rel.start_col, rel.end_col]].drop_duplicates()
+
+
+def _stale_edges(delta, rel):
+    # Edges only implied by removed rows; an edge another current row still
+    # implies (e.g. a shared Medication-COVERED_BY-Payer) is kept
+    removed = _edges(delta.removed, rel)
+    current = _edges(delta.current, rel)
+    merged = removed.merge(current, how="left", indicator=True)
+    return merged[merged["_merge"] == "left_only"][[rel.start_col, rel.end_col]]
+
+
+def _new_keys(deltas):
+    # Node keys that did not exist in the previous manifest, per label
+    keys = {}
+    for node in NODES:
+        delta = deltas[node.source]
+        keys[node.label] = set(delta.current[node.key]) - delta.old_keys[node.label]
+    return keys
+
+
+def delete_relationships(rel, edges, driver):
+    query = f"""
+    UNWIND $batch AS row
+    MATCH (a:{rel.start_label} {{{rel.start_key}: row.{rel.start_col}}})-[r:{rel.type}]->(b:{rel.end_label} {{{rel.end_key}: row.{rel.end_col}}})
+    DELETE r
+    """
+    columns = relationship_columns(rel)
+    return load_rows(driver, query, iter_records(edges, columns=columns, required=columns),
+                     name=f"delete {rel.name}", key=rel.start_col)
+
+
+def delete_nodes(node, keys, driver):
+    query = f"UNWIND $batch AS row MATCH (n:{node.label} {{{node.key}: row.key}}) DETACH DELETE n"
+    return load_rows(driver, query, ({"key": k} for k in keys), name=f"delete {node.label}", key="key")
+
+
+def apply_deltas(deltas, driver):
+    # 1. Edges that only removed/changed rows implied
+    for rel in RELATIONSHIPS:
+        stale = _stale_edges(deltas[rel.source], rel)
+        if len(stale):
+            delete_relationships(rel, stale, driver)
+
+    # 2. Nodes whose key disappeared from their CSV
+    for node in NODES:
+        delta = deltas[node.source]
+        gone = set(delta.removed[node.key]) - set(delta.current[node.key])
+        if gone:
+            delete_nodes(node, gone, driver)
+
+    # 3. New or changed nodes
+    for node in NODES:
+        added = deltas[node.source].added
+        if len(added):
+            # Changed rows may have emptied a cell: send it as None to clear it
+            create_nodes(node.label, added, node.key, driver, drop_nulls=False)
+
+    # 4. Demographics of new or changed patients
+    patients = deltas["patients"].added
+    if len(patients):
+        rel_types = "|".join(DEMOGRAPHIC_RELATIONSHIPS)
+        load_rows(driver, f"UNWIND $batch AS row MATCH (p:Patient {{Id: row.Id}})-[r:{rel_types}]->() DELETE r",
+                  iter_records(patients[["Id"]]), name="reset demographics", key="Id")
+        create_demographics(patients, driver)
+
+    # 5. Edges of new/changed rows, plus unchanged rows that point at a node
+    #    which was only just (re)created
+    new_keys = _new_keys(deltas)
+    for rel in RELATIONSHIPS:
+        delta = deltas[rel.source]
+        current = delta.current
+        touches_new = np.zeros(len(current), dtype=bool)
+        if new_keys.get(rel.start_label):
+            touches_new |= current[rel.start_col].isin(new_keys[rel.start_label]).to_numpy()
+        if new_keys.get(rel.end_label):
+            touches_new |= current[rel.end_col].isin(new_keys[rel.end_label]).to_numpy()
+        edges = pd.concat([_edges(delta.added, rel), _edges(current[touches_new], rel)]).drop_duplicates()
+        if len(edges):
+            create_relationships(edges, relationship_query(rel), driver, key=rel.start_col, name=rel.name,
+                                 columns=relationship_columns(rel))
+
+    # 6. Patient.eligible_payers for patients whose claims, claim payers or
+    #    payer names changed
+    claims = deltas["claims"]
+    patient_ids = set(claims.added["PATIENTID"]) | set(claims.removed["PATIENTID"]) | new_keys["Patient"]
+    if patient_ids:
+        refresh_patient_eligibility(driver, patient_ids)
+    payers = deltas["payers"]
+    payer_ids = set(payers.added["Id"]) | set(payers.removed["Id"])
+    if payer_ids:
+        refresh_payer_eligibility(driver, payer_ids)
@@ -0,0 +1,123 @@
+import os
+import numpy as np
+import pandas as pd
+
+from utils.metrics import METRICS
+
+# --- CSV sources ---
+DATA_DIR = os.getenv("DATA_DIR", "./data")
+CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 50000))
+
+# Columns normalised to str before loading (the node keys)
+CSV_ID_COLUMNS = {
+    "patients": ["Id"],
+    "encounters": ["Id"],
+    "providers": ["Id"],
+    "payers": ["Id"],
+    "claims": ["Id"],
+    "medications": ["CODE"],
+}
+
+# Low-cardinality text columns read as pandas categoricals: each chunk holds
+# one small array of codes instead of a Python string per cell (columns
+# missing from a CSV are ignored)
+CSV_CATEGORY_COLUMNS = {
+    "patients": ["GENDER", "RACE", "ETHNICITY", "MARITAL", "STATE", "COUNTY"],
+    "encounters": ["ENCOUNTERCLASS"],
+    "providers": ["GENDER", "SPECIALITY", "STATE"],
+    "payers": ["OWNERSHIP"],
+    "claims": ["STATUS1", "STATUSP"],
+    "medications": [],
+}
+
+
+def csv_dtypes(name):
+    return {col: "category" for col in CSV_CATEGORY_COLUMNS.get(name, [])}
+
+
+def clean_ids(frame, id_cols):
+    for col in id_cols:
+        frame[col] = frame[col].astype(str)
+    return frame
+
+
+class CsvSource:
+    # Re-iterable, chunked view of a CSV file. Every pass re-reads the file,
+    # so at most one chunk is held in memory regardless of the file size.
+    def __init__(self, path, id_cols, chunksize=CHUNK_SIZE, dtype=None):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self.id_cols = id_cols
+        self.chunksize = chunksize
+        self.dtype = dtype
+
+    def __iter__(self):
+        with pd.read_csv(self.path, chunksize=self.chunksize, dtype=self.dtype) as reader:
+            for chunk in reader:
+                yield clean_ids(chunk, self.id_cols)
+
+    def __repr__(self):
+        return f"CsvSource({self.path!r}, chunksize={self.chunksize})"
+
+
+def open_csv(name, stream=False, chunksize=CHUNK_SIZE, data_dir=DATA_DIR):
+    path = os.path.join(data_dir, f"{name}.csv")
+    if stream:
+        return CsvSource(path, CSV_ID_COLUMNS[name], chunksize, csv_dtypes(name))
+    frame = clean_ids(pd.read_csv(path, dtype=csv_dtypes(name)), CSV_ID_COLUMNS[name])
+    frame.attrs["path"] = path
+    return frame
+
+
+# The CSV a source was read from (CsvSource or open_csv frame), else None
+def source_path(data):
+    if isinstance(data, pd.DataFrame):
+        return data.attrs.get("path")
+    return getattr(data, "path", None)
+
+
+# --- Chunk / record generators (work on a DataFrame or a CsvSource) ---
+def iter_chunks(data, size=CHUNK_SIZE):
+    # Yields frames of at most `size` rows
+    frames = [data] if isinstance(data, pd.DataFrame) else data
+    for frame in frames:
+        for pos in range(0, len(frame), size):
+            yield frame.iloc[pos:pos+size]
+
+
+def frame_records(frame, columns=None, drop_nulls=True):
+    # Row dicts built column by column: only `columns` (None = all), each
+    # converted to Python values in one .tolist() call. Null cells are left
+    # out of their row (drop_nulls) or sent as None, never as NaN.
+    if columns is not None:
+        frame = frame[[c for c in columns if c in frame]]
+    names, values, nulls = [], [], []
+    for name in frame.columns:
+        column = frame[name]
+        mask = column.isna().to_numpy()
+        if drop_nulls and mask.all():
+            continue
+        names.append(name)
+        values.append(column.tolist())
+        nulls.append(np.flatnonzero(mask))
+    records = [dict(zip(names, row)) for row in zip(*values)] if names else [{} for _ in range(len(frame))]
+    for name, rows in zip(names, nulls):
+        for i in rows.tolist():
+            if drop_nulls:
+                del records[i][name]
+            else:
+                records[i][name] = None
+    return records
+
+
+def iter_records(data, size=CHUNK_SIZE, columns=None, drop_nulls=True, required=None):
+    # Only one chunk is converted to dicts at a time, never the whole frame.
+    # Rows with a null in any `required` column (e.g. a relationship
+    # endpoint, which a MATCH would never find) are skipped.
+    for chunk in iter_chunks(data, size):
+        with METRICS.phase("transform"):
+            if required:
+                chunk = chunk[chunk[[c for c in required if c in chunk]].notna().all(axis=1)]
+            records = frame_records(chunk, columns, drop_nulls)
+        yield from records
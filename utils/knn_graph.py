@@ -0,0 +1,164 @@
+import hashlib
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from utils.embeddings import EMBEDDING_DIM
+from utils.loader import load_rows
+from utils.vector_index import LocalVectorIndex
+
+# --- Precomputed k-NN graph ---
+# Every patient's top-k most similar patients, stored as
+# (p)-[:SIMILAR_TO {score, rank}]->(q) with Neo4j's cosine score convention
+# ((1 + cos) / 2, self excluded). p.knn_key is a fingerprint of the embedding
+# the list was computed from and p.knn_at the time it was written; a list is
+# fresh while both still hold (see precomputed_neighbours).
+#
+# refresh_knn loads all patient embeddings into a memory-mapped matrix and
+# scores them in blocks (LocalVectorIndex.search). An incremental refresh
+# only recomputes patients whose embedding changed or is new, patients whose
+# list points at one of those, patients one of them would now displace from
+# the list, and lists that came up short (e.g. a neighbour was deleted).
+KNN_K = int(os.getenv("KNN_K", 10))
+KNN_MAX_AGE = float(os.getenv("KNN_MAX_AGE", 7 * 24 * 3600))  # seconds
+KNN_QUERY_BLOCK = int(os.getenv("KNN_QUERY_BLOCK", 4096))  # patients scored per pass over the matrix
+
+WRITE_QUERY = """
+UNWIND $batch AS row
+MATCH (p:Patient {Id: row.id})
+CALL { WITH p MATCH (p)-[old:SIMILAR_TO]->() DELETE old }
+SET p.knn_key = row.key, p.knn_at = row.at
+WITH p, row
+UNWIND row.neighbours AS n
+MATCH (q:Patient {Id: n.id})
+CREATE (p)-[:SIMILAR_TO {score: n.score, rank: n.rank}]->(q)
+"""
+
+LOOKUP_QUERY = """
+UNWIND $patient_ids AS pid
+MATCH (p:Patient {Id: pid})
+RETURN p.Id AS patient_id, p.embedding AS embedding, p.knn_key AS key, p.knn_at AS at,
+       [(p)-[r:SIMILAR_TO]->(q) | [r.rank, q.Id, r.score]] AS neighbours
+"""
+
+
+def embedding_fingerprint(embedding):
+    return hashlib.sha1(np.ascontiguousarray(embedding, dtype=np.float32).tobytes()).hexdigest()[:16]
+
+
+def _load_embeddings(driver, path, dim=EMBEDDING_DIM, fetch_size=10000):
+    # LocalVectorIndex over every Patient.embedding (normalized, memory-mapped
+    # under `path`), plus which rows changed since their list was computed
+    with driver.session(fetch_size=fetch_size) as session:
+        n = session.run("MATCH (p:Patient) WHERE p.embedding IS NOT NULL RETURN count(p) AS n").single()["n"]
+        vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="w+", shape=(max(n, 1), dim))
+        ids, keys, changed = [], [], []
+        result = session.run("MATCH (p:Patient) WHERE p.embedding IS NOT NULL "
+                             "RETURN p.Id AS id, p.embedding AS embedding, p.knn_key AS key")
+        for i, record in enumerate(result):
+            if i >= n:  # embedded after the count; picked up next refresh
+                break
+            ids.append(record["id"])
+            vectors[i] = record["embedding"]
+            keys.append(embedding_fingerprint(vectors[i]))
+            changed.append(record["key"] != keys[-1])
+    size = len(ids)
+    for start in range(0, size, KNN_QUERY_BLOCK):
+        block = np.asarray(vectors[start:min(start + KNN_QUERY_BLOCK, size)])
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors[start:start + len(block)] = block / norms
+    return LocalVectorIndex(np.array(ids, dtype=str), vectors[:size]), keys, np.array(changed, dtype=bool)
+
+
+def _current_lists(driver):
+    # patient id -> (lowest score on its list, list length)
+    with driver.session() as session:
+        result = session.run("MATCH (p:Patient)-[r:SIMILAR_TO]->() RETURN p.Id AS id, min(r.score) AS kth, count(r) AS n")
+        return {r["id"]: (r["kth"], r["n"]) for r in result}
+
+
+def _pointing_at(driver, patient_ids):
+    with driver.session() as session:
+        result = session.run("MATCH (p:Patient)-[:SIMILAR_TO]->(q:Patient) WHERE q.Id IN $ids RETURN DISTINCT p.Id AS id",
+                             ids=list(patient_ids))
+        return {r["id"] for r in result}
+
+
+def _displaced(index, changed_rows, kth):
+    # Rows whose list a changed patient would now enter: its score beats the
+    # row's current k-th score. One (block x changed) matmul per block.
+    hits = np.zeros(len(index), dtype=bool)
+    if not len(changed_rows):
+        return hits
+    changed = np.asarray(index.vectors[changed_rows])
+    for start in range(0, len(index), KNN_QUERY_BLOCK):
+        block = np.asarray(index.vectors[start:start + KNN_QUERY_BLOCK])
+        # (changed rows match themselves, but are recomputed anyway)
+        scores = (1.0 + block @ changed.T) / 2.0
+        hits[start:start + len(block)] = scores.max(axis=1) > kth[start:start + len(block)]
+    return hits
+
+
+def refresh_knn(driver, k=KNN_K, full=False, dim=EMBEDDING_DIM):
+    # Returns the number of patients whose lists were (re)written
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="knn_") as path:
+        index, keys, changed = _load_embeddings(driver, path, dim)
+        n = len(index)
+        if full or not n:
+            recompute = np.ones(n, dtype=bool)
+        else:
+            lists = _current_lists(driver)
+            want = min(k, n - 1)
+            ids = index.ids.tolist()
+            # A short list is stale (new patient, or a neighbour was deleted)
+            short = np.array([lists.get(pid, (None, 0))[1] < want for pid in ids], dtype=bool)
+            kth = np.array([lists[pid][0] if pid in lists else -np.inf for pid in ids], dtype=float)
+            changed_rows = np.flatnonzero(changed)
+            recompute = changed | short | _displaced(index, changed_rows, kth)
+            if len(changed_rows):
+                pointing = _pointing_at(driver, index.ids[changed_rows].tolist())
+                recompute |= np.isin(index.ids, list(pointing))
+        rows_to_do = np.flatnonzero(recompute)
+        print(f"k-NN graph: {len(rows_to_do)} of {n} patients to (re)compute "
+              f"({int(changed.sum())} embeddings changed)")
+        now = time.time()
+
+        def rows():
+            for block_start in range(0, len(rows_to_do), KNN_QUERY_BLOCK):
+                block = rows_to_do[block_start:block_start + KNN_QUERY_BLOCK]
+                # k + 1: each patient is its own nearest neighbour
+                for row, similar in zip(block, index.search(np.asarray(index.vectors[block]), k + 1)):
+                    pid = str(index.ids[row])
+                    similar = [(q, s) for q, s in similar if q != pid][:k]
+                    yield {"id": pid, "key": keys[row], "at": now,
+                           "neighbours": [{"id": q, "score": s, "rank": r} for r, (q, s) in enumerate(similar)]}
+
+        # Partitioned on the patient so no two workers rewrite the same list
+        load_rows(driver, WRITE_QUERY, rows(), name="SIMILAR_TO lists", key="id",
+                  batch_size=max(1, 5000 // max(k, 1)), unit="patients")
+    print(f"k-NN graph refreshed in {time.perf_counter() - start:.1f}s")
+    return len(rows_to_do)
+
+
+def precomputed_neighbours(driver, patient_ids, top_k=5, max_age=KNN_MAX_AGE):
+    # (fresh, stale): fresh maps patient id -> [(neighbour id, score)] read
+    # from SIMILAR_TO; stale maps patient id -> embedding for patients whose
+    # list is missing, too short, too old or from an older embedding.
+    # Patients without an embedding are in neither.
+    fresh, stale = {}, {}
+    now = time.time()
+    with driver.session() as session:
+        for r in session.run(LOOKUP_QUERY, patient_ids=list(patient_ids)):
+            if r["embedding"] is None:
+                continue
+            neighbours = [(q, s) for _, q, s in sorted(r["neighbours"])]
+            if (r["at"] is not None and now - r["at"] <= max_age and len(neighbours) >= top_k
+                    and r["key"] == embedding_fingerprint(r["embedding"])):
+                fresh[r["patient_id"]] = neighbours[:top_k]
+            else:
+                stale[r["patient_id"]] = r["embedding"]
+    return fresh, stale
@@ -0,0 +1,142 @@
+import os
+import queue
+import threading
+import time
+
+from neo4j.exceptions import TransientError
+
+from utils.metrics import METRICS
+
+# --- Loader settings (override through .env) ---
+DEFAULT_WORKERS = int(os.getenv("NEO4J_LOAD_WORKERS", 4))
+DEFAULT_BATCH_SIZE = int(os.getenv("NEO4J_LOAD_BATCH_SIZE", 1000))
+MAX_RETRIES = int(os.getenv("NEO4J_LOAD_MAX_RETRIES", 5))
+QUEUE_DEPTH = 4  # pending batches per worker before the reader blocks
+
+
+class LoadStats:
+    def __init__(self, name, unit="rows"):
+        self.name = name
+        self.unit = unit
+        self.rows = 0
+        self.batches = 0
+        self.retries = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, rows, retries):
+        with self._lock:
+            self.rows += rows
+            self.batches += 1
+            self.retries += retries
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.name}: {self.rows} {self.unit} in {self.batches} batches, "
+            f"{self.seconds:.1f}s ({self.rows_per_sec:.0f} {self.unit}/sec, {self.retries} retries)"
+        )
+
+
+def _write_batch(session, query, batch, params):
+    # Retry lock/deadlock errors on top of the driver's own retry window,
+    # backing off so the conflicting worker can finish its transaction.
+    # Returns (retries, ResultSummary).
+    attempt = 0
+    while True:
+        try:
+            summary = session.execute_write(lambda tx, b: tx.run(query, batch=b, **params).consume(), batch)
+            return attempt, summary
+        except TransientError:
+            attempt += 1
+            if attempt > MAX_RETRIES:
+                raise
+            time.sleep(min(0.1 * 2 ** attempt, 5.0))
+
+
+def _worker(driver, query, params, jobs, stats, metrics, failed, errors):
+    # One session per worker for the whole load instead of one per batch.
+    with driver.session() as session:
+        while True:
+            batch = jobs.get()
+            if batch is None:
+                return
+            if failed.is_set():
+                continue
+            try:
+                start = time.perf_counter()
+                retries, summary = _write_batch(session, query, batch, params)
+                stats.record(len(batch), retries)
+                metrics.record_batch(len(batch), time.perf_counter() - start, retries, summary)
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+
+
+def _put(jobs, batch, failed):
+    while not failed.is_set():
+        try:
+            jobs.put(batch, timeout=0.5)
+            return
+        except queue.Full:
+            pass
+
+
+def load_rows(driver, query, rows, name="load", key=None,
+              workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE, verbose=True, unit="rows",
+              params=None):
+    # Run `query` (an UNWIND $batch statement, plus any extra `params`) over
+    # `rows` with a pool of threads sharing one driver. With `key`, every row with the same key
+    # value goes to the same worker, so two workers never MERGE against the
+    # same start node at the same time. Batches are recorded in utils/metrics.py
+    # under the build stage running in this thread, or `name` outside a build.
+    workers = max(1, workers)
+    stats = LoadStats(name, unit)
+    metrics = METRICS.stage(METRICS.current() or name)
+    failed = threading.Event()
+    errors = []
+    queues = [queue.Queue(maxsize=QUEUE_DEPTH) for _ in range(workers)]
+    threads = [
+        threading.Thread(target=_worker, args=(driver, query, params or {}, q, stats, metrics, failed, errors), daemon=True)
+        for q in queues
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    buffers = [[] for _ in range(workers)]
+    next_worker = 0
+    try:
+        for row in rows:
+            if failed.is_set():
+                break
+            if key is None:
+                part = next_worker
+            else:
+                part = hash(row.get(key)) % workers
+            buffers[part].append(row)
+            if len(buffers[part]) >= batch_size:
+                _put(queues[part], buffers[part], failed)
+                buffers[part] = []
+                if key is None:
+                    next_worker = (next_worker + 1) % workers
+        for part, buf in enumerate(buffers):
+            if buf:
+                _put(queues[part], buf, failed)
+    finally:
+        for q in queues:
+            q.put(None)
+        for t in threads:
+            t.join()
+        stats.seconds = time.perf_counter() - start
+        if METRICS.current() is None:
+            metrics.add_wall(stats.seconds)
+
+    if errors:
+        raise errors[0]
+    if verbose:
+        print(stats)
+    return stats
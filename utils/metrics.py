@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Build instrumentation ---
+# Per-stage wall time, rows, batch latency histogram, time per phase, and
+# the Neo4j ResultSummary counters / server timings of every write. Loads
+# record into the stage that is running in the calling thread (see
+# Metrics.scope, used by utils/build_dag.py), or under their own name.
+#
+# Phases: read (CSV parsing / chunking), transform (pandas, dict building),
+# encode (embedding model), write (client-side batch latency, summed over
+# loader workers). server_seconds is the part of `write` the server reports
+# (result_available_after + result_consumed_after); the rest is network and
+# driver overhead.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SUMMARY_COUNTERS = (
+    "nodes_created", "nodes_deleted", "relationships_created", "relationships_deleted",
+    "properties_set", "labels_added", "labels_removed", "indexes_added", "constraints_added",
+)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        # [(le, count)] as Prometheus expects, ending with +Inf
+        total, out = 0, []
+        for le, n in zip(list(self.buckets) + ["+Inf"], self.counts):
+            total += n
+            out.append((le, total))
+        return out
+
+    def quantile(self, q):
+        # Upper bucket bound holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        for le, total in self.cumulative():
+            if total >= rank:
+                return le
+        return "+Inf"
+
+
+class StageMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.wall_seconds = 0.0
+        self.rows = 0
+        self.batches = 0
+        self.retries = 0
+        self.phases = {}
+        self.counters = dict.fromkeys(SUMMARY_COUNTERS, 0)
+        self.server_seconds = 0.0
+        self.batch_latency = Histogram()
+        self._lock = threading.Lock()
+
+    def record_batch(self, rows, seconds, retries=0, summary=None):
+        with self._lock:
+            self.rows += rows
+            self.batches += 1
+            self.retries += retries
+            self.batch_latency.observe(seconds)
+            self.phases["write"] = self.phases.get("write", 0.0) + seconds
+            if summary is not None:
+                self._record_summary(summary)
+
+    def _record_summary(self, summary):
+        counters = summary.counters
+        for name in SUMMARY_COUNTERS:
+            self.counters[name] += getattr(counters, name, 0) or 0
+        for timing in (summary.result_available_after, summary.result_consumed_after):
+            if timing:
+                self.server_seconds += timing / 1000
+
+    def add_wall(self, seconds):
+        with self._lock:
+            self.wall_seconds += seconds
+
+    def add_phase(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "wall_seconds": self.wall_seconds,
+                "rows": self.rows,
+                "rows_per_sec": self.rows / self.wall_seconds if self.wall_seconds else None,
+                "batches": self.batches,
+                "retries": self.retries,
+                "phases": dict(self.phases),
+                "server_seconds": self.server_seconds,
+                "counters": {k: v for k, v in self.counters.items() if v},
+                "batch_latency": {
+                    "count": self.batch_latency.count, "sum": self.batch_latency.sum,
+                    "p50_le": self.batch_latency.quantile(0.5), "p99_le": self.batch_latency.quantile(0.99),
+                    "buckets": self.batch_latency.cumulative(),
+                },
+            }
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def stage(self, name):
+        with self._lock:
+            if name not in self.stages:
+                self.stages[name] = StageMetrics(name)
+            return self.stages[name]
+
+    def current(self):
+        return getattr(self._local, "stage", None)
+
+    @contextmanager
+    def scope(self, name):
+        # Attribute everything recorded by this thread to stage `name`, and
+        # add the elapsed time to its wall time
+        previous = self.current()
+        self._local.stage = name
+        start = time.perf_counter()
+        try:
+            yield self.stage(name)
+        finally:
+            self.stage(name).add_wall(time.perf_counter() - start)
+            self._local.stage = previous
+
+    @contextmanager
+    def phase(self, phase, default_stage=None):
+        name = self.current() or default_stage
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if name is not None:
+                self.stage(name).add_phase(phase, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+
+    # --- Export ---
+    def to_dict(self):
+        with self._lock:
+            stages = list(self.stages.values())
+        return {"generated": time.time(), "stages": {s.name: s.to_dict() for s in stages}}
+
+    def to_prometheus(self, prefix="graphrag"):
+        report = self.to_dict()["stages"]
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+                lines.append(f"{prefix}_{name}{suffix}{{{label_text}}} {value}")
+
+        family("stage_wall_seconds", "gauge", "Wall-clock time per build stage.",
+               [("", {"stage": s}, m["wall_seconds"]) for s, m in report.items()])
+        family("stage_rows_total", "counter", "Rows written per stage.",
+               [("", {"stage": s}, m["rows"]) for s, m in report.items()])
+        family("stage_retries_total", "counter", "Transient-error retries per stage.",
+               [("", {"stage": s}, m["retries"]) for s, m in report.items()])
+        family("stage_phase_seconds", "gauge", "Time per phase (read, transform, encode, write).",
+               [("", {"stage": s, "phase": p}, v) for s, m in report.items() for p, v in m["phases"].items()])
+        family("stage_server_seconds", "gauge", "Server-reported query time per stage.",
+               [("", {"stage": s}, m["server_seconds"]) for s, m in report.items()])
+        family("neo4j_updates_total", "counter", "ResultSummary counters per stage.",
+               [("", {"stage": s, "counter": c}, v) for s, m in report.items() for c, v in m["counters"].items()])
+        samples = []
+        for s, m in report.items():
+            hist = m["batch_latency"]
+            samples += [("_bucket", {"stage": s, "le": le}, n) for le, n in hist["buckets"]]
+            samples += [("_sum", {"stage": s}, hist["sum"]), ("_count", {"stage": s}, hist["count"])]
+        family("batch_latency_seconds", "histogram", "Client-side latency of one write batch.", samples)
+        return "\n".join(lines) + "\n"
+
+    def write(self, out_dir, name="build_metrics"):
+        # <out_dir>/<name>.json and <out_dir>/<name>.prom
+        os.makedirs(out_dir, exist_ok=True)
+        json_path = os.path.join(out_dir, f"{name}.json")
+        with open(json_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        prom_path = os.path.join(out_dir, f"{name}.prom")
+        with open(prom_path, "w") as f:
+            f.write(self.to_prometheus())
+        print(f"Metrics written to {json_path} and {prom_path}")
+        return json_path, prom_path
+
+
+METRICS = Metrics()
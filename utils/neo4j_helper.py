@@ -1,19 +1,69 @@
+import time
+import numpy as np
 import pandas as pd
+from utils.metrics import METRICS
+from utils.loader import load_rows, DEFAULT_WORKERS, DEFAULT_BATCH_SIZE
+from utils.ingest import iter_chunks, iter_records, frame_records
+from utils.eligibility import refresh_all_eligibility
+from utils.graph_schema import (NodeSpec, NODES, DEMOGRAPHIC_NODES, RELATIONSHIPS, VECTOR_INDEXES, node_query,
+                                relationship_query, node_columns, relationship_columns)
 
 def batcher(iterable, size=1000):
     for pos in range(0, len(iterable), size):
         yield iterable[pos:pos+size]
 
-# --- Create Nodes ---
-def create_nodes(label, data, id_col,driver):
-    for batch in batcher(data.to_dict("records")):
-        with driver.session() as session:
-            session.write_transaction(
-                lambda tx, b: tx.run(
-                    f"UNWIND $batch AS row MERGE (n:{label} {{{id_col}: row.{id_col}}}) SET n += row",
-                    batch=b
-                ), batch
+# --- Indexes for performance ---
+SCHEMA_KEYS = [(n.label, n.key) for n in NODES] + DEMOGRAPHIC_NODES
+
+def _constrained_keys(session):
+    result = session.run(
+        "SHOW CONSTRAINTS YIELD labelsOrTypes, properties "
+        "WHERE size(labelsOrTypes) = 1 AND size(properties) = 1 "
+        "RETURN labelsOrTypes[0] AS label, properties[0] AS key"
+    )
+    return {(r["label"], r["key"]) for r in result}
+
+def create_indexes(driver):
+    with driver.session() as session:
+        # A key with a uniqueness constraint already has its index
+        constrained = _constrained_keys(session)
+        for label, key in SCHEMA_KEYS:
+            if (label, key) not in constrained:
+                session.run(f"CREATE INDEX IF NOT EXISTS FOR (n:{label}) ON (n.{key})")
+
+# --- Uniqueness constraints (fresh loads) ---
+# Neo4j won't add a uniqueness constraint over a plain index on the same
+# property, so that index is dropped first; the constraint brings its own.
+def create_constraints(driver):
+    with driver.session() as session:
+        plain = {
+            (r["label"], r["key"]): r["name"] for r in session.run(
+                "SHOW INDEXES YIELD name, type, labelsOrTypes, properties, owningConstraint "
+                "WHERE type = 'RANGE' AND owningConstraint IS NULL "
+                "AND size(labelsOrTypes) = 1 AND size(properties) = 1 "
+                "RETURN name, labelsOrTypes[0] AS label, properties[0] AS key"
             )
+        }
+        for label, key in SCHEMA_KEYS:
+            if (label, key) in plain:
+                session.run(f"DROP INDEX {plain[(label, key)]}")
+            session.run(f"CREATE CONSTRAINT {label.lower()}_{key.lower()}_unique IF NOT EXISTS "
+                        f"FOR (n:{label}) REQUIRE n.{key} IS UNIQUE")
+
+def database_is_empty(driver):
+    with driver.session() as session:
+        return session.run("MATCH (n) RETURN 1 LIMIT 1").single() is None
+
+# --- Create Nodes ---
+# Only the label's NODE_PROPERTIES are sent. drop_nulls=False sends empty
+# cells as None, so SET n += row clears a property the CSV no longer has
+# (incremental updates of existing nodes).
+def create_nodes(label, data, id_col, driver, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                 drop_nulls=True):
+    node = NodeSpec(label, None, id_col)
+    # Partition on the id so two workers never MERGE the same node at once.
+    return load_rows(driver, node_query(node), iter_records(data, columns=node_columns(node), drop_nulls=drop_nulls),
+                     name=label, key=id_col, workers=workers, batch_size=batch_size)
 
 # --- Create Demographic Nodes (Zipcode, Age_Range, Income_Range) and relationships ---
 def get_age(birthdate, ref_date="2025-05-16"):
@@ -26,8 +76,10 @@ def get_age(birthdate, ref_date="2025-05-16"):
     except:
         return None
 
+# A missing age or income is "Unknown" (NaN used to fall through every
+# comparison to "65+" / "100k+")
 def age_bucket(age):
-    if age is None:
+    if age is None or pd.isna(age):
         return "Unknown"
     if age < 18:
         return "0-17"
@@ -45,6 +97,8 @@ def income_bucket(income):
         income = float(income)
     except:
         return "Unknown"
+    if pd.isna(income):
+        return "Unknown"
     if income < 20000:
         return "<20k"
     elif income < 50000:
@@ -55,8 +109,7 @@ def income_bucket(income):
         return "100k+"
     
 # Connect patients to demographic nodes
-def connect_patient_demographics(batch, driver):
-    query = """
+CONNECT_DEMOGRAPHICS_QUERY = """
     UNWIND $batch AS row
     MATCH (p:Patient {Id: row.Id})
     MATCH (a:Age_Range {range: row.AGE_RANGE})
@@ -68,21 +121,150 @@ def connect_patient_demographics(batch, driver):
     MATCH (z:Zipcode {zipcode: row.ZIPCODE})
     MERGE (p)-[:LIVES_IN]->(z)
     """
+CONNECT_DEMOGRAPHICS_COLUMNS = ["Id", "AGE_RANGE", "INCOME_RANGE", "ZIPCODE"]
+
+def connect_patient_demographics(batch, driver):
+    start = time.perf_counter()
     with driver.session() as session:
-        session.write_transaction(lambda tx, b: tx.run(query, batch=b), batch)
+        summary = session.execute_write(lambda tx, b: tx.run(CONNECT_DEMOGRAPHICS_QUERY, batch=b).consume(), batch)
+    METRICS.stage(METRICS.current() or "demographics").record_batch(
+        len(batch), time.perf_counter() - start, summary=summary)
+
+# --- Vectorized versions of get_age / age_bucket / income_bucket (same labels) ---
+AGE_BINS = [-np.inf, 18, 30, 45, 65, np.inf]
+AGE_LABELS = ["0-17", "18-29", "30-44", "45-64", "65+"]
+INCOME_BINS = [-np.inf, 20000, 50000, 100000, np.inf]
+INCOME_LABELS = ["<20k", "20k-50k", "50k-100k", "100k+"]
+
+def get_ages(birthdates, ref_date="2025-05-16"):
+    bd = pd.to_datetime(birthdates, errors='coerce', format="ISO8601")
+    ages = (pd.Timestamp(ref_date) - bd).dt.days // 365.25
+    # Non-ISO dates (e.g. 8/15/1985) fall back to get_age's per-value parsing
+    retry = bd.isna() & birthdates.notna()
+    if retry.any():
+        ages[retry] = birthdates[retry].map(get_age).astype(float)
+    return ages
+
+def age_buckets(ages):
+    buckets = pd.cut(ages, bins=AGE_BINS, labels=AGE_LABELS, right=False)
+    return buckets.astype(object).where(ages.notna(), "Unknown")
+
+def income_buckets(incomes):
+    if not pd.api.types.is_numeric_dtype(incomes):
+        return incomes.map(income_bucket)
+    incomes = incomes.astype(float)
+    buckets = pd.cut(incomes, bins=INCOME_BINS, labels=INCOME_LABELS, right=False)
+    return buckets.astype(object).where(incomes.notna(), "Unknown")
+
+# ZIP codes as Zipcode keys: 2134, "2134" and 2134.0 (a chunk with a missing
+# ZIP reads as float) are all "2134"; a missing ZIP is None, with no Zipcode
+def zipcode(value):
+    if pd.isna(value):
+        return None
+    try:
+        return str(int(float(value)))
+    except ValueError:
+        return str(value).strip()
+
+def zipcodes(column):
+    numeric = pd.to_numeric(column, errors="coerce")
+    text = column.astype(object).where(column.notna(), None)
+    other = text.notna() & numeric.isna()
+    text[other] = text[other].astype(str).str.strip()
+    text[numeric.notna()] = numeric[numeric.notna()].astype("int64").astype(str)
+    return text
+
+def add_demographics(patients):
+    patients['AGE'] = get_ages(patients['BIRTHDATE'])
+    patients['AGE_RANGE'] = age_buckets(patients['AGE'])
+    patients['INCOME_RANGE'] = income_buckets(patients['INCOME'])
+    patients['ZIPCODE'] = zipcodes(patients['ZIP'])
+    return patients
+
+# One UNWIND per demographic label instead of one round trip per value
+def demographic_node_query(label, key):
+    return f"UNWIND $values AS v MERGE (:{label} {{{key}: v}})"
+
+def merge_demographic_nodes(driver, age_ranges, income_ranges, zipcodes):
+    def work(tx):
+        return [
+            tx.run(demographic_node_query("Age_Range", "range"),
+                   values=[str(v) for v in age_ranges]).consume(),
+            tx.run(demographic_node_query("Income_Range", "range"),
+                   values=[str(v) for v in income_ranges]).consume(),
+            tx.run(demographic_node_query("Zipcode", "zipcode"),
+                   values=[str(v) for v in zipcodes]).consume(),
+        ]
+    start = time.perf_counter()
+    with driver.session() as session:
+        summaries = session.execute_write(work)
+    metrics = METRICS.stage(METRICS.current() or "demographics")
+    seconds = (time.perf_counter() - start) / len(summaries)
+    for values, summary in zip((age_ranges, income_ranges, zipcodes), summaries):
+        metrics.record_batch(len(values), seconds, summary=summary)
+
+# Derive demographics chunk by chunk, MERGE demographic nodes not seen yet,
+# then connect that chunk's patients. `patients` is a DataFrame or CsvSource.
+def create_demographics(patients, driver, batch_size=DEFAULT_BATCH_SIZE):
+    seen_ages, seen_incomes, seen_zipcodes = set(), set(), set()
+    for chunk in iter_chunks(patients):
+        with METRICS.phase("transform"):
+            chunk = add_demographics(chunk.copy())
+        ages = set(chunk['AGE_RANGE'].unique()) - seen_ages
+        incomes = set(chunk['INCOME_RANGE'].unique()) - seen_incomes
+        zips = set(chunk['ZIPCODE'].dropna().unique()) - seen_zipcodes
+        merge_demographic_nodes(driver, ages, incomes, zips)
+        seen_ages |= ages
+        seen_incomes |= incomes
+        seen_zipcodes |= zips
+        rows = frame_records(chunk, CONNECT_DEMOGRAPHICS_COLUMNS)
+        for batch in batcher(rows, batch_size):
+            connect_patient_demographics(batch, driver)
 
 # --- Create Relationships ---
-def create_relationships(data, query, driver):
-    for batch in batcher(data.to_dict("records")):
-        with driver.session() as session:
-            session.write_transaction(lambda tx, b: tx.run(query, batch=b), batch)
+# `key` is the CSV column holding the start node id; batches are partitioned
+# on it so concurrent workers don't deadlock on the same node. `columns`
+# limits each row to what the query reads (see relationship_columns); rows
+# with a null in one of them are skipped.
+def create_relationships(data, query, driver, key=None, name="relationships",
+                         workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE, columns=None):
+    return load_rows(driver, query, iter_records(data, columns=columns, required=columns), name=name, key=key,
+                     workers=workers, batch_size=batch_size)
+
+# Load every NODES / RELATIONSHIPS entry; `data` maps CSV name -> DataFrame or CsvSource
+def create_all_nodes(data, driver):
+    for node in NODES:
+        create_nodes(node.label, data[node.source], node.key, driver)
+
+def create_all_relationships(data, driver):
+    for rel in RELATIONSHIPS:
+        create_relationships(data[rel.source], relationship_query(rel), driver,
+                             key=rel.start_col, name=rel.name, columns=relationship_columns(rel))
+    # HAS_CLAIM / PAID_BY changed: recompute Patient.eligible_payers
+    refresh_all_eligibility(driver)
 
 
 def create_vector_index(tx, index_name, node_label, embedding_property, embedding_dimension, similarity_function):
     query = (
-        f"CREATE VECTOR INDEX {index_name} "
+        f"CREATE VECTOR INDEX {index_name} IF NOT EXISTS "
         f"FOR (n:{node_label}) ON (n.{embedding_property}) "
         f"OPTIONS {{indexConfig: {{`vector.dimensions`: {embedding_dimension}, "
         f"`vector.similarity_function`: '{similarity_function}'}}}}"
     )
-    tx.run(query)
\ No newline at end of file
+    tx.run(query)
+
+def drop_index(driver, index_name):
+    with driver.session() as session:
+        session.run(f"DROP INDEX `{index_name}` IF EXISTS").consume()
+
+def create_vector_indexes(driver, embedding_dimension, similarity_function="cosine"):
+    with driver.session() as session:
+        for index_name, label in VECTOR_INDEXES:
+            session.execute_write(
+                create_vector_index,
+                index_name=index_name,
+                node_label=label,
+                embedding_property="embedding",
+                embedding_dimension=embedding_dimension,
+                similarity_function=similarity_function
+            )
@@ -0,0 +1,276 @@
+import json
+import os
+import time
+from collections import namedtuple
+
+from utils.ingest import iter_chunks, frame_records
+from utils.graph_schema import (NODES, RELATIONSHIPS, DEMOGRAPHIC_NODES, DEMOGRAPHIC_LINKS, VECTOR_INDEXES,
+                                node_query, node_spec, relationship_query, node_columns, relationship_columns)
+from utils.neo4j_helper import (SCHEMA_KEYS, CONNECT_DEMOGRAPHICS_QUERY, CONNECT_DEMOGRAPHICS_COLUMNS,
+                                add_demographics, demographic_node_query, create_indexes, create_constraints,
+                                database_is_empty)
+from utils.eligibility import REFRESH_ALL_QUERY, REFRESH_PATIENTS_QUERY, LOOKUP_QUERY, ELIGIBLE_PAYERS
+from utils.embeddings import EMBEDDING_DIM, embedding_write_query, has_vector_setter
+from utils.feature_embedder import FEATURE_INDEX, FEATURE_PROPERTY, FEATURE_DIM, FEATURE_VECTOR_QUERY
+from utils.knn_graph import WRITE_QUERY as KNN_WRITE_QUERY, LOOKUP_QUERY as KNN_LOOKUP_QUERY
+from utils.retrieval import VECTOR_QUERY, BATCH_VECTOR_QUERY, HYBRID_QUERY, HYBRID_WEIGHTS, hybrid_query
+
+# --- Query plan profiling ---
+# Every distinct query the build and retrieval paths send, run once with
+# EXPLAIN (plan only) or PROFILE (executed inside a transaction that is
+# rolled back, so no data is written) on a sample of the real rows. The
+# indexes / constraints the build's first stage makes are created up front
+# (see profile_pipeline), so those do persist. Each
+# plan is recorded as an operator tree with rows and db hits, and operators
+# that usually mean a missing index or a badly shaped query are flagged.
+# Before that, SHOW INDEXES is checked against the schema the load expects:
+# a vector index whose dimension isn't the encoder's is an error, since
+# every vector written or queried through it would be rejected.
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", 100))
+FLAGGED_OPERATORS = ["NodeByLabelScan", "AllNodesScan", "Eager", "CartesianProduct"]
+
+# `expected`: flagged operators the query has by design (e.g. a full pass
+# over every Patient)
+PipelineQuery = namedtuple("PipelineQuery", ["name", "query", "params", "expected"])
+
+
+def _sample(data, columns=None, n=PROFILE_SAMPLE_ROWS):
+    chunk = next(iter_chunks(data, n), None)
+    return chunk, (frame_records(chunk, columns) if chunk is not None else [])
+
+
+def _unit(dim):
+    # Vector queries reject zero vectors; any unit vector plans the same
+    return [1.0] + [0.0] * (dim - 1)
+
+
+def pipeline_queries(data, embedding_dimension=EMBEDDING_DIM, vector_setter=True, create=False,
+                     features=False, knn=False):
+    # `data` maps CSV name -> DataFrame or CsvSource, as for build_graph
+    queries = []
+    for node in NODES:
+        _, rows = _sample(data[node.source], node_columns(node))
+        queries.append(PipelineQuery(f"nodes:{node.label}", node_query(node), {"batch": rows}, ()))
+        if create:
+            queries.append(PipelineQuery(f"nodes:{node.label} (create)", node_query(node, create=True),
+                                         {"batch": rows}, ()))
+
+    patients, _ = _sample(data["patients"])
+    patients = add_demographics(patients.copy())
+    columns = {label: column for _, label, _, column in DEMOGRAPHIC_LINKS}
+    for label, key in DEMOGRAPHIC_NODES:
+        column = columns[label]
+        queries.append(PipelineQuery(f"demographics:{label}", demographic_node_query(label, key),
+                                     {"values": sorted(set(patients[column].dropna().astype(str)))}, ()))
+    queries.append(PipelineQuery("demographics:connect", CONNECT_DEMOGRAPHICS_QUERY,
+                                 {"batch": frame_records(patients, CONNECT_DEMOGRAPHICS_COLUMNS)}, ()))
+
+    for rel in RELATIONSHIPS:
+        _, rows = _sample(data[rel.source], relationship_columns(rel))
+        queries.append(PipelineQuery(f"rel:{rel.name}", relationship_query(rel), {"batch": rows}, ()))
+        if create:
+            queries.append(PipelineQuery(f"rel:{rel.name} (create)", relationship_query(rel, create=True),
+                                         {"batch": rows}, ()))
+
+    patient_ids = patients["Id"].tolist()
+    queries += [
+        PipelineQuery("eligibility:refresh_all", REFRESH_ALL_QUERY, {"payers": ELIGIBLE_PAYERS},
+                      ("NodeByLabelScan",)),
+        PipelineQuery("eligibility:refresh_patients", REFRESH_PATIENTS_QUERY,
+                      {"batch": [{"id": pid} for pid in patient_ids], "payers": ELIGIBLE_PAYERS}, ()),
+        PipelineQuery("eligibility:lookup", LOOKUP_QUERY, {"patient_ids": patient_ids, "payers": ELIGIBLE_PAYERS}, ()),
+    ]
+
+    embedding = _unit(embedding_dimension)
+    for _, label in VECTOR_INDEXES:
+        node = node_spec(label)
+        chunk, _ = _sample(data[node.source], [node.key])
+        rows = [{"id": key, "embedding": embedding} for key in chunk[node.key].tolist()]
+        queries.append(PipelineQuery(f"embeddings:{label}", embedding_write_query(label, node.key,
+                                     vector_setter=vector_setter), {"batch": rows}, ()))
+
+    demographics = frame_records(patients, CONNECT_DEMOGRAPHICS_COLUMNS[1:])
+    queries += [
+        PipelineQuery("retrieval:vector", VECTOR_QUERY, {"top_k": 5, "embedding": embedding}, ()),
+        PipelineQuery("retrieval:vector_batch", BATCH_VECTOR_QUERY,
+                      {"top_k": 5, "embeddings": [embedding] * min(len(patient_ids), 8)}, ()),
+    ]
+    hybrid = {"queries": [dict(d, embedding=embedding) for d in demographics[:8]], "candidates": 20, "top_k": 5,
+              "weights": HYBRID_WEIGHTS, "payers": ELIGIBLE_PAYERS}
+    queries.append(PipelineQuery("retrieval:hybrid", HYBRID_QUERY, hybrid, ()))
+    queries.append(PipelineQuery("retrieval:hybrid (require ZIPCODE)", hybrid_query(["ZIPCODE"]), hybrid, ()))
+    if features:
+        queries.append(PipelineQuery("embeddings:Patient features", embedding_write_query(
+            "Patient", "Id", prop=FEATURE_PROPERTY, vector_setter=vector_setter),
+            {"batch": [{"id": pid, "embedding": _unit(FEATURE_DIM)} for pid in patient_ids]}, ()))
+        queries.append(PipelineQuery("retrieval:features", FEATURE_VECTOR_QUERY,
+                                     {"top_k": 5, "embeddings": [_unit(FEATURE_DIM)]}, ()))
+    if knn:
+        neighbours = [{"id": pid, "score": 1.0, "rank": 0} for pid in patient_ids[1:2]]
+        queries.append(PipelineQuery("knn:write", KNN_WRITE_QUERY, {"batch": [
+            {"id": pid, "key": "", "at": 0.0, "neighbours": neighbours} for pid in patient_ids[:1]]}, ()))
+        queries.append(PipelineQuery("knn:lookup", KNN_LOOKUP_QUERY, {"patient_ids": patient_ids}, ()))
+
+    # Once per distinct query text
+    distinct = {}
+    for q in queries:
+        distinct.setdefault(q.query, q)
+    return list(distinct.values())
+
+
+# --- Schema checks ---
+def _show_indexes(driver):
+    with driver.session() as session:
+        return session.run(
+            "SHOW INDEXES YIELD name, type, state, labelsOrTypes, properties, options "
+            "RETURN name, type, state, labelsOrTypes, properties, options"
+        ).data()
+
+
+def _expected_vector_indexes(embedding_dimension, features):
+    # (label, property) -> (index name, dimensions)
+    expected = {(label, "embedding"): (name, embedding_dimension) for name, label in VECTOR_INDEXES}
+    if features:
+        expected[("Patient", FEATURE_PROPERTY)] = (FEATURE_INDEX, FEATURE_DIM)
+    return expected
+
+
+def _vector_dimensions(index):
+    found = ((index["options"] or {}).get("indexConfig") or {}).get("vector.dimensions")
+    return None if found is None else int(found)
+
+
+def mismatched_vector_indexes(driver, embedding_dimension=EMBEDDING_DIM, features=False, indexes=None):
+    # [(index name, label, property, dimensions, expected dimensions)] for
+    # vector indexes the pipeline uses whose dimension isn't the encoder's
+    expected = _expected_vector_indexes(embedding_dimension, features)
+    mismatched = []
+    for index in _show_indexes(driver) if indexes is None else indexes:
+        labels, props = index["labelsOrTypes"] or [], index["properties"] or []
+        if index["type"] != "VECTOR" or len(labels) != 1 or len(props) != 1 or (labels[0], props[0]) not in expected:
+            continue
+        found, dim = _vector_dimensions(index), expected[(labels[0], props[0])][1]
+        if found is not None and found != dim:
+            mismatched.append((index["name"], labels[0], props[0], found, dim))
+    return mismatched
+
+
+def check_schema(driver, embedding_dimension=EMBEDDING_DIM, features=False):
+    # (errors, warnings) as messages
+    expected = _expected_vector_indexes(embedding_dimension, features)
+    indexes = _show_indexes(driver)
+    mismatched = mismatched_vector_indexes(driver, embedding_dimension, features, indexes)
+    errors = [f"vector index {name} on :{label}({prop}) has {found} dimensions, the pipeline writes {dim} "
+              f"(run create_vectors.py to drop and recreate it)"
+              for name, label, prop, found, dim in mismatched]
+    warnings = []
+    keyed = set()
+    for index in indexes:
+        if index["state"] != "ONLINE":
+            warnings.append(f"index {index['name']} is {index['state']}")
+        labels, props = index["labelsOrTypes"] or [], index["properties"] or []
+        if len(labels) != 1 or len(props) != 1:
+            continue
+        if index["type"] == "RANGE":
+            keyed.add((labels[0], props[0]))
+        elif index["type"] == "VECTOR" and (labels[0], props[0]) in expected:
+            name, dim = expected[(labels[0], props[0])]
+            if index["name"] != name and _vector_dimensions(index) in (None, dim):
+                warnings.append(f"vector index on :{labels[0]}({props[0]}) is named {index['name']}, "
+                                f"queries use {name}")
+    for label, key in SCHEMA_KEYS:
+        if (label, key) not in keyed:
+            warnings.append(f"no index on :{label}({key}); MATCH/MERGE on it scans every {label} node")
+    return errors, warnings
+
+
+# --- Plans ---
+def _operator(plan):
+    # "NodeByLabelScan@neo4j" -> "NodeByLabelScan"
+    return plan.get("operatorType", "").split("@")[0]
+
+
+def _tree(plan):
+    args = plan.get("args") or {}
+    return {
+        "operator": _operator(plan),
+        "details": args.get("Details"),
+        "estimated_rows": args.get("EstimatedRows"),
+        "rows": plan.get("rows"),
+        "db_hits": plan.get("dbHits"),
+        "children": [_tree(child) for child in plan.get("children") or []],
+    }
+
+
+def _walk(tree):
+    yield tree
+    for child in tree["children"]:
+        yield from _walk(child)
+
+
+def profile_query(session, query, params, mode="profile"):
+    # PROFILE needs to execute; CALL ... IN TRANSACTIONS commits on its own,
+    # so that one is only EXPLAINed
+    start = time.perf_counter()
+    if mode == "profile" and "IN TRANSACTIONS" not in query:
+        tx = session.begin_transaction()
+        try:
+            summary = tx.run("PROFILE " + query, **params).consume()
+        finally:
+            tx.rollback()
+        plan, profiled = summary.profile, True
+    else:
+        plan, profiled = session.run("EXPLAIN " + query, **params).consume().plan, False
+    tree = _tree(plan or {})
+    nodes = list(_walk(tree))
+    return {
+        "profiled": profiled,
+        "seconds": time.perf_counter() - start,
+        "db_hits": sum(n["db_hits"] or 0 for n in nodes) if profiled else None,
+        "rows": tree["rows"] if profiled else tree["estimated_rows"],
+        "operators": sorted({n["operator"] for n in nodes}),
+        "flags": [f"{n['operator']}" + (f" ({n['details']})" if n["details"] else "")
+                  for n in nodes if n["operator"] in FLAGGED_OPERATORS],
+        "plan": tree,
+    }
+
+
+def profile_pipeline(driver, data, mode="profile", create=False, embedding_dimension=EMBEDDING_DIM,
+                     features=False, knn=False, out_dir=None):
+    # Creates the schema first (the same indexes/constraints the build's
+    # first stage makes, so this is the one thing that persists), so a
+    # flagged label scan is a real gap, not a not-yet-built index
+    create = create and database_is_empty(driver)
+    (create_constraints if create else create_indexes)(driver)
+    errors, warnings = check_schema(driver, embedding_dimension, features)
+    for message in warnings:
+        print(f"[profile] warning: {message}")
+    for message in errors:
+        print(f"[profile] ERROR: {message}")
+    report = {"mode": mode, "generated": time.time(), "errors": errors, "warnings": warnings, "queries": {}}
+    queries = pipeline_queries(data, embedding_dimension, has_vector_setter(driver), create, features, knn)
+    flagged = 0
+    with driver.session() as session:
+        for q in queries:
+            try:
+                result = profile_query(session, q.query, q.params, mode)
+            except Exception as e:
+                # e.g. a vector index that the build hasn't created yet
+                report["queries"][q.name] = {"error": str(e)}
+                print(f"[profile] {q.name}: failed: {e}")
+                continue
+            unexpected = [f for f in result["flags"] if f.split(" ")[0] not in q.expected]
+            if unexpected:
+                warnings.append(f"{q.name}: {', '.join(unexpected)}")
+                flagged += 1
+            report["queries"][q.name] = result
+            hits = f"{result['db_hits']} db hits, " if result["profiled"] else ""
+            print(f"[profile] {q.name}: {hits}{result['rows']} rows, {result['seconds'] * 1000:.0f} ms"
+                  + (f"  !! {', '.join(unexpected)}" if unexpected else ""))
+    print(f"[profile] {len(queries)} queries ({mode}), {flagged} with flagged operators, "
+          f"{len(errors)} schema errors")
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, "query_profile.json"), "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    return report
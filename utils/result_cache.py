@@ -0,0 +1,171 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# --- In-process result caches for the retrieval path ---
+# eligibility: patient_id -> eligible payer names ([] = checked, not eligible)
+# neighbours:  (embedding hash, top_k) -> [(patient_id, score), ...]
+# Both are LRU, bounded by an estimated byte size, with a TTL so writes made
+# by other processes are picked up eventually. Writes made by this process
+# call the invalidate_* hooks below.
+CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 300))
+CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+def _sizeof(value):
+    # Rough deep size of the str / float / list / tuple values we cache
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    def __init__(self, name, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = _sizeof(key) + _sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def invalidate(self, keys=None):
+        # keys=None clears everything
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+                self.bytes = 0
+                return
+            for key in keys:
+                if key in self._entries:
+                    self._drop(key)
+
+    def items(self):
+        # Snapshot of the live (key, value) pairs, oldest first; doesn't touch
+        # the LRU order or the hit/miss counters
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (v, expires_at, _) in self._entries.items() if expires_at >= now]
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def metrics(self):
+        return {"entries": len(self), "bytes": self.bytes, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hit_rate, "evictions": self.evictions, "expirations": self.expirations}
+
+    def __str__(self):
+        return (f"{self.name} cache: {len(self)} entries, {self.bytes / 1e6:.1f} MB, "
+                f"{self.hit_rate:.1%} hit rate ({self.hits} hits, {self.misses} misses), "
+                f"{self.evictions} evictions, {self.expirations} expirations")
+
+
+eligibility_cache = LRUCache("Eligibility")
+neighbour_cache = LRUCache("Neighbour")
+
+
+def embedding_key(embedding, top_k):
+    vec = np.ascontiguousarray(embedding, dtype=np.float32)
+    return hashlib.sha1(vec.tobytes()).hexdigest(), top_k
+
+
+# --- Cached reads ---
+def cached_eligibility(patient_ids, fetch):
+    # `fetch(ids)` returns {patient_id: payers} for eligible patients only;
+    # the rest are cached as [] so they aren't re-queried either.
+    patient_ids = list(dict.fromkeys(patient_ids))
+    result, missing = {}, []
+    for pid in patient_ids:
+        payers = eligibility_cache.get(pid)
+        if payers is None:
+            missing.append(pid)
+        elif payers:
+            result[pid] = payers
+    if missing:
+        fetched = fetch(missing)
+        for pid in missing:
+            payers = fetched.get(pid, [])
+            eligibility_cache.put(pid, payers)
+            if payers:
+                result[pid] = payers
+    return result
+
+
+def cached_neighbours(embeddings, top_k, search):
+    # `search(embeddings, top_k)` returns one neighbour list per embedding
+    keys = [embedding_key(e, top_k) for e in embeddings]
+    results = [neighbour_cache.get(k) for k in keys]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        found = search([embeddings[i] for i in missing], top_k)
+        for i, neighbours in zip(missing, found):
+            neighbour_cache.put(keys[i], neighbours)
+            results[i] = neighbours
+    return results
+
+
+# --- Invalidation hooks (called by the write paths) ---
+def invalidate_eligibility(patient_ids=None):
+    eligibility_cache.invalidate(None if patient_ids is None else list(patient_ids))
+
+
+def invalidate_neighbours():
+    # Any new or re-embedded patient can enter any top-k list
+    neighbour_cache.invalidate()
+
+
+def cache_metrics():
+    return {"eligibility": eligibility_cache.metrics(), "neighbours": neighbour_cache.metrics()}
+
+
+def verify_eligibility_cache(fetch, sample=None):
+    # Compares cached entries against a fresh `fetch`; returns the ids whose
+    # cached payers differ (empty list = cache is consistent)
+    cached = dict(eligibility_cache.items())
+    ids = list(cached)[:sample] if sample else list(cached)
+    fresh = fetch(ids) if ids else {}
+    return [pid for pid in ids if sorted(cached[pid]) != sorted(fresh.get(pid, []))]
@@ -0,0 +1,240 @@
+import os
+
+import pandas as pd
+
+from utils.embeddings import BATCH_SIZE, patient_texts, encode_texts, embedding_write_query, has_vector_setter
+from utils.neo4j_helper import create_nodes, create_demographics, add_demographics
+from utils.eligibility import lookup_eligibility, ELIGIBLE_PAYERS
+from utils.graph_schema import DEMOGRAPHIC_LINKS
+from utils.feature_embedder import patient_features, query_feature_index, FEATURE_PROPERTY
+from utils.knn_graph import precomputed_neighbours, KNN_MAX_AGE
+from utils.result_cache import (cached_eligibility, cached_neighbours, invalidate_eligibility, invalidate_neighbours,
+                                eligibility_cache)
+
+# --- Retrieval queries shared by the CLI, benchmarks and services ---
+VECTOR_QUERY = """
+CALL db.index.vector.queryNodes('patient_embedding_index', $top_k, $embedding)
+YIELD node, score
+RETURN node.Id AS patient_id, score
+ORDER BY score DESC
+"""
+
+# k-NN for a whole batch of query vectors in one round trip
+BATCH_VECTOR_QUERY = """
+UNWIND range(0, size($embeddings) - 1) AS i
+CALL db.index.vector.queryNodes('patient_embedding_index', $top_k, $embeddings[i])
+YIELD node, score
+RETURN i, node.Id AS patient_id, score
+ORDER BY i, score DESC
+"""
+
+
+def query_vector_index(driver, embedding, top_k=5):
+    with driver.session() as session:
+        result = session.run(VECTOR_QUERY, top_k=top_k, embedding=list(map(float, embedding)))
+        return [(r["patient_id"], r["score"]) for r in result]
+
+
+def query_vector_index_batch(driver, embeddings, top_k=5):
+    neighbours = [[] for _ in range(len(embeddings))]
+    if not len(embeddings):
+        return neighbours
+    with driver.session() as session:
+        result = session.run(BATCH_VECTOR_QUERY, top_k=top_k,
+                             embeddings=[list(map(float, e)) for e in embeddings])
+        for r in result:
+            neighbours[r["i"]].append((r["patient_id"], r["score"]))
+    return neighbours
+
+
+def fetch_eligibility(driver, patient_ids, payers=ELIGIBLE_PAYERS, use_cache=True, graph=None):
+    # Reads the materialized Patient.eligible_payers (utils/eligibility.py),
+    # or walks the in-process `graph` (utils/csr_graph.py) when one is given;
+    # the cache only holds results for the default payer list
+    if graph is not None:
+        return graph.eligibility(patient_ids, payers)
+    if not use_cache or payers != ELIGIBLE_PAYERS:
+        return lookup_eligibility(driver, patient_ids, payers)
+    return cached_eligibility(patient_ids, lambda ids: lookup_eligibility(driver, ids, payers))
+
+
+def find_neighbours(driver, embeddings, top_k=5, index=None, use_cache=True):
+    # One neighbour list per embedding, from the local index or one batched
+    # Neo4j query; repeated embeddings are answered from the neighbour cache
+    def search(batch, k):
+        if index is not None:
+            return index.query(batch, k)
+        return query_vector_index_batch(driver, batch, k)
+    if not use_cache:
+        return search(embeddings, top_k)
+    return cached_neighbours(embeddings, top_k, search)
+
+
+def eligibility_score(similar_patients, eligibility):
+    eligible_scores = [score for pid, score in similar_patients if eligibility.get(pid)]
+    total_score = sum([score for _, score in similar_patients])
+    if total_score == 0:
+        return 0
+    return sum(eligible_scores) / total_score
+
+
+# --- Hybrid graph + vector retrieval ---
+# k-NN, demographic overlap and eligibility in one query per batch of
+# applicants. The vector index returns top_k * HYBRID_OVERSAMPLE candidates,
+# re-ranked by (score + sum of weights of the shared buckets) / (1 + sum of
+# all weights); the top_k come back with their eligible payers. With
+# `require`d buckets (AGE_RANGE, INCOME_RANGE, ZIPCODE) the candidates are
+# instead every patient in all of the applicant's required buckets, scored
+# with vector.similarity.cosine, so the filter runs before the top_k cut.
+HYBRID_OVERSAMPLE = int(os.getenv("HYBRID_OVERSAMPLE", 4))
+HYBRID_WEIGHTS = {
+    "AGE_RANGE": float(os.getenv("HYBRID_AGE_WEIGHT", 0.1)),
+    "INCOME_RANGE": float(os.getenv("HYBRID_INCOME_WEIGHT", 0.1)),
+    "ZIPCODE": float(os.getenv("HYBRID_ZIPCODE_WEIGHT", 0.05)),
+}
+
+def hybrid_query(require=()):
+    if require:
+        # Narrowest bucket (Zipcode) first, then hop to the others
+        links = [link for link in reversed(DEMOGRAPHIC_LINKS) if link[3] in require]
+        link_type, label, key, column = links[0]
+        candidates = f"MATCH (:{label} {{{key}: q.{column}}})<-[:{link_type}]-(p:Patient)\n" + "".join(
+            f"MATCH (p)-[:{link_type}]->(:{label} {{{key}: q.{column}}})\n"
+            for link_type, label, key, column in links[1:]
+        ) + """WHERE p.embedding IS NOT NULL
+WITH i, q, p, vector.similarity.cosine(p.embedding, q.embedding) AS score"""
+    else:
+        candidates = """CALL db.index.vector.queryNodes('patient_embedding_index', $candidates, q.embedding)
+YIELD node AS p, score"""
+    return """
+UNWIND range(0, size($queries) - 1) AS i
+WITH i, $queries[i] AS q
+""" + candidates + """
+WITH i, p, score, {""" + ", ".join(
+        f"{column}: EXISTS {{ (p)-[:{link_type}]->(:{label} {{{key}: q.{column}}}) }}"
+        for link_type, label, key, column in DEMOGRAPHIC_LINKS
+    ) + """} AS shared
+WITH i, p, score,
+     (score + reduce(s = 0.0, c IN keys($weights) | s + CASE WHEN shared[c] THEN $weights[c] ELSE 0.0 END))
+     / (1.0 + reduce(s = 0.0, c IN keys($weights) | s + $weights[c])) AS hybrid
+ORDER BY i, hybrid DESC
+WITH i, collect({p: p, score: score, hybrid: hybrid})[..$top_k] AS top
+UNWIND top AS t
+WITH i, t, t.p AS p
+RETURN i, p.Id AS patient_id, t.score AS score, t.hybrid AS hybrid_score, CASE
+    WHEN p.eligible_payers IS NULL
+    THEN COLLECT { MATCH (p)-[:HAS_CLAIM]->(:Claim)-[:PAID_BY]->(py:Payer) WHERE py.NAME IN $payers RETURN DISTINCT py.NAME }
+    ELSE [name IN p.eligible_payers WHERE name IN $payers]
+END AS eligible_payers
+ORDER BY i, hybrid_score DESC
+"""
+
+
+HYBRID_QUERY = hybrid_query()
+
+
+def find_hybrid(driver, embeddings, demographics, top_k=5, require=(), weights=None,
+                payers=ELIGIBLE_PAYERS, oversample=HYBRID_OVERSAMPLE):
+    # `demographics[i]` holds applicant i's AGE_RANGE / INCOME_RANGE / ZIPCODE
+    # (see add_demographics). Returns (neighbours, eligibility) in the shapes
+    # of find_neighbours / fetch_eligibility, scored by the hybrid score.
+    columns = [column for _, _, _, column in DEMOGRAPHIC_LINKS]
+    unknown = [c for c in require if c not in columns]
+    if unknown:
+        raise ValueError(f"unknown demographic buckets {unknown} (expected some of {columns})")
+    neighbours = [[] for _ in range(len(embeddings))]
+    eligibility = {}
+    if not len(embeddings):
+        return neighbours, eligibility
+    queries = [dict({c: None if d[c] is None else str(d[c]) for c in columns}, embedding=list(map(float, e)))
+               for e, d in zip(embeddings, demographics)]
+    with driver.session() as session:
+        result = session.run(hybrid_query(require), queries=queries, candidates=top_k * max(1, oversample),
+                             top_k=top_k, weights=HYBRID_WEIGHTS if weights is None else weights, payers=payers)
+        for r in result:
+            neighbours[r["i"]].append((r["patient_id"], r["hybrid_score"]))
+            if payers == ELIGIBLE_PAYERS:
+                eligibility_cache.put(r["patient_id"], r["eligible_payers"])
+            if r["eligible_payers"]:
+                eligibility[r["patient_id"]] = r["eligible_payers"]
+    return neighbours, eligibility
+
+
+# --- Batch scoring ---
+def store_applicants(frame, embeddings, driver, prop="embedding"):
+    # Same end state as add_patient + embed_and_store, but batched
+    create_nodes("Patient", frame, "Id", driver)
+    create_demographics(frame, driver)
+    query = embedding_write_query("Patient", "Id", prop=prop, vector_setter=has_vector_setter(driver))
+    rows = [{"id": pid, "embedding": emb.tolist()} for pid, emb in zip(frame["Id"].tolist(), embeddings)]
+    with driver.session() as session:
+        session.execute_write(lambda tx: tx.run(query, batch=rows).consume())
+    invalidate_neighbours()
+    invalidate_eligibility(frame["Id"].tolist())
+
+
+def score_applicants(patients, model, driver, top_k=5, store=True, index=None, cache=None,
+                     batch_size=BATCH_SIZE, graph=None, hybrid=False, require=(), features=False):
+    # Scores many applicants with one encode call, one k-NN query for all of
+    # them and one eligibility query for the union of their neighbours. With
+    # `hybrid`, neighbours and eligibility come from one find_hybrid query
+    # (Neo4j only; `index` and `graph` are not used). With `features`,
+    # applicants are matched on structured feature vectors
+    # (utils/feature_embedder.py) instead of text embeddings; `model` and
+    # `cache` are not used.
+    frame = pd.DataFrame(patients)
+    frame["Id"] = frame["Id"].astype(str)
+    ids = frame["Id"].tolist()
+    if features:
+        embeddings = patient_features(frame)
+    else:
+        embeddings = encode_texts(model, patient_texts(frame), batch_size, cache)
+
+    # k-NN runs before the batch is stored, so applicants never match
+    # themselves or each other; one extra neighbour covers an applicant
+    # that was already stored by an earlier run
+    if features:
+        neighbours = cached_neighbours(embeddings, top_k + 1, lambda batch, k: query_feature_index(driver, batch, k))
+    elif hybrid:
+        demographics = add_demographics(frame.copy()).to_dict("records")
+        neighbours, eligibility = find_hybrid(driver, embeddings, demographics, top_k + 1, require)
+    else:
+        neighbours = find_neighbours(driver, embeddings, top_k + 1, index)
+    neighbours = [[(q, s) for q, s in similar if q != pid][:top_k] for pid, similar in zip(ids, neighbours)]
+    if not hybrid or features:
+        eligibility = fetch_eligibility(driver, {q for similar in neighbours for q, _ in similar}, graph=graph)
+    if store:
+        store_applicants(frame, embeddings, driver, prop=FEATURE_PROPERTY if features else "embedding")
+    return [
+        {
+            "Id": pid,
+            "eligibility_score": eligibility_score(similar, eligibility),
+            "similar_patients": [(npid, score, eligibility.get(npid, [])) for npid, score in similar],
+        }
+        for pid, similar in zip(ids, neighbours)
+    ]
+
+
+# --- Existing patients ---
+def score_existing(driver, patient_ids, top_k=5, index=None, graph=None, max_age=KNN_MAX_AGE):
+    # Re-scores patients already in the graph from their precomputed
+    # SIMILAR_TO lists (utils/knn_graph.py); patients whose list is stale get
+    # a live k-NN query on their stored embedding instead. The patient itself
+    # is never counted as its own neighbour.
+    patient_ids = [str(pid) for pid in patient_ids]
+    fresh, stale = precomputed_neighbours(driver, patient_ids, top_k, max_age)
+    neighbours = dict(fresh)
+    if stale:
+        live = find_neighbours(driver, list(stale.values()), top_k + 1, index)
+        for pid, similar in zip(stale, live):
+            neighbours[pid] = [(q, s) for q, s in similar if q != pid][:top_k]
+    eligibility = fetch_eligibility(driver, {q for similar in neighbours.values() for q, _ in similar}, graph=graph)
+    return [
+        {
+            "Id": pid,
+            "eligibility_score": eligibility_score(neighbours.get(pid, []), eligibility),
+            "similar_patients": [(q, s, eligibility.get(q, [])) for q, s in neighbours.get(pid, [])],
+            "precomputed": pid in fresh,
+        }
+        for pid in patient_ids
+    ]
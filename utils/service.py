@@ -0,0 +1,250 @@
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.embeddings import BATCH_SIZE, patient_texts, encode_texts
+from utils.eligibility import LOOKUP_QUERY, ELIGIBLE_PAYERS
+from utils.retrieval import BATCH_VECTOR_QUERY, eligibility_score
+from utils.result_cache import eligibility_cache, neighbour_cache, embedding_key, cache_metrics
+
+# --- Asyncio scoring service ---
+# Requests that arrive within COALESCE_WINDOW_MS of each other are scored as
+# one batch: one encode call (in an executor thread), one k-NN query and one
+# eligibility query over the async Neo4j driver.
+COALESCE_WINDOW_MS = float(os.getenv("SERVICE_COALESCE_WINDOW_MS", 5))
+MAX_BATCH = int(os.getenv("SERVICE_MAX_BATCH", 64))
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class Coalescer:
+    def __init__(self, handler, window_ms=COALESCE_WINDOW_MS, max_batch=MAX_BATCH):
+        # `handler(items)` is a coroutine returning one result per item
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._pending = []
+        self._timer = None
+        # The loop only holds weak references to tasks; keep in-flight batches alive
+        self._tasks = set()
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        # Score whatever is still pending, then wait for the in-flight batches
+        self._flush()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    @property
+    def mean_batch(self):
+        return self.items / self.batches if self.batches else 0.0
+
+
+class ScoringService:
+    def __init__(self, driver, model, top_k=5, index=None, cache=None, executor=None,
+                 window_ms=COALESCE_WINDOW_MS, max_batch=MAX_BATCH, graph=None):
+        # `driver` is a neo4j AsyncDriver; `index` an optional LocalVectorIndex,
+        # `graph` an optional LocalGraph (utils/csr_graph.py)
+        self.driver = driver
+        self.model = model
+        self.top_k = top_k
+        self.index = index
+        self.graph = graph
+        self.cache = cache
+        self.executor = executor
+        self.coalescer = Coalescer(self.score_batch, window_ms, max_batch)
+        self.requests = 0
+        self.started = time.time()
+
+    async def score(self, patient):
+        self.requests += 1
+        return await self.coalescer.submit(patient)
+
+    async def score_batch(self, patients):
+        frame = pd.DataFrame(patients)
+        frame["Id"] = frame["Id"].astype(str) if "Id" in frame else [str(i) for i in range(len(frame))]
+        loop = asyncio.get_running_loop()
+        # One model call per batch; the encoder is CPU-bound, so it runs off the loop
+        embeddings = await loop.run_in_executor(
+            self.executor, encode_texts, self.model, patient_texts(frame), BATCH_SIZE, self.cache
+        )
+        neighbours = await self.neighbours(embeddings)
+        eligibility = await self.eligibility({pid for similar in neighbours for pid, _ in similar})
+        return [
+            {
+                "Id": pid,
+                "eligibility_score": eligibility_score(similar, eligibility),
+                "similar_patients": [(npid, score, eligibility.get(npid, [])) for npid, score in similar],
+            }
+            for pid, similar in zip(frame["Id"].tolist(), neighbours)
+        ]
+
+    # Same cache entries as utils.result_cache.cached_* but with async fetches
+    async def neighbours(self, embeddings):
+        keys = [embedding_key(e, self.top_k) for e in embeddings]
+        results = [neighbour_cache.get(k) for k in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            batch = np.asarray([embeddings[i] for i in missing])
+            if self.index is not None:
+                found = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self.index.query, batch, self.top_k
+                )
+            else:
+                found = await self._query_neighbours(batch)
+            for i, similar in zip(missing, found):
+                neighbour_cache.put(keys[i], similar)
+                results[i] = similar
+        return results
+
+    async def _query_neighbours(self, embeddings):
+        neighbours = [[] for _ in range(len(embeddings))]
+        async with self.driver.session() as session:
+            result = await session.run(BATCH_VECTOR_QUERY, top_k=self.top_k,
+                                       embeddings=[list(map(float, e)) for e in embeddings])
+            async for r in result:
+                neighbours[r["i"]].append((r["patient_id"], r["score"]))
+        return neighbours
+
+    async def eligibility(self, patient_ids):
+        if self.graph is not None:
+            # Array lookups; quicker than a trip through the executor
+            return self.graph.eligibility(patient_ids)
+        result, missing = {}, []
+        for pid in patient_ids:
+            payers = eligibility_cache.get(pid)
+            if payers is None:
+                missing.append(pid)
+            elif payers:
+                result[pid] = payers
+        if missing:
+            fetched = {}
+            async with self.driver.session() as session:
+                records = await session.run(LOOKUP_QUERY, patient_ids=missing, payers=ELIGIBLE_PAYERS)
+                async for r in records:
+                    fetched[r["patient_id"]] = r["eligible_payers"]
+            for pid in missing:
+                payers = fetched.get(pid, [])
+                eligibility_cache.put(pid, payers)
+                if payers:
+                    result[pid] = payers
+        return result
+
+    async def close(self):
+        await self.coalescer.close()
+
+    def metrics(self):
+        return {"requests": self.requests, "batches": self.coalescer.batches,
+                "mean_batch": self.coalescer.mean_batch, "uptime_sec": time.time() - self.started,
+                "cache": cache_metrics()}
+
+
+# --- Minimal HTTP/1.1 front end (keep-alive, JSON in/out) ---
+#   POST /score    body: one patient dict, or a list of them
+#   GET  /metrics  request/batch counters and cache hit rates
+#   GET  /health
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+async def _respond(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode() + body)
+    await writer.drain()
+
+
+async def _dispatch(service, method, path, body):
+    if method == "GET" and path == "/health":
+        return 200, {"status": "ok"}
+    if method == "GET" and path == "/metrics":
+        return 200, service.metrics()
+    if method == "POST" and path == "/score":
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError:
+            return 400, {"error": "invalid JSON"}
+        if isinstance(payload, dict):
+            return 200, await service.score(payload)
+        if isinstance(payload, list) and all(isinstance(p, dict) for p in payload):
+            return 200, list(await asyncio.gather(*(service.score(p) for p in payload)))
+        return 400, {"error": "expected a patient object or a list of them"}
+    return 404, {"error": f"no route for {method} {path}"}
+
+
+async def handle_connection(service, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, version = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_BYTES:
+                await _respond(writer, 413, {"error": "body too large"}, False)
+                break
+            body = await reader.readexactly(length) if length else b""
+            try:
+                status, payload = await _dispatch(service, method, path, body)
+            except Exception as e:
+                status, payload = 500, {"error": str(e)}
+            await _respond(writer, status, payload, keep_alive)
+            if not keep_alive:
+                break
+    except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host="127.0.0.1", port=8080):
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    print(f"Scoring service listening on http://{host}:{port} "
+          f"(coalesce window {service.coalescer.window * 1000:g} ms, max batch {service.coalescer.max_batch})")
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,135 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from utils.embeddings import EMBEDDING_DIM
+
+# --- Local patient vector index ---
+# A snapshot of every Patient.embedding as a memory-mapped float32 matrix
+# (vectors.f32) plus the matching ids (ids.npy). Scores follow Neo4j's cosine
+# vector index: (1 + cos) / 2, so results are interchangeable with
+# db.index.vector.queryNodes.
+SNAPSHOT_DIR = os.getenv("VECTOR_SNAPSHOT_DIR", "./.vector_snapshot")
+BLOCK_SIZE = 65536  # index rows scored per matmul block
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def export_snapshot(driver, path=SNAPSHOT_DIR, label="Patient", key="Id", prop="embedding",
+                    dim=EMBEDDING_DIM, fetch_size=10000):
+    os.makedirs(path, exist_ok=True)
+    with driver.session(fetch_size=fetch_size) as session:
+        n = session.run(
+            f"MATCH (n:{label}) WHERE n.{prop} IS NOT NULL RETURN count(n) AS n"
+        ).single()["n"]
+        vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="w+", shape=(max(n, 1), dim))
+        ids = []
+        result = session.run(f"MATCH (n:{label}) WHERE n.{prop} IS NOT NULL RETURN n.{key} AS id, n.{prop} AS embedding")
+        for i, record in enumerate(result):
+            if i >= n:  # nodes embedded after the count
+                break
+            ids.append(record["id"])
+            vectors[i] = record["embedding"]
+    vectors[:len(ids)] = _normalize(np.asarray(vectors[:len(ids)]))
+    vectors.flush()
+    np.save(os.path.join(path, "ids.npy"), np.array(ids, dtype=str))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"label": label, "property": prop, "dim": dim, "size": len(ids),
+                   "created": time.time()}, f)
+    print(f"Vector snapshot: {len(ids)} {label} embeddings -> {path}")
+    return LocalVectorIndex.load(path)
+
+
+class LocalVectorIndex:
+    def __init__(self, ids, vectors, path=None):
+        self.ids = ids
+        self.vectors = vectors
+        self.path = path
+        self._ann = None
+
+    @classmethod
+    def load(cls, path=SNAPSHOT_DIR):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        ids = np.load(os.path.join(path, "ids.npy"))
+        vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r",
+                            shape=(max(meta["size"], 1), meta["dim"]))[:meta["size"]]
+        index = cls(ids, vectors, path)
+        if os.path.exists(os.path.join(path, "hnsw.bin")):
+            index.load_ann()
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- Exact search ---
+    def search(self, queries, top_k=5, block_size=BLOCK_SIZE):
+        # Exact cosine top-k for a batch of queries; one (queries x block)
+        # matmul per block of the index keeps memory bounded.
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        nq, n = len(queries), len(self)
+        top_k = min(top_k, n)
+        if top_k <= 0:
+            return [[] for _ in range(nq)]
+        best_scores = np.full((nq, 0), -np.inf, dtype=np.float32)
+        best_idx = np.empty((nq, 0), dtype=np.int64)
+        for start in range(0, n, block_size):
+            scores = queries @ self.vectors[start:start + block_size].T
+            k = min(top_k, scores.shape[1])
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+            best_idx = np.concatenate([best_idx, part + start], axis=1)
+            if best_scores.shape[1] > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1, axis=1)[:, :top_k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_idx = np.take_along_axis(best_idx, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return self._results(np.take_along_axis(best_idx, order, axis=1),
+                             np.take_along_axis(best_scores, order, axis=1))
+
+    def _results(self, idx, cos):
+        scores = (1.0 + cos) / 2.0
+        return [[(str(self.ids[i]), float(s)) for i, s in zip(row_i, row_s)]
+                for row_i, row_s in zip(idx, scores)]
+
+    # --- Approximate search (optional, needs hnswlib) ---
+    def build_ann(self, m=16, ef_construction=200, ef=64):
+        import hnswlib
+        ann = hnswlib.Index(space="cosine", dim=self.vectors.shape[1])
+        ann.init_index(max_elements=len(self), M=m, ef_construction=ef_construction)
+        for start in range(0, len(self), BLOCK_SIZE):
+            block = np.asarray(self.vectors[start:start + BLOCK_SIZE])
+            ann.add_items(block, np.arange(start, start + len(block)))
+        ann.set_ef(ef)
+        self._ann = ann
+        if self.path:
+            ann.save_index(os.path.join(self.path, "hnsw.bin"))
+        return ann
+
+    def load_ann(self, ef=64):
+        import hnswlib
+        ann = hnswlib.Index(space="cosine", dim=self.vectors.shape[1])
+        ann.load_index(os.path.join(self.path, "hnsw.bin"), max_elements=len(self))
+        ann.set_ef(ef)
+        self._ann = ann
+        return ann
+
+    def search_approximate(self, queries, top_k=5):
+        if self._ann is None:
+            raise RuntimeError("no approximate index; call build_ann() first")
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        top_k = min(top_k, len(self))
+        labels, distances = self._ann.knn_query(queries, k=top_k)
+        return self._results(labels, 1.0 - distances)
+
+    def query(self, queries, top_k=5):
+        # Approximate when an ANN index is loaded, exact otherwise
+        if self._ann is not None:
+            return self.search_approximate(queries, top_k)
+        return self.search(queries, top_k)